@@ -0,0 +1,329 @@
+"""
+Incremental update of the NotFollowerTwFriend objects from the account activity events
+(Account Activity API webhook style), the full check is the periodic reconciliation only:
+    1. Verify the webhook request ('X-Twitter-Webhooks-Signature' header,
+       HMAC-SHA256 of the body with 'settings.CONSUMER_SECRET')
+       and answer the CRC challenge ('crc_token' query param)
+    2. Queue the follow, unfollow and user update events as ActivityEvent objects
+    3. Apply each queued event as the single insert, delete or update
+       of the NotFollowerTwFriend object (with its metrics recomputed),
+       the follower IDs are kept as TwFollower objects:
+        - the account follows the user who isn't follower -- insert
+        - the account unfollows the user -- delete
+        - the user follows the account -- delete (the user is a follower now)
+        - the user unfollows the account -- insert, if the account follows the user
+        - the user is updated -- update
+
+The payload (user objects as in Twitter API, 'user_update_events' is the extension
+of this API for the changed profiles and counts):
+    {
+        "for_user_id": "<account id_str>",
+        "follow_events": [
+            {"type": "follow" | "unfollow", "source": {user}, "target": {user}}
+        ],
+        "user_update_events": [{"user": {user}}]
+    }
+"""
+import base64
+import hashlib
+import hmac
+import json
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import changes, metrics, stats
+from .models import ActivityEvent, NotFollowerTwFriend, TwFollower
+
+SIGNATURE_HEADER = 'HTTP_X_TWITTER_WEBHOOKS_SIGNATURE'
+
+# The CRC token is the short opaque token: the signed CRC response of any other value
+# (e.g. the JSON payload) would be the valid signature of the forged events
+CRC_TOKEN_RE = re.compile(r'^[A-Za-z0-9_\-=]{1,128}$')
+
+# Max count of the TwFollower objects in the single INSERT query
+# (SQLite allows 500 rows in the single multi-row INSERT)
+FOLLOWERS_BATCH_SIZE = 500
+
+
+class InvalidActivityPayload(ValueError):
+    """
+    The activity payload isn't the valid JSON object of the events
+    """
+
+
+def get_webhook_secret():
+    """
+    Returns:
+        bytes -- The key of the webhook signatures (Twitter App consumer secret)
+    """
+
+    return getattr(settings, 'ACTIVITY_WEBHOOK_SECRET', settings.CONSUMER_SECRET).encode()
+
+
+def sign(message):
+    """
+    Return 'sha256=<base64 of HMAC-SHA256>' of the 'message' (bytes)
+    """
+
+    digest = hmac.new(get_webhook_secret(), message, hashlib.sha256).digest()
+    return 'sha256=' + base64.b64encode(digest).decode()
+
+
+def is_valid_crc_token(crc_token):
+    """
+    Check that the 'crc_token' query param is the short opaque token
+    (see CRC_TOKEN_RE), it's never the JSON payload of the events.
+    """
+
+    return bool(crc_token) and CRC_TOKEN_RE.match(crc_token) is not None
+
+
+def get_crc_response(crc_token):
+    """
+    Return the response of the CRC challenge of the webhook.
+
+    Arguments:
+        crc_token {str} -- 'crc_token' query param (see is_valid_crc_token())
+
+    Returns:
+        dict -- The 'response_token'
+    """
+
+    return {'response_token': sign(crc_token.encode())}
+
+
+def verify_signature(body, signature):
+    """
+    Check the 'X-Twitter-Webhooks-Signature' header value of the request body.
+    """
+
+    return bool(signature) and hmac.compare_digest(sign(body), signature)
+
+
+def enqueue_activity_events(body):
+    """
+    Parse the verified payload and queue its events as ActivityEvent objects.
+
+    Arguments:
+        body {bytes} -- The request body
+
+    Raises:
+        InvalidActivityPayload -- The payload isn't the JSON object of the events
+
+    Returns:
+        int -- Count of the queued events
+    """
+
+    try:
+        payload = json.loads(body.decode('utf-8'))
+        for_user_id = str(payload.get('for_user_id', ''))
+        events = [
+            (event['type'], event) for event in payload.get('follow_events', [])
+            if event['type'] in (ActivityEvent.TYPE_FOLLOW, ActivityEvent.TYPE_UNFOLLOW)
+        ] + [
+            (ActivityEvent.TYPE_USER_UPDATE, event)
+            for event in payload.get('user_update_events', [])
+        ]
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        raise InvalidActivityPayload(str(error))
+
+    ActivityEvent.objects.bulk_create([
+        ActivityEvent(event_type=event_type, for_user_id=for_user_id, payload=json.dumps(event))
+        for event_type, event in events
+    ])
+    metrics.inc('activity_events_received_total', len(events))
+
+    return len(events)
+
+
+def replace_tw_followers(follower_ids, since=None):
+    """
+    Replace the TwFollower objects with the follower IDs fetched by the check.
+    The follow events received since the start of the check and already applied
+    are replayed after the replace, so their follower changes aren't lost.
+
+    Arguments:
+        follower_ids {list} -- The follower IDs of Twitter account
+        since {datetime} -- The start of the check (default: {None})
+    """
+
+    with transaction.atomic():
+        TwFollower.objects.all().delete()
+        TwFollower.objects.bulk_create(
+            [TwFollower(id_str=str(follower_id)) for follower_id in follower_ids],
+            batch_size=FOLLOWERS_BATCH_SIZE)
+
+        if since is None:
+            return
+        applied_events = ActivityEvent.objects.filter(
+            event_type__in=(ActivityEvent.TYPE_FOLLOW, ActivityEvent.TYPE_UNFOLLOW),
+            received_at__gte=since, error='',
+        ).exclude(processed_at=None).order_by('id')
+        for event in applied_events:
+            data = json.loads(event.payload)
+            # The user follows or unfollows the account
+            if _get_id_str(data['target']) == event.for_user_id:
+                _update_tw_follower(_get_id_str(data['source']),
+                                    event.event_type == ActivityEvent.TYPE_FOLLOW)
+
+
+def _get_id_str(user):
+    """
+    Return 'id_str' of the user object of the event.
+    """
+
+    return str(user['id_str'] if 'id_str' in user else user['id'])
+
+
+def _get_tw_user(user):
+    """
+    Return the user object of the event with the attributes of twitter.User object
+    used by the metrics of the check.
+    """
+
+    return SimpleNamespace(
+        id_str=_get_id_str(user),
+        screen_name=user['screen_name'],
+        name=user.get('name', ''),
+        description=user.get('description') or '',
+        statuses_count=user.get('statuses_count', 0),
+        followers_count=user.get('followers_count', 0),
+        friends_count=user.get('friends_count', 0),
+        created_at=user['created_at'],
+        location=user.get('location') or '',
+        following=user.get('following', False),
+    )
+
+
+def _update_tw_follower(id_str, follow):
+    """
+    Add (if 'follow') or remove the TwFollower object of the user.
+    """
+
+    if follow:
+        TwFollower.objects.get_or_create(id_str=id_str)
+    else:
+        TwFollower.objects.filter(id_str=id_str).delete()
+
+
+def _save_not_follower_tw_friend(tw_user, create):
+    """
+    Insert (if 'create') or update the NotFollowerTwFriend object of the user
+    with the recomputed metrics and the next version of the changes feed.
+    """
+
+    # The check imports python-twitter, so it isn't imported with the webhook view
+    from .check_not_followers_tw_friends import count_created_at_day, count_tw_tff_ratio
+
+    stats_delta = stats.StatsDelta()
+    existing = NotFollowerTwFriend.objects.filter(id_str=tw_user.id_str).first()
+    if existing is None and not create:
+        return
+    if existing is not None:
+        stats_delta.remove_row(existing)
+
+    not_follower_tw_friend = NotFollowerTwFriend(
+        id_str=tw_user.id_str,
+        screen_name=tw_user.screen_name,
+        name=tw_user.name,
+        description=tw_user.description,
+        statuses_count=tw_user.statuses_count,
+        followers_count=tw_user.followers_count,
+        friends_count=tw_user.friends_count,
+        created_at=tw_user.created_at,
+        created_at_day=count_created_at_day(tw_user),
+        location=tw_user.location,
+        tff_ratio=count_tw_tff_ratio(tw_user),
+        # The decision about the existing Twitter friend is kept
+        need_unfollow=existing.need_unfollow if existing is not None else True,
+        version=changes.allocate_version(),
+    )
+    not_follower_tw_friend.save()
+    changes.clear_tombstones([not_follower_tw_friend.id_str])
+    stats_delta.add_row(not_follower_tw_friend)
+    stats.apply_stats_delta(stats_delta)
+
+
+def _delete_not_follower_tw_friend(id_str):
+    """
+    Delete the NotFollowerTwFriend object of the user (if any) with its tombstone.
+    """
+
+    queryset = NotFollowerTwFriend.objects.filter(id_str=id_str)
+    stats.subtract_queryset_stats(queryset)
+    changes.delete_with_tombstones(queryset)
+
+
+def apply_activity_event(event):
+    """
+    Apply the single ActivityEvent object to the NotFollowerTwFriend objects.
+
+    Arguments:
+        event {ActivityEvent} -- The queued event
+    """
+
+    data = json.loads(event.payload)
+
+    if event.event_type == ActivityEvent.TYPE_USER_UPDATE:
+        _save_not_follower_tw_friend(_get_tw_user(data['user']), create=False)
+        return
+
+    source = _get_tw_user(data['source'])
+    target = _get_tw_user(data['target'])
+    follow = event.event_type == ActivityEvent.TYPE_FOLLOW
+
+    if source.id_str == event.for_user_id:
+        # The account follows or unfollows the user
+        if not follow:
+            _delete_not_follower_tw_friend(target.id_str)
+        elif not TwFollower.objects.filter(id_str=target.id_str).exists():
+            _save_not_follower_tw_friend(target, create=True)
+    elif target.id_str == event.for_user_id:
+        # The user follows or unfollows the account
+        _update_tw_follower(source.id_str, follow)
+        if follow:
+            _delete_not_follower_tw_friend(source.id_str)
+        elif source.following:
+            _save_not_follower_tw_friend(source, create=True)
+
+
+def process_activity_events(limit=None):
+    """
+    Apply the queued ActivityEvent objects in the order of receiving,
+    each one in its own transaction. The failed event is marked as processed
+    with the error, it's fixed by the next check.
+
+    Arguments:
+        limit {int} -- Max count of the processed events (default: {None})
+
+    Returns:
+        dict -- Counts of the 'applied' and 'failed' events
+    """
+
+    result = {'applied': 0, 'failed': 0}
+
+    queryset = ActivityEvent.objects.filter(processed_at=None).order_by('id')
+    if limit is not None:
+        queryset = queryset[:limit]
+
+    for event in queryset:
+        try:
+            with transaction.atomic():
+                apply_activity_event(event)
+                event.processed_at = timezone.now()
+                event.save(update_fields=['processed_at'])
+            result['applied'] += 1
+        except Exception as error:
+            event.processed_at = timezone.now()
+            event.error = str(error)
+            event.save(update_fields=['processed_at', 'error'])
+            result['failed'] += 1
+
+    for status, count in result.items():
+        metrics.inc('activity_events_processed_total', count, status=status)
+
+    return result
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Check the persistent db connections before their reuse by the request
+        if getattr(settings, 'DB_CONN_HEALTH_CHECKS', False):
+            from .db import check_db_connections_health
+            request_started.connect(
+                check_db_connections_health, dispatch_uid='api_db_connections_health')
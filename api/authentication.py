@@ -0,0 +1,240 @@
+"""
+Authentication with the short-lived signed API tokens for the high-frequency polling:
+    1. The token is 'user pk:jti' signed with HMAC of SECRET_KEY and the timestamp
+       (django.core.signing.TimestampSigner), so the signature and the expiry
+       ('settings.API_SIGNED_TOKEN_MAX_AGE' seconds) are verified without db queries,
+       unlike the password hash of BasicAuthentication (PBKDF2 on every request)
+       and the db query of TokenAuthentication
+    2. The user and the revocation of the token are looked up in db once per
+       'settings.API_SIGNED_TOKEN_CACHE_TTL' seconds and kept in the in-process
+       LRU cache of 'settings.API_SIGNED_TOKEN_CACHE_SIZE' tokens
+    3. The revoked token is rejected right away by the process which revoked it,
+       and by the other processes after the cache TTL at most
+
+Example:
+    $ curl -X POST -u username:password http://localhost:8000/api/v1/signed_token/
+    $ curl -H 'Authorization: Signed <token>' http://localhost:8000/api/v1/metrics/
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils import baseconv, timezone
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import SignedTokenRevocation
+
+KEYWORD = 'Signed'
+SALT = 'api.authentication.SignedTokenAuthentication'
+
+
+def get_max_age():
+    """
+    Returns:
+        int -- Seconds of the signed token lifetime
+    """
+
+    return getattr(settings, 'API_SIGNED_TOKEN_MAX_AGE', 15 * 60)
+
+
+class SignedToken(object):
+    """
+    The verified signed token, set as 'request.auth'
+    """
+
+    __slots__ = ('key', 'user_pk', 'jti', 'expires_at')
+
+    def __init__(self, key, user_pk, jti, expires_at):
+        self.key = key
+        self.user_pk = user_pk
+        self.jti = jti
+        # Unix time of the expiry
+        self.expires_at = expires_at
+
+
+class TokenCache(object):
+    """
+    Thread-safe LRU cache of the (user, token) pairs by the token key
+    with the expiry of each entry.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, now, expires_at):
+        with self._lock:
+            self._entries[key] = (min(now + self.ttl, expires_at), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Return the process-wide TokenCache (created on the first call)
+    """
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TokenCache(
+                getattr(settings, 'API_SIGNED_TOKEN_CACHE_SIZE', 1024),
+                getattr(settings, 'API_SIGNED_TOKEN_CACHE_TTL', 60),
+            )
+        return _cache
+
+
+def reset_token_cache():
+    """
+    Drop the process-wide TokenCache (e.g. after the change of the settings in the tests)
+    """
+
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def create_signed_token(user):
+    """
+    Create the signed token of the user.
+
+    Arguments:
+        user {User} -- The authenticated user
+
+    Returns:
+        dict -- The 'token' and its expiry time 'expires_at'
+    """
+
+    signer = signing.TimestampSigner(salt=SALT)
+    token = signer.sign('%s:%s' % (user.pk, uuid.uuid4().hex))
+
+    return {
+        'token': token,
+        'expires_at': timezone.now() + timedelta(seconds=get_max_age()),
+    }
+
+
+def revoke_signed_token(signed_token, user):
+    """
+    Revoke the signed token: it's rejected by this process right away
+    and by the other processes after the cache TTL at most.
+
+    Arguments:
+        signed_token {SignedToken} -- The verified signed token
+        user {User} -- The owner of the token
+    """
+
+    now = timezone.now()
+    SignedTokenRevocation.objects.filter(expires_at__lte=now).delete()
+    SignedTokenRevocation.objects.get_or_create(
+        jti=signed_token.jti,
+        defaults={
+            'user': user,
+            'expires_at': datetime.fromtimestamp(signed_token.expires_at, timezone.utc),
+        }
+    )
+    get_token_cache().discard(signed_token.key)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authentication with the 'Authorization: Signed <token>' header,
+    the token is created by the signed token endpoint (/api/v1/signed_token/).
+    """
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header.'))
+
+        now = time.time()
+        cache = get_token_cache()
+        cached = cache.get(key, now)
+        if cached is not None:
+            return cached
+
+        signed_token = self.verify_token(key)
+        user = self.get_user(signed_token)
+        cache.set(key, (user, signed_token), now, signed_token.expires_at)
+
+        return user, signed_token
+
+    def verify_token(self, key):
+        """
+        Verify the signature and the expiry of the token without db queries.
+
+        Returns:
+            SignedToken -- The verified token
+        """
+
+        signer = signing.TimestampSigner(salt=SALT)
+        max_age = get_max_age()
+        try:
+            value = signer.unsign(key, max_age=max_age)
+            user_pk, jti = value.split(':')
+            timestamp = baseconv.base62.decode(key.rsplit(signer.sep, 2)[-2])
+        except (signing.BadSignature, ValueError):
+            raise exceptions.AuthenticationFailed(_('Invalid or expired token.'))
+
+        return SignedToken(key, user_pk, jti, timestamp + max_age)
+
+    def get_user(self, signed_token):
+        """
+        Return the active user of the token, which isn't revoked.
+        """
+
+        if SignedTokenRevocation.objects.filter(jti=signed_token.jti).exists():
+            raise exceptions.AuthenticationFailed(_('Token revoked.'))
+
+        try:
+            user = get_user_model()._default_manager.get(pk=signed_token.user_pk)
+        except (get_user_model().DoesNotExist, ValueError):
+            raise exceptions.AuthenticationFailed(_('Invalid or expired token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return user
+
+    def authenticate_header(self, request):
+        return KEYWORD
@@ -0,0 +1,111 @@
+"""
+Auto-classification of the Twitter friends who aren't followers
+with the declarative keep rules (AutoClassificationRule objects):
+    1. Compile all the enabled rules into the single 'UPDATE ... WHERE'
+       which sets 'need_unfollow=False', run at the end of the check sync
+    2. Preview how many NotFollowerTwFriend objects each rule would affect
+       with the single aggregate COUNT query
+"""
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Sum, When
+
+from . import changes, stats
+from .models import AutoClassificationRule, NotFollowerTwFriend
+
+
+def get_rule_q(rule):
+    """
+    Compile the rule into the Q object, e.g. Q(tff_ratio__gte=2)
+
+    Arguments:
+        rule {AutoClassificationRule} -- The rule
+
+    Returns:
+        Q object -- The rule condition
+    """
+
+    return Q(**{'%s__%s' % (rule.field, rule.operator): rule.value})
+
+
+def get_enabled_rules_q():
+    """
+    Compile all the enabled rules into the single Q object (rule_1 OR rule_2 ...)
+
+    Returns:
+        Q object -- The condition of all the enabled rules or None if there are no rules
+    """
+
+    rules_q = None
+    for rule in AutoClassificationRule.objects.filter(enabled=True):
+        rules_q = get_rule_q(rule) if rules_q is None else rules_q | get_rule_q(rule)
+    return rules_q
+
+
+def apply_auto_classification_rules():
+    """
+    Keep ('need_unfollow=False') all the NotFollowerTwFriend objects
+    which match any enabled rule with the single 'UPDATE ... WHERE'.
+
+    Returns:
+        int -- Count of the NotFollowerTwFriend objects kept by the rules
+    """
+
+    rules_q = get_enabled_rules_q()
+    if rules_q is None:
+        return 0
+
+    with transaction.atomic():
+        kept_count = NotFollowerTwFriend.objects.with_avg_tweetsperday().filter(
+            need_unfollow=True
+        ).filter(rules_q).update(need_unfollow=False, version=changes.allocate_version())
+        stats.apply_stats_delta({stats.NEED_UNFOLLOW_KEY: -kept_count})
+    return kept_count
+
+
+def preview_auto_classification_rules():
+    """
+    Count for each rule the matching NotFollowerTwFriend objects and the objects
+    which the rule would keep (now 'need_unfollow=True'), and the same counts
+    for all the enabled rules together, with the single aggregate COUNT query.
+
+    Returns:
+        dict -- 'rules': list of dicts with 'id', 'name', 'rule', 'enabled',
+                         'matched' and 'would_keep' counts
+                'enabled_rules': dict with 'matched' and 'would_keep' counts
+    """
+
+    def count_if(condition):
+        return Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+    rules = list(AutoClassificationRule.objects.all())
+    aggregates = {}
+    for rule in rules:
+        aggregates['matched_%s' % rule.pk] = count_if(get_rule_q(rule))
+        aggregates['would_keep_%s' % rule.pk] = count_if(
+            get_rule_q(rule) & Q(need_unfollow=True))
+
+    rules_q = get_enabled_rules_q()
+    if rules_q is not None:
+        aggregates['matched'] = count_if(rules_q)
+        aggregates['would_keep'] = count_if(rules_q & Q(need_unfollow=True))
+
+    counts = NotFollowerTwFriend.objects.with_avg_tweetsperday().aggregate(
+        **aggregates) if aggregates else {}
+
+    return {
+        'rules': [
+            {
+                'id': rule.pk,
+                'name': rule.name,
+                'rule': str(rule),
+                'enabled': rule.enabled,
+                'matched': counts['matched_%s' % rule.pk] or 0,
+                'would_keep': counts['would_keep_%s' % rule.pk] or 0,
+            }
+            for rule in rules
+        ],
+        'enabled_rules': {
+            'matched': counts.get('matched') or 0,
+            'would_keep': counts.get('would_keep') or 0,
+        },
+    }
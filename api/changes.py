@@ -0,0 +1,181 @@
+"""
+The changes feed of the Twitter friends who aren't followers for the API mirrors:
+    1. Each write (check sync, PATCH, import, keep rules, activity events, unfollow)
+       allocates the next version from the single NotFollowersTwFriendsVersion row
+       and sets it to the created and changed NotFollowerTwFriend objects
+    2. The deleted NotFollowerTwFriend objects are kept
+       as NotFollowerTwFriendTombstone objects with the version of the deletion
+    3. The feed returns the rows and the tombstones with the version greater than
+       'since' in the order of ('version', 'id_str') with the index,
+       so the mirrors sync in O(changes) instead of O(table)
+
+The version row stays locked by the writer until its transaction is committed,
+so the versions are committed in their order and the reader never skips
+the change committed after it read the greater version.
+"""
+from django.db import transaction
+
+from .models import NotFollowerTwFriend, NotFollowerTwFriendTombstone, \
+    NotFollowersTwFriendsVersion
+
+# Max count of the 'id_str' values in the single query of the tombstones
+TOMBSTONES_CHUNK_SIZE = 500
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+# The fields compared by has_changed() (the decimal ones with 2 decimal places)
+CHANGE_FIELDS = ('screen_name', 'name', 'description', 'statuses_count', 'followers_count',
+                 'friends_count', 'created_at', 'created_at_day', 'location', 'need_unfollow')
+CHANGE_DECIMAL_FIELDS = ('tff_ratio', )
+
+
+def allocate_version():
+    """
+    Allocate the next version of the changes. Must be called inside
+    the transaction of the write, the version row is locked until its end.
+
+    Returns:
+        int -- The allocated version
+    """
+
+    version_row, _ = NotFollowersTwFriendsVersion.objects.select_for_update().get_or_create(pk=1)
+    version_row.value += 1
+    version_row.save(update_fields=['value'])
+    return version_row.value
+
+
+def get_current_version():
+    """
+    Returns:
+        int -- The last committed version of the changes
+    """
+
+    return NotFollowersTwFriendsVersion.objects.filter(pk=1).values_list(
+        'value', flat=True).first() or 0
+
+
+def has_changed(old, new):
+    """
+    Check whether the new version of the NotFollowerTwFriend object
+    (e.g. created by the check, not saved) differs from the saved one.
+
+    Arguments:
+        old {NotFollowerTwFriend} -- The saved object
+        new {NotFollowerTwFriend} -- The new version of the object
+
+    Returns:
+        bool -- True if any field has changed
+    """
+
+    return any(
+        getattr(old, field) != getattr(new, field) for field in CHANGE_FIELDS
+    ) or any(
+        '%.2f' % float(getattr(old, field)) != '%.2f' % float(getattr(new, field))
+        for field in CHANGE_DECIMAL_FIELDS
+    )
+
+
+def record_tombstones(id_str_list, version):
+    """
+    Keep the tombstones of the deleted NotFollowerTwFriend objects.
+
+    Arguments:
+        id_str_list {list} -- 'id_str' of the deleted objects
+        version {int} -- The version of the deletion
+    """
+
+    id_str_list = [str(id_str) for id_str in id_str_list]
+    for i in range(0, len(id_str_list), TOMBSTONES_CHUNK_SIZE):
+        chunk = id_str_list[i:i + TOMBSTONES_CHUNK_SIZE]
+        NotFollowerTwFriendTombstone.objects.filter(id_str__in=chunk).delete()
+        NotFollowerTwFriendTombstone.objects.bulk_create([
+            NotFollowerTwFriendTombstone(id_str=id_str, version=version) for id_str in chunk
+        ])
+
+
+def clear_tombstones(id_str_list):
+    """
+    Drop the tombstones of the (re-)created NotFollowerTwFriend objects,
+    so the mirror doesn't delete them after the sync.
+
+    Arguments:
+        id_str_list {list} -- 'id_str' of the created objects
+    """
+
+    id_str_list = [str(id_str) for id_str in id_str_list]
+    for i in range(0, len(id_str_list), TOMBSTONES_CHUNK_SIZE):
+        NotFollowerTwFriendTombstone.objects.filter(
+            id_str__in=id_str_list[i:i + TOMBSTONES_CHUNK_SIZE]).delete()
+
+
+def delete_with_tombstones(queryset, version=None):
+    """
+    Delete the NotFollowerTwFriend objects of the 'queryset' and keep their tombstones.
+
+    Arguments:
+        queryset {QuerySet} -- NotFollowerTwFriend objects to delete
+        version {int} -- The already allocated version of the write (default: {None})
+
+    Returns:
+        int -- Count of the deleted objects
+    """
+
+    with transaction.atomic():
+        id_str_list = list(queryset.values_list('id_str', flat=True))
+        if not id_str_list:
+            return 0
+        record_tombstones(id_str_list, version or allocate_version())
+        deleted_count, _ = NotFollowerTwFriend.objects.filter(id_str__in=id_str_list).delete()
+    return deleted_count
+
+
+def _after(queryset, since, after):
+    """
+    Filter the 'queryset' after the ('since', 'after') position of the feed.
+    """
+
+    if after is None:
+        return queryset.filter(version__gt=since)
+    return queryset.filter(version__gt=since) | queryset.filter(
+        version=since, id_str__gt=after)
+
+
+def get_changes(since=None, after=None, limit=DEFAULT_LIMIT):
+    """
+    Return the page of the changes after the ('since', 'after') position:
+    the created or updated NotFollowerTwFriend objects and the 'id_str'
+    of the deleted ones in the order of ('version', 'id_str').
+
+    Arguments:
+        since {int} -- The version synced by the mirror, all the objects
+                       without the tombstones if None (default: {None})
+        after {str} -- 'id_str' of the last change of the previous page
+                       with the 'since' version (default: {None})
+        limit {int} -- Max count of the changes (default: {DEFAULT_LIMIT})
+
+    Returns:
+        tuple -- (the last committed version, list of ('version', 'id_str',
+                  NotFollowerTwFriend object or None for the deleted one),
+                  True if there are more changes)
+    """
+
+    version = get_current_version()
+    rows = NotFollowerTwFriend.objects.filter(version__lte=version)
+    tombstones = NotFollowerTwFriendTombstone.objects.filter(version__lte=version)
+    if since is None:
+        # The versions start with 1, the rows created before the feed have the version 0
+        since = -1
+        tombstones = tombstones.none()
+
+    rows = _after(rows, since, after).order_by('version', 'id_str')[:limit + 1]
+    tombstones = _after(tombstones, since, after).order_by(
+        'version', 'id_str').values_list('version', 'id_str')[:limit + 1]
+
+    changes = sorted(
+        [(row.version, row.id_str, row) for row in rows] +
+        [(tombstone_version, id_str, None) for tombstone_version, id_str in tombstones],
+        key=lambda change: change[:2]
+    )
+
+    return version, changes[:limit], len(changes) > limit
@@ -1,20 +1,41 @@
 """
-    1. Analysis with Twitter API the existing friends who aren't followers for Twitter account
-    2. Count the average number of tweets per day
+    1. Analysis with Twitter API the existing friends who aren't followers for Twitter account:
+       the pages of the friend IDs and the UsersLookup batches of the not-followers
+       are dispatched across the pool of the credentials (see api/twitter_api.py)
+    2. Count the day of the account creation (the average number of tweets per day
+       is counted in SQL at the query time, see NotFollowerTwFriendQuerySet)
     3. Count the TFF Ratio (Twitter Follower-Friend Ratio)
     4. Synchronization (Create, Update, Destroy) the NotFollowerTwFriend objects
+       in the chunks of CRAWL_FLUSH_SIZE compact records while the crawl runs,
+       so the memory doesn't grow with the count of the not-followers
+    5. Auto-classification of the NotFollowerTwFriend objects with the keep rules
+    6. Replacement of the follower IDs used by the activity events (see api/activity_events.py)
 """
-from datetime import datetime, date
-from django.conf import settings
-import twitter
-from .models import NotFollowerTwFriend
+from datetime import datetime
+from django.db import transaction
+from . import changes, metrics, stats
+from .activity_events import replace_tw_followers
+from .auto_classification import apply_auto_classification_rules
+from .models import NotFollowerTwFriend, TwFriendsRun
+from .runs import EVENT_NOT_FOLLOWER, EVENT_PROGRESS, touch_run
+from .serializers import NotFollowerTwFriendSerializer
+from .twitter_api import TwitterApiPool, get_twitter_api, get_twitter_credentials
+
+# Max count of the crawled not-followers kept in memory before the flush to db
+CRAWL_FLUSH_SIZE = 1000
+
+# Count of the friend IDs in the single GetFriendIDsPaged page
+FRIEND_IDS_PAGE_SIZE = 5000
 
+# Count of the follower IDs in the single GetFollowerIDsPaged page
+FOLLOWER_IDS_PAGE_SIZE = 5000
 
-def count_avg_tweets_per_day(tw_account):
+
+def count_created_at_day(tw_account):
     """
-    Count the average number of tweets per day
-    that were created by the 'tw_account'.
-    For the whole period from the moment of creation of his account until today.
+    Count the day of the account creation as the ordinal of the date,
+    the average number of tweets per day for the whole period from this day
+    until today is counted in SQL (see NotFollowerTwFriendQuerySet).
 
     1. From Twitter developer docs:
     https://developer.twitter.com/en/docs/tweets/data-dictionary/overview/user-object
@@ -29,44 +50,23 @@ def count_avg_tweets_per_day(tw_account):
     classmethod datetime.strptime(date_string, format)
     Return a datetime corresponding to date_string,
     parsed according to format.
-    This is equivalent to datetime(*(time.strptime(date_string, format)[0:6])).
-    ValueError is raised if the date_string and format can’t be parsed
-    by time.strptime() or if it returns a value which isn’t a time tuple.
-    For a complete list of formatting directives,
-    see strftime() and strptime() Behavior.
-    8.1.8. strftime() and strptime() Behavior
-    https://docs.python.org/3/library/datetime.html?highlight=date#strftime-strptime-behavior
-    >>> # Using datetime.strptime()
-    >>> dt = datetime.strptime("21/11/06 16:30", "%d/%m/%y %H:%M")
-    >>> dt
-    datetime.datetime(2006, 11, 21, 16, 30)
+    date.toordinal()
+    Return the proleptic Gregorian ordinal of the date,
+    where January 1 of year 1 has ordinal 1.
 
     Arguments:
         tw_account {twitter.User object} -- The following fields are used:
                                             created_at
-                                            statuses_count
 
     Returns:
-        float -- The average number of tweets per day
+        int -- The ordinal of the date of account creation in Twitter
     """
 
-    # Get a current data
-    today = date.today()
-    num_days_1 = today.toordinal()
-
     # Date of account creation in Twitter
     tw_account_created_at_dt = datetime.strptime(
         tw_account.created_at, '%a %b %d %H:%M:%S %z %Y')
-    num_days_2 = tw_account_created_at_dt.toordinal()
-
-    # The lifetime of a Twitter account in days
-    tw_account_lifetime_days = num_days_1 - num_days_2
 
-    # The average number of tweets per day
-    avg_tweets_per_day = tw_account.statuses_count / tw_account_lifetime_days
-    avg_tweets_per_day = round(avg_tweets_per_day, 2)
-
-    return avg_tweets_per_day
+    return tw_account_created_at_dt.toordinal()
 
 def count_tw_tff_ratio(tw_account):
     """
@@ -93,149 +93,262 @@ def count_tw_tff_ratio(tw_account):
 
     return tw_tff_ratio
 
-def get_not_unfollow_tw_friend_ids():
+class CrawlRecord(object):
+    """
+    The compact record of the crawled Twitter friend who isn't follower
+    (instead of the NotFollowerTwFriend model instance with its state)
     """
-    Return list of the all friends who aren't followers
-    with 'need_unfollow=False' (list of exceptions for unfollow).
 
-    Arguments:
-        None
+    __slots__ = ('id_str', 'screen_name', 'name', 'description', 'statuses_count',
+                 'followers_count', 'friends_count', 'created_at', 'created_at_day',
+                 'location', 'tff_ratio')
 
-    Returns:
-        list -- the all friends who aren't followers with 'need_unfollow=False'
+    def __init__(self, tw_account):
+        """
+        Arguments:
+            tw_account {twitter.User object} -- The crawled Twitter friend
+        """
+
+        self.id_str = str(tw_account.id)
+        self.screen_name = tw_account.screen_name
+        self.name = tw_account.name
+        self.description = tw_account.description
+        self.statuses_count = tw_account.statuses_count
+        self.followers_count = tw_account.followers_count
+        self.friends_count = tw_account.friends_count
+        self.created_at = tw_account.created_at
+        self.location = tw_account.location
+
+        with metrics.timer('check_span_seconds', span='count_metrics'):
+            # Count the day of the account creation for the average number
+            # of tweets per day of Twitter Account
+            self.created_at_day = count_created_at_day(tw_account)
+
+            # Count TFF Ratio (Twitter Follower-Friend Ratio) for Twitter Account
+            self.tff_ratio = count_tw_tff_ratio(tw_account)
+
+    def to_model(self, **fields):
+        """
+        Return the NotFollowerTwFriend object (not saved) of the record.
+
+        Arguments:
+            **fields -- The other field values ('need_unfollow', 'version', etc.)
+        """
+
+        return NotFollowerTwFriend(
+            **dict({name: getattr(self, name) for name in self.__slots__}, **fields))
+
+
+class NotFollowersTwFriendsSync(object):
+    """
+    Synchronization (Create, Update, Destroy) of the NotFollowerTwFriend objects
+    with the crawled records:
+        1. The records are flushed to db in the chunks of 'flush_size'
+           (CRAWL_FLUSH_SIZE by default)
+           while the crawl runs: each chunk is the single transaction
+           and the single change of the changes feed (see api/changes.py),
+           the existing rows keep 'need_unfollow' and, if unchanged, the version
+        2. All the flushed rows are marked with 'last_seen_run=run_id'
+        3. The rows not seen by the crawl are deleted at the end
     """
 
-    # Get all NotFollowerTwFriend objects as queryset
-    queryset = NotFollowerTwFriend.objects.all()
+    def __init__(self, run_id, flush_size=None):
+        self.run_id = run_id
+        self.flush_size = flush_size or CRAWL_FLUSH_SIZE
+        self.records = []
+        # The rows changed by the other writes after the start
+        # (e.g. the activity events) aren't deleted as not seen
+        self.started_version = changes.get_current_version()
+
+    def add(self, record):
+        """
+        Add the crawled record, the records are flushed after each 'flush_size'.
+        """
+
+        self.records.append(record)
+        if len(self.records) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Create or update the NotFollowerTwFriend objects of the buffered records.
+        """
+
+        if not self.records:
+            return
+
+        stats_delta = stats.StatsDelta()
+        with metrics.timer('check_span_seconds', span='db_sync'), transaction.atomic():
+            version = changes.allocate_version()
+            existing_rows = NotFollowerTwFriend.objects.in_bulk(
+                [record.id_str for record in self.records])
+
+            created_rows = []
+            seen_id_str_list = []
+            for record in self.records:
+                existing_row = existing_rows.get(record.id_str)
+                if existing_row is None:
+                    created_rows.append(record.to_model(
+                        version=version, last_seen_run=self.run_id))
+                    stats_delta.add_row(created_rows[-1])
+                    continue
+
+                not_follower_tw_friend = record.to_model(
+                    need_unfollow=existing_row.need_unfollow, version=version,
+                    last_seen_run=self.run_id)
+                if changes.has_changed(existing_row, not_follower_tw_friend):
+                    not_follower_tw_friend.save(force_update=True)
+                    stats_delta.remove_row(existing_row)
+                    stats_delta.add_row(not_follower_tw_friend)
+                    metrics.inc('check_rows_updated_total')
+                else:
+                    seen_id_str_list.append(record.id_str)
+
+            NotFollowerTwFriend.objects.bulk_create(created_rows)
+            metrics.inc('check_rows_created_total', len(created_rows))
 
-    # Get NotFollowerTwFriend objects
-    # with 'need_unfollow=False'(not_follower_tw_friends not for unfollow)
-    # as filtered queryset
-    queryset = queryset.filter(need_unfollow__exact=False)
+            # The unchanged rows are only marked as seen
+            NotFollowerTwFriend.objects.filter(id_str__in=seen_id_str_list).update(
+                last_seen_run=self.run_id)
+            changes.clear_tombstones([record.id_str for record in self.records])
+            stats.apply_stats_delta(stats_delta)
 
-    not_unfollow_tw_friend_ids_lst = []
-    for not_unfollow_tw_friend in queryset:
-        not_unfollow_tw_friend_ids_lst.append(int(not_unfollow_tw_friend.id_str))
+        self.records = []
 
-    return not_unfollow_tw_friend_ids_lst
+    def finish(self):
+        """
+        Flush the rest of the records and delete the NotFollowerTwFriend objects
+        not seen by the crawl (the friends who are followers now or unfollowed).
+        """
 
+        self.flush()
 
-def check_tw_friends():
+        with metrics.timer('check_span_seconds', span='db_sync'):
+            not_seen = NotFollowerTwFriend.objects.exclude(last_seen_run=self.run_id).filter(
+                version__lte=self.started_version)
+            with transaction.atomic():
+                stats.subtract_queryset_stats(not_seen)
+                metrics.inc('check_rows_deleted_total', changes.delete_with_tombstones(not_seen))
+
+
+def check_tw_friends(run=None, events=None):
     """
     1. Analysis with Twitter API the existing friends who aren't followers for Twitter account
-    2. Count the average number of tweets per day
+    2. Count the day of the account creation
     3. Count the TFF Ratio (Twitter Follower-Friend Ratio)
     4. Synchronization (Create, Update, Destroy) the NotFollowerTwFriend objects
+    5. Auto-classification of the NotFollowerTwFriend objects with the keep rules
+    6. Replacement of the follower IDs used by the activity events
+
+    The run with the per-run summary of the metrics is stored
+    as a TwFriendsRun object (see api/metrics.py).
 
     Arguments:
-        None
+        run {TwFriendsRun} -- Already created check run (default: {None})
+        events {RunEventRecorder} -- Recorder of the found not-followers
+                                     and progress events (default: {None})
     """
 
-    # Create a Twitter Api instance.
-    api = twitter.Api(
-        consumer_key=settings.CONSUMER_KEY,
-        consumer_secret=settings.CONSUMER_SECRET,
-        access_token_key=settings.ACCESS_TOKEN,
-        access_token_secret=settings.ACCESS_TOKEN_SECRET
-    )
+    with metrics.record_run(TwFriendsRun.KIND_CHECK, run=run) as run:
+        _check_tw_friends(run, events)
+
+
+def get_follower_ids(api_pool):
+    """
+    Return the follower IDs of Twitter account fetched page by page,
+    so each page is the single call counted in the rate limit budget
+    and the pages fetched before the window reset aren't fetched again.
+
+    Arguments:
+        api_pool {TwitterApiPool} -- The pool of the credentials
+
+    Returns:
+        set -- The follower IDs (the set for O(1) lookups)
+    """
+
+    follower_ids_set = set()
+    next_cursor = -1
+    while next_cursor != 0:
+        # GetFollowerIDsPaged(user_id=None, screen_name=None, cursor=-1, count=5000)
+        # method from 'python-twitter' lib
+        next_cursor, _, follower_ids = api_pool.call(
+            'GetFollowerIDsPaged', cursor=next_cursor, count=FOLLOWER_IDS_PAGE_SIZE)
+        follower_ids_set.update(follower_ids)
+    return follower_ids_set
+
+
+def _check_tw_friends(run, events):
+    """
+    The body of check_tw_friends() which is recorded as a TwFriendsRun object.
+    """
+
+    # Create the pool of Twitter Api instances of the credentials
+    api_pool = TwitterApiPool(
+        [get_twitter_api(credential) for credential in get_twitter_credentials()])
 
     # Initialize variables for analysis not follower (useless) friends(followings)
     # for Twitter account
     next_cursor = -1
-    users_per_page = 100
-    not_followers_tw_friends_list = []
-    not_follower_tw_friend_ids_list = []
-    not_unfollow_tw_friend_ids_lst = get_not_unfollow_tw_friend_ids()
-
-    # Get follower IDs list for Twitter account
-    follower_ids_list = api.GetFollowerIDs()
+    pages_fetched = 0
+    friends_analyzed = 0
+    not_followers_found = 0
+    sync = NotFollowersTwFriendsSync(run.pk)
+
+    # 'id_str' of the kept ('need_unfollow=False') not-followers for the streamed events,
+    # the flush keeps 'need_unfollow' of the existing rows in db
+    kept_id_str_set = set()
+    if events is not None:
+        kept_id_str_set = set(NotFollowerTwFriend.objects.filter(
+            need_unfollow=False).values_list('id_str', flat=True))
+
+    # Get follower IDs set for Twitter account (the set for O(1) lookups)
+    follower_ids_set = get_follower_ids(api_pool)
+    touch_run(run)
 
     # Start analysis not follower friends(followings) for Twitter account
     while next_cursor != 0:
-        friends_paged_t = api.GetFriendsPaged(cursor=next_cursor, count=users_per_page)
-
-        # Analyze friends from next paged cursor
-        for friend in friends_paged_t[2]:
-
-            # If a friend is not a follower, then add it to the database
-            if friend.id not in follower_ids_list:
-
-                # Count the average number of tweets per day for Twitter Account
-                average_tweets_per_day = count_avg_tweets_per_day(friend)
-
-                # Count TFF Ratio (Twitter Follower-Friend Ratio) for Twitter Account
-                tw_follower_friend_ratio = count_tw_tff_ratio(friend)
-
-                # If 'not_follower_tw_friend' with 'need_unfollow=False'
-                # (not_followers_tw_friends for not unfollow)
-                # already has in db
-                if friend.id in not_unfollow_tw_friend_ids_lst:
-                    # Create a new NotFollowerTwFriend object with
-                    # explicit field value 'need_unfollow=False'
-                    not_follower_tw_friend = NotFollowerTwFriend(
-                        id_str=friend.id,
-                        screen_name=friend.screen_name,
-                        name=friend.name,
-                        description=friend.description,
-                        statuses_count=friend.statuses_count,
-                        followers_count=friend.followers_count,
-                        friends_count=friend.friends_count,
-                        created_at=friend.created_at,
-                        location=friend.location,
-                        avg_tweetsperday=average_tweets_per_day,
-                        tff_ratio=tw_follower_friend_ratio,
-                        need_unfollow=False,
-                    )
-                # else if 'not_follower_tw_friend'
-                # with 'need_unfollow=False'
-                # (not_followers_tw_friends for not unfollow)
-                # is absent in db
-                else:
-                    # Create a new NotFollowerTwFriend object with
-                    # implicit default field value 'need_unfollow=True'
-                    not_follower_tw_friend = NotFollowerTwFriend(
-                        id_str=friend.id,
-                        screen_name=friend.screen_name,
-                        name=friend.name,
-                        description=friend.description,
-                        statuses_count=friend.statuses_count,
-                        followers_count=friend.followers_count,
-                        friends_count=friend.friends_count,
-                        created_at=friend.created_at,
-                        location=friend.location,
-                        avg_tweetsperday=average_tweets_per_day,
-                        tff_ratio=tw_follower_friend_ratio,
-                    )
-                # add 'not_follower_tw_friend' object to 'not_followers_tw_friends_list'
-                not_followers_tw_friends_list.append(not_follower_tw_friend)
-                not_follower_tw_friend_ids_list.append(not_follower_tw_friend.id_str)
-
-        # set new value for next paged cursor
-        next_cursor = friends_paged_t[0]
-
-    # Get all NotFollowerTwFriend objects as queryset
-    queryset = NotFollowerTwFriend.objects.all()
-    queryset_len = len(queryset)
-    if queryset_len == 0:
-        # db is empty
-        # need to create new records
-        for not_follower_tw_friend in not_followers_tw_friends_list:
-            not_follower_tw_friend.save()
-    else:
-        # db is not empty
-        # need to synchronize records from the db
-        # with 'not_followers_tw_friends_list'
-
-        # SYNC_STEP_1
-        # deleting all records from the db,
-        # in which 'id_str' is not in the 'not_follower_tw_friend_ids_list'
-        for not_follower_tw_friend in queryset:
-            if not_follower_tw_friend.id_str not in not_follower_tw_friend_ids_list:
-                NotFollowerTwFriend.objects.filter(
-                    id_str__exact=not_follower_tw_friend.id_str).delete()
-
-        # SYNC_STEP_2
-        # create and update all records in the db
-        # with objects from 'not_followers_tw_friends_list'
-        for not_follower_tw_friend in not_followers_tw_friends_list:
-            not_follower_tw_friend.save()
+        # GetFriendIDsPaged(user_id=None, screen_name=None, cursor=-1, count=5000)
+        # method from 'python-twitter' lib, only the not-followers are hydrated
+        next_cursor, _, friend_ids = api_pool.call(
+            'GetFriendIDsPaged', cursor=next_cursor, count=FRIEND_IDS_PAGE_SIZE)
+        metrics.inc('check_pages_fetched_total')
+        pages_fetched += 1
+        metrics.inc('check_friends_analyzed_total', len(friend_ids))
+        friends_analyzed += len(friend_ids)
+
+        not_follower_ids = [
+            friend_id for friend_id in friend_ids if friend_id not in follower_ids_set]
+
+        # Stage the not-followers of the page for the flush to the database
+        for friend in api_pool.lookup_users(not_follower_ids):
+            record = CrawlRecord(friend)
+            sync.add(record)
+            not_followers_found += 1
+
+            if events is not None:
+                events.emit(
+                    EVENT_NOT_FOLLOWER,
+                    NotFollowerTwFriendSerializer(record.to_model(
+                        need_unfollow=record.id_str not in kept_id_str_set)).data)
+
+        # Store the found not-followers and the progress of the check
+        # for the streaming clients after each page
+        if events is not None:
+            events.emit(EVENT_PROGRESS, {
+                'pages_fetched': pages_fetched,
+                'friends_analyzed': friends_analyzed,
+                'not_followers': not_followers_found,
+            })
+            events.flush()
+
+        # The heartbeat of the live check after each page (see api/runs.py)
+        touch_run(run)
+
+    sync.finish()
+    # The follower changes of the activity events applied while the check runs are kept
+    replace_tw_followers(follower_ids_set, since=run.started_at)
+
+    # Keep the NotFollowerTwFriend objects which match the keep rules
+    # with the single 'UPDATE ... WHERE'
+    with metrics.timer('check_span_seconds', span='auto_classification'):
+        metrics.inc('check_rows_auto_kept_total', apply_auto_classification_rules())
@@ -0,0 +1,154 @@
+"""
+Targeted check of the relationships of the given Twitter users (screen names or IDs)
+with the LookupFriendship batches of FRIENDSHIPS_LOOKUP_BATCH_SIZE users
+instead of the full crawl of check_tw_friends():
+    1. The user who is still the friend and isn't follower -- the row is kept
+       (the changed fields are updated as by the full check), the missing row is created,
+       both from UsersLookup of the user
+    2. The user who follows the account now or isn't followed by the account -- the row is deleted
+    3. The user not returned by Twitter API (suspended or deactivated) -- the row is deleted
+Only the NotFollowerTwFriend objects of the given users are changed,
+the follower IDs of the activity events (TwFollower objects) are updated too.
+"""
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import changes, metrics, stats
+from .check_not_followers_tw_friends import CrawlRecord
+from .models import NotFollowerTwFriend, TwFollower
+from .twitter_api import TwitterApiPool, get_twitter_api, get_twitter_credentials
+
+# Max count of the users in the single LookupFriendship call
+FRIENDSHIPS_LOOKUP_BATCH_SIZE = 100
+
+
+def lookup_friendships(api_pool, screen_names, ids):
+    """
+    Return the relationships of the users with the authenticated Twitter account.
+
+    Arguments:
+        api_pool {TwitterApiPool} -- The pool of the credentials
+        screen_names {list} -- Screen names of the users
+        ids {list} -- 'id_str' of the users
+
+    Returns:
+        list -- twitter.UserStatus objects ('following' and 'followed_by' connections)
+    """
+
+    # LookupFriendship(user_id=None, screen_name=None) method from 'python-twitter' lib
+    # https://python-twitter.readthedocs.io/en/latest/twitter.html#twitter.api.Api.LookupFriendship
+    kwargs_list = [
+        {'screen_name': screen_names[i:i + FRIENDSHIPS_LOOKUP_BATCH_SIZE]}
+        for i in range(0, len(screen_names), FRIENDSHIPS_LOOKUP_BATCH_SIZE)
+    ] + [
+        {'user_id': [int(id_str) for id_str in ids[i:i + FRIENDSHIPS_LOOKUP_BATCH_SIZE]]}
+        for i in range(0, len(ids), FRIENDSHIPS_LOOKUP_BATCH_SIZE)
+    ]
+    batches = api_pool.map('LookupFriendship', kwargs_list)
+    return [user_status for batch in batches for user_status in batch]
+
+
+def check_tw_friendships(screen_names=(), ids=()):
+    """
+    Check the relationships of the given users with Twitter account
+    and synchronize their NotFollowerTwFriend objects.
+
+    Arguments:
+        screen_names {list} -- Screen names of the users (default: {()})
+        ids {list} -- 'id_str' of the users (default: {()})
+
+    Returns:
+        dict -- The count of the 'checked' users, the counts of the 'kept', 'updated',
+                'created' and 'deleted' NotFollowerTwFriend objects, the 'not_found'
+                screen names and IDs, and 'id_str' of the users who are the friends
+                and aren't followers ('not_followers')
+    """
+
+    screen_names = sorted(set(screen_names))
+    ids = sorted(set(str(id_str) for id_str in ids))
+
+    api_pool = TwitterApiPool(
+        [get_twitter_api(credential) for credential in get_twitter_credentials()])
+    user_statuses = lookup_friendships(api_pool, screen_names, ids)
+
+    found_screen_names = {user_status.screen_name.lower() for user_status in user_statuses}
+    found_ids = {str(user_status.id) for user_status in user_statuses}
+    not_found_screen_names = [
+        screen_name for screen_name in screen_names
+        if screen_name.lower() not in found_screen_names]
+    not_found_ids = [id_str for id_str in ids if id_str not in found_ids]
+
+    not_followers = {
+        str(user_status.id): user_status for user_status in user_statuses
+        if user_status.following and not user_status.followed_by
+    }
+    existing_rows = NotFollowerTwFriend.objects.in_bulk(list(not_followers))
+
+    # The not-followers are hydrated (the counts for the metrics and the TFF Ratio)
+    records = {
+        record.id_str: record for record in (
+            CrawlRecord(tw_user) for tw_user in api_pool.lookup_users(
+                [int(id_str) for id_str in not_followers]))
+    }
+    created_records = [
+        record for id_str, record in records.items() if id_str not in existing_rows]
+
+    report = {'checked': len(screen_names) + len(ids), 'kept': 0, 'updated': 0}
+    stats_delta = stats.StatsDelta()
+    with transaction.atomic():
+        version = changes.allocate_version()
+
+        for id_str, row in existing_rows.items():
+            # The row of the user not hydrated by UsersLookup is kept as is
+            record = records.get(id_str)
+            if record is not None:
+                updated_row = record.to_model(
+                    need_unfollow=row.need_unfollow, version=version,
+                    last_seen_run=row.last_seen_run)
+            if record is None or not changes.has_changed(row, updated_row):
+                report['kept'] += 1
+                continue
+            updated_row.save(force_update=True)
+            stats_delta.remove_row(row)
+            stats_delta.add_row(updated_row)
+            report['updated'] += 1
+
+        created_rows = [record.to_model(version=version) for record in created_records]
+        NotFollowerTwFriend.objects.bulk_create(created_rows)
+        changes.clear_tombstones([row.id_str for row in created_rows])
+        for row in created_rows:
+            stats_delta.add_row(row)
+        stats.apply_stats_delta(stats_delta)
+        report['created'] = len(created_rows)
+
+        # The users who aren't the friends who aren't followers anymore,
+        # and the users not found (suspended or deactivated),
+        # the screen names are matched case-insensitively as by Twitter API
+        deleted_id_str_set = (found_ids - set(not_followers)) | set(not_found_ids)
+        if not_found_screen_names:
+            deleted_id_str_set.update(NotFollowerTwFriend.objects.annotate(
+                screen_name_lower=Lower('screen_name')
+            ).filter(
+                screen_name_lower__in=[screen_name.lower()
+                                       for screen_name in not_found_screen_names]
+            ).values_list('id_str', flat=True))
+        deleted = NotFollowerTwFriend.objects.filter(id_str__in=list(deleted_id_str_set))
+        stats.subtract_queryset_stats(deleted)
+        report['deleted'] = changes.delete_with_tombstones(deleted, version)
+
+        follower_ids = {
+            str(user_status.id) for user_status in user_statuses if user_status.followed_by}
+        TwFollower.objects.filter(
+            id_str__in=list(found_ids - follower_ids)).delete()
+        TwFollower.objects.bulk_create([
+            TwFollower(id_str=id_str) for id_str in follower_ids - set(
+                TwFollower.objects.filter(id_str__in=list(follower_ids)).values_list(
+                    'id_str', flat=True))
+        ])
+
+    for outcome in ('kept', 'updated', 'created', 'deleted'):
+        metrics.inc('friendships_check_rows_total', report[outcome], outcome=outcome)
+
+    report['not_found'] = not_found_screen_names + not_found_ids
+    report['not_followers'] = sorted(set(existing_rows) | {row.id_str for row in created_rows})
+    return report
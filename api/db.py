@@ -0,0 +1,45 @@
+"""
+Health of the persistent db connections (settings.CONN_MAX_AGE):
+    1. Check the persistent connections before their reuse by the request,
+       at most once per 'settings.DB_CONN_HEALTH_CHECK_INTERVAL' seconds
+    2. Close the unusable or obsolete connections
+       of the background threads and the long-running management commands
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def check_db_connections_health(**kwargs):
+    """
+    Close the persistent db connections which aren't usable anymore
+    (e.g. after the restart of the database server),
+    so Django opens the new connections on the next query.
+    Connected to the 'request_started' signal in ApiConfig.ready().
+    """
+
+    interval = getattr(settings, 'DB_CONN_HEALTH_CHECK_INTERVAL', 30)
+    now = time.monotonic()
+
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        checked_at = getattr(conn, 'health_checked_at', None)
+        if checked_at is not None and now - checked_at < interval:
+            continue
+        conn.health_checked_at = now
+        if not conn.is_usable():
+            conn.close()
+
+
+def close_old_db_connections():
+    """
+    Close the db connections of the current thread which are unusable
+    or older than 'CONN_MAX_AGE'. Call it before and after each unit of work
+    in the background threads and the long-running management commands,
+    where Django doesn't do it with the request signals.
+    """
+
+    for conn in connections.all():
+        conn.close_if_unusable_or_obsolete()
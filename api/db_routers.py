@@ -0,0 +1,128 @@
+"""
+Database router for the read replica:
+    1. Reads go to the replica ('settings.DATABASE_REPLICA_ALIAS'),
+       if it's added to 'settings.DATABASES'
+    2. Writes (check sync, PATCH, unfollow) go to the primary ('default')
+    3. Read-your-writes: after a write, the reads of the same thread go to the primary,
+       and the client is pinned to the primary for
+       'settings.DATABASE_REPLICA_STICKINESS' seconds with a cookie
+    4. The pinning is reset by the middleware for each request, and by unpin()
+       at the start and the end of each unit of work of the background threads
+       and the long-running management commands
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# The cookie which pins the client to the primary after its write request
+PIN_PRIMARY_COOKIE = 'pin_primary_db'
+
+# HTTP methods of the read-only requests
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Pinning to the primary of the current thread, see PrimaryReplicaRouter
+_local = threading.local()
+
+
+def get_replica_alias():
+    """
+    Returns:
+        str -- The alias of the replica database or None if it isn't configured
+    """
+
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    if alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def pin_to_primary():
+    """
+    Pin the reads of the current thread to the primary.
+    """
+
+    _local.pinned = True
+
+
+def unpin():
+    """
+    Unpin the reads of the current thread from the primary
+    (and forget its writes).
+    """
+
+    _local.pinned = False
+    _local.wrote = False
+
+
+def has_written():
+    """
+    Returns:
+        bool -- True if the current thread has written to the primary since unpin()
+    """
+
+    return getattr(_local, 'wrote', False)
+
+
+class PrimaryReplicaRouter(object):
+    """
+    Route the reads to the replica and the writes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica_alias = get_replica_alias()
+        if replica_alias is None:
+            return None
+        if getattr(_local, 'pinned', False) or has_written():
+            return DEFAULT_DB_ALIAS
+        return replica_alias
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The primary and its replica contain the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets the schema from the primary
+        return db != get_replica_alias()
+
+
+class PrimaryDBPinningMiddleware(object):
+    """
+    Pin the requests to the primary database:
+        1. The write requests (not GET, HEAD, OPTIONS)
+        2. The requests of the client with the 'pin_primary_db' cookie,
+           which is set for 'settings.DATABASE_REPLICA_STICKINESS' seconds
+           after the write request of this client
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unpin()
+
+        pinned_until = request.COOKIES.get(PIN_PRIMARY_COOKIE)
+        try:
+            is_pinned = float(pinned_until) > time.time()
+        except (TypeError, ValueError):
+            is_pinned = False
+
+        if request.method not in SAFE_METHODS or is_pinned:
+            pin_to_primary()
+
+        response = self.get_response(request)
+
+        if has_written() or request.method not in SAFE_METHODS:
+            stickiness = getattr(settings, 'DATABASE_REPLICA_STICKINESS', 5)
+            response.set_cookie(
+                PIN_PRIMARY_COOKIE, str(time.time() + stickiness),
+                max_age=stickiness, httponly=True)
+
+        unpin()
+
+        return response
@@ -0,0 +1,337 @@
+"""
+Bulk export of the NotFollowerTwFriend objects as CSV, NDJSON or Parquet:
+    1. Rows are read with the server-side cursor (QuerySet.iterator() on Postgres)
+       or with 'COPY ... TO STDOUT' for CSV on Postgres,
+       so the memory stays flat for any size of the table
+    2. Rows are written in the batches, without model instances
+       and serializer dicts
+"""
+import csv
+import importlib.util
+import io
+import json
+import queue
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from .models import NotFollowerTwFriend
+from .serializers import NotFollowerTwFriendSerializer
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+
+# Exported fields (the same as in the API responses)
+EXPORT_FIELDS = list(NotFollowerTwFriendSerializer.Meta.fields)
+
+# pyarrow types of EXPORT_FIELDS in the Parquet export:
+# the name of the pyarrow type factory and its arguments
+PARQUET_TYPES = {
+    'id_str': ('string',),
+    'screen_name': ('string',),
+    'name': ('string',),
+    'description': ('string',),
+    'statuses_count': ('int64',),
+    'followers_count': ('int64',),
+    'friends_count': ('int64',),
+    'created_at': ('string',),
+    'location': ('string',),
+    'avg_tweetsperday': ('decimal128', 12, 2),
+    'tff_ratio': ('decimal128', 12, 2),
+    'need_unfollow': ('bool_',),
+    'version': ('int64',),
+}
+
+# Count of the rows in the single written batch (CSV/NDJSON chunk or Parquet row group)
+EXPORT_BATCH_SIZE = 2000
+
+PARQUET_UNAVAILABLE_MESSAGE = 'Parquet export requires the "pyarrow" package.'
+
+# Seconds of the wait for the free place in the queue of the COPY chunks
+# before the check whether the client is still reading the export
+COPY_QUEUE_PUT_TIMEOUT = 1
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def iter_export_rows():
+    """
+    Generate all the NotFollowerTwFriend rows as tuples of EXPORT_FIELDS values,
+    ordered by 'id_str'. On Postgres QuerySet.iterator() reads the rows
+    with the server-side cursor.
+
+    Yields:
+        tuple -- The values of EXPORT_FIELDS
+    """
+
+    queryset = NotFollowerTwFriend.objects.with_avg_tweetsperday().order_by(
+        'id_str').values_list(*EXPORT_FIELDS)
+    return queryset.iterator()
+
+
+def _format_csv_value(value):
+    """
+    Format the boolean values as 'true'/'false' (the same as COPY on Postgres)
+    """
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def iter_csv(rows):
+    """
+    Generate the CSV chunks (header and the batches of EXPORT_BATCH_SIZE rows).
+
+    Arguments:
+        rows {iterable} -- Tuples of EXPORT_FIELDS values
+
+    Yields:
+        str -- The CSV chunk
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_format_csv_value(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """
+    Generate the NDJSON chunks (the batches of EXPORT_BATCH_SIZE lines),
+    decimal values are strings as in the API responses.
+
+    Arguments:
+        rows {iterable} -- Tuples of EXPORT_FIELDS values
+
+    Yields:
+        str -- The NDJSON chunk
+    """
+
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def get_copy_csv_sql():
+    """
+    Returns:
+        str -- 'COPY ... TO STDOUT' query of the CSV export on Postgres
+    """
+
+    quote_name = connection.ops.quote_name
+    query = NotFollowerTwFriend.objects.with_avg_tweetsperday().query
+    compiler = query.get_compiler(connection=connection)
+    columns = []
+    for field_name in EXPORT_FIELDS:
+        if field_name in query.annotations:
+            # The SQL expression of the annotation (e.g. 'avg_tweetsperday'),
+            # its params are integers
+            expression_sql, params = compiler.compile(query.annotations[field_name])
+            columns.append('%s AS %s' % (expression_sql % tuple(params), quote_name(field_name)))
+            continue
+
+        column = quote_name(NotFollowerTwFriend._meta.get_field(field_name).column)
+        if field_name == 'need_unfollow':
+            column = "CASE WHEN %s THEN 'true' ELSE 'false' END AS %s" % (column, column)
+        columns.append(column)
+
+    return 'COPY (SELECT %s FROM %s ORDER BY %s) TO STDOUT WITH CSV HEADER' % (
+        ', '.join(columns),
+        quote_name(NotFollowerTwFriend._meta.db_table),
+        quote_name('id_str'),
+    )
+
+
+def can_copy():
+    """
+    Returns:
+        bool -- True if 'COPY ... TO STDOUT' is available (Postgres with psycopg2)
+    """
+
+    return connection.vendor == 'postgresql'
+
+
+def copy_csv_to(file):
+    """
+    Write the CSV export to the 'file' with 'COPY ... TO STDOUT' on Postgres.
+
+    Arguments:
+        file {file object} -- The output file (text or binary)
+    """
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(get_copy_csv_sql(), file)
+
+
+class ExportCancelled(Exception):
+    """
+    The client has stopped reading the export.
+    """
+
+
+def _put_chunk(chunks_queue, chunk, cancelled):
+    """
+    Put the 'chunk' to the bounded queue, waiting for the free place
+    until the 'cancelled' event (threading.Event) is set.
+
+    Raises:
+        ExportCancelled -- The 'cancelled' event is set
+    """
+
+    while not cancelled.is_set():
+        try:
+            chunks_queue.put(chunk, timeout=COPY_QUEUE_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            continue
+    raise ExportCancelled()
+
+
+class _QueueWriter(object):
+    """
+    File-like object which puts the written chunks to the bounded queue,
+    the write raises ExportCancelled (which stops the COPY)
+    when the 'cancelled' event is set
+    """
+
+    def __init__(self, chunks_queue, cancelled):
+        self.chunks_queue = chunks_queue
+        self.cancelled = cancelled
+
+    def write(self, data):
+        _put_chunk(self.chunks_queue, data, self.cancelled)
+        return len(data)
+
+
+def iter_copy_csv():
+    """
+    Generate the CSV chunks written by 'COPY ... TO STDOUT' on Postgres.
+    COPY writes to the bounded queue in the separate thread,
+    so the memory stays flat while the client reads the response.
+    When the generator is closed before the end (the client has disconnected),
+    the COPY is stopped and its connection is closed.
+
+    Yields:
+        bytes|str -- The CSV chunk
+    """
+
+    chunks_queue = queue.Queue(maxsize=64)
+    cancelled = threading.Event()
+    end_of_copy = object()
+    errors = []
+
+    def copy_to_queue():
+        try:
+            copy_csv_to(_QueueWriter(chunks_queue, cancelled))
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            errors.append(error)
+        finally:
+            # Closing the connection also ends the COPY stopped by ExportCancelled
+            connection.close()
+            try:
+                _put_chunk(chunks_queue, end_of_copy, cancelled)
+            except ExportCancelled:
+                pass
+
+    threading.Thread(target=copy_to_queue, daemon=True).start()
+
+    try:
+        while True:
+            chunk = chunks_queue.get()
+            if chunk is end_of_copy:
+                break
+            yield chunk
+    finally:
+        cancelled.set()
+
+    if errors:
+        raise errors[0]
+
+
+def iter_export(export_format):
+    """
+    Generate the CSV or NDJSON export chunks
+    (CSV with 'COPY ... TO STDOUT' where available).
+
+    Arguments:
+        export_format {str} -- 'csv' or 'ndjson'
+
+    Yields:
+        str|bytes -- The export chunk
+    """
+
+    if export_format == 'csv':
+        if can_copy():
+            return iter_copy_csv()
+        return iter_csv(iter_export_rows())
+    return iter_ndjson(iter_export_rows())
+
+
+def is_parquet_available():
+    """
+    Returns:
+        bool -- True if the optional 'pyarrow' package of the Parquet export is installed
+    """
+
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def write_parquet(file):
+    """
+    Write the Parquet export to the 'file' with row groups of EXPORT_BATCH_SIZE rows.
+    Requires the optional 'pyarrow' package (see is_parquet_available()).
+
+    Arguments:
+        file {file object} -- The binary output file
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured(PARQUET_UNAVAILABLE_MESSAGE)
+
+    # The schema follows EXPORT_FIELDS, so the columns match the exported rows
+    schema = pyarrow.schema([
+        (field_name, getattr(pyarrow, PARQUET_TYPES[field_name][0])(
+            *PARQUET_TYPES[field_name][1:]))
+        for field_name in EXPORT_FIELDS
+    ])
+
+    def write_batch(writer, batch):
+        columns = list(zip(*batch))
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+            schema=schema
+        ))
+
+    with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+        batch = []
+        for row in iter_export_rows():
+            batch.append(row)
+            if len(batch) == EXPORT_BATCH_SIZE:
+                write_batch(writer, batch)
+                batch = []
+        if batch:
+            write_batch(writer, batch)
@@ -0,0 +1,303 @@
+"""
+Bulk import of the keep/unfollow decisions from CSV or NDJSON file:
+    1. Parse the decisions for Twitter friends by 'id_str' or 'screen_name'
+    2. Load them into the staging table (with 'COPY ... FROM STDIN' on Postgres)
+    3. Apply them to the NotFollowerTwFriend objects with the single set-based UPDATE
+    4. Report the decisions which don't match any NotFollowerTwFriend object
+
+CSV file has the header with 'id_str' and/or 'screen_name' columns and
+'decision' ('keep' or 'unfollow') or 'need_unfollow' ('true' or 'false') column.
+NDJSON file has the same keys in each line.
+"""
+import csv
+import io
+import json
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Lower
+
+from . import changes, stats
+from .models import NotFollowerTwFriend, NeedUnfollowDecisionStaging
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Count of the decisions in the single staging table insert (COPY or bulk_create)
+IMPORT_BATCH_SIZE = 5000
+
+# Max count of the unmatched decisions (and parse errors) listed in the report
+REPORT_LIMIT = 1000
+
+DECISIONS = {
+    'keep': False,
+    'unfollow': True,
+}
+
+BOOLEAN_VALUES = {
+    'true': True, '1': True, 'yes': True,
+    'false': False, '0': False, 'no': False,
+}
+
+
+class DecisionParseError(ValueError):
+    """
+    The line of the imported file isn't a valid decision
+    """
+
+
+def parse_decision(record):
+    """
+    Parse the decision record (dict of the CSV row or the NDJSON line).
+
+    Arguments:
+        record {dict} -- 'id_str' and/or 'screen_name',
+                         'decision' ('keep'|'unfollow') or 'need_unfollow' (bool)
+
+    Returns:
+        tuple -- (id_str, screen_name, need_unfollow)
+
+    Raises:
+        DecisionParseError -- The record isn't a valid decision
+    """
+
+    id_str = str(record.get('id_str') or '').strip()
+    screen_name = str(record.get('screen_name') or '').strip().lstrip('@')
+    if not id_str and not screen_name:
+        raise DecisionParseError('"id_str" or "screen_name" is required')
+    for field_name, value in (('id_str', id_str), ('screen_name', screen_name)):
+        # The longer values would fail the load of the whole staging chunk
+        max_length = NeedUnfollowDecisionStaging._meta.get_field(field_name).max_length
+        if len(value) > max_length:
+            raise DecisionParseError(
+                '"%s" must be at most %s characters' % (field_name, max_length))
+
+    if record.get('decision') not in (None, ''):
+        decision = str(record['decision']).strip().lower()
+        if decision not in DECISIONS:
+            raise DecisionParseError('"decision" must be "keep" or "unfollow"')
+        need_unfollow = DECISIONS[decision]
+    elif isinstance(record.get('need_unfollow'), bool):
+        need_unfollow = record['need_unfollow']
+    else:
+        value = str(record.get('need_unfollow') or '').strip().lower()
+        if value not in BOOLEAN_VALUES:
+            raise DecisionParseError('"decision" or "need_unfollow" is required')
+        need_unfollow = BOOLEAN_VALUES[value]
+
+    return id_str, screen_name, need_unfollow
+
+
+def iter_records(text_file, import_format):
+    """
+    Generate the records of the CSV or NDJSON file with their line numbers.
+
+    Arguments:
+        text_file {file object} -- The text file
+        import_format {str} -- 'csv' or 'ndjson'
+
+    Yields:
+        tuple -- (line, record dict or DecisionParseError)
+    """
+
+    if import_format == 'csv':
+        reader = csv.DictReader(text_file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line, text in enumerate(text_file, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            yield line, DecisionParseError('invalid JSON')
+            continue
+        if not isinstance(record, dict):
+            yield line, DecisionParseError('JSON object is required')
+            continue
+        yield line, record
+
+
+def _copy_to_staging(rows):
+    """
+    Load the staging rows with 'COPY ... FROM STDIN' on Postgres
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row.batch, row.line, row.id_str, row.screen_name,
+            'true' if row.need_unfollow else 'false'
+        ])
+    buffer.seek(0)
+
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            'COPY %s (%s) FROM STDIN WITH CSV' % (
+                quote_name(NeedUnfollowDecisionStaging._meta.db_table),
+                ', '.join(quote_name(column) for column in (
+                    'batch', 'line', 'id_str', 'screen_name', 'need_unfollow')),
+            ),
+            buffer
+        )
+
+
+def load_staging(batch, records):
+    """
+    Parse the records and load the valid decisions into the staging table
+    in the chunks of IMPORT_BATCH_SIZE rows.
+
+    Arguments:
+        batch {str} -- ID of the import batch
+        records {iterable} -- (line, record) tuples, see iter_records()
+
+    Returns:
+        tuple -- (count of the loaded decisions, count of the parse errors,
+                  list of the first REPORT_LIMIT parse errors)
+    """
+
+    load_rows = _copy_to_staging if connection.vendor == 'postgresql' \
+        else NeedUnfollowDecisionStaging.objects.bulk_create
+
+    rows = []
+    loaded_count = 0
+    errors_count = 0
+    errors = []
+    for line, record in records:
+        try:
+            if isinstance(record, DecisionParseError):
+                raise record
+            id_str, screen_name, need_unfollow = parse_decision(record)
+        except DecisionParseError as error:
+            errors_count += 1
+            if len(errors) < REPORT_LIMIT:
+                errors.append({'line': line, 'detail': str(error)})
+            continue
+
+        rows.append(NeedUnfollowDecisionStaging(
+            batch=batch,
+            line=line,
+            id_str=id_str,
+            screen_name=screen_name,
+            need_unfollow=need_unfollow,
+        ))
+        if len(rows) == IMPORT_BATCH_SIZE:
+            load_rows(rows)
+            loaded_count += len(rows)
+            rows = []
+
+    if rows:
+        load_rows(rows)
+        loaded_count += len(rows)
+
+    return loaded_count, errors_count, errors
+
+
+def apply_staging(batch):
+    """
+    Apply the decisions of the import batch to the NotFollowerTwFriend objects
+    with the single set-based UPDATE. The decision matches the object
+    by 'id_str' or by 'screen_name' (case-insensitive, as Twitter does),
+    the last line wins for the same object. The objects which already have
+    the decided 'need_unfollow' aren't updated (and don't get the new version).
+
+    Arguments:
+        batch {str} -- ID of the import batch
+
+    Returns:
+        int -- Count of the updated NotFollowerTwFriend objects
+    """
+
+    decisions = NeedUnfollowDecisionStaging.objects.filter(batch=batch).annotate(
+        screen_name_lower=Lower('screen_name')
+    ).filter(
+        Q(id_str=OuterRef('id_str')) | Q(screen_name_lower=OuterRef('screen_name_lower'))
+    ).order_by('-line')
+    decision = Subquery(decisions.values('need_unfollow')[:1])
+    changed = NotFollowerTwFriend.objects.annotate(
+        screen_name_lower=Lower('screen_name')
+    ).annotate(
+        has_decision=Exists(decisions)
+    ).filter(has_decision=True).exclude(need_unfollow=decision)
+
+    with transaction.atomic():
+        # The decisions change only 'need_unfollow' counter of the statistics,
+        # each changed object flips its 'need_unfollow'
+        need_unfollow_before = changed.filter(need_unfollow=True).count()
+        updated_count = changed.update(
+            need_unfollow=decision,
+            version=changes.allocate_version(),
+        )
+        stats.apply_stats_delta({
+            stats.NEED_UNFOLLOW_KEY: updated_count - 2 * need_unfollow_before,
+        })
+
+    return updated_count
+
+
+def get_unmatched(batch):
+    """
+    Return the decisions of the import batch
+    which don't match any NotFollowerTwFriend object.
+
+    Arguments:
+        batch {str} -- ID of the import batch
+
+    Returns:
+        tuple -- (count of the unmatched decisions,
+                  list of the first REPORT_LIMIT unmatched decisions)
+    """
+
+    not_followers = NotFollowerTwFriend.objects.annotate(
+        screen_name_lower=Lower('screen_name')
+    ).filter(
+        Q(id_str=OuterRef('id_str')) | Q(screen_name_lower=OuterRef('screen_name_lower'))
+    )
+    unmatched = NeedUnfollowDecisionStaging.objects.filter(batch=batch).annotate(
+        screen_name_lower=Lower('screen_name')
+    ).annotate(
+        is_matched=Exists(not_followers)
+    ).filter(is_matched=False).order_by('line')
+
+    return unmatched.count(), list(
+        unmatched.values('line', 'id_str', 'screen_name', 'need_unfollow')[:REPORT_LIMIT])
+
+
+def import_need_unfollow_decisions(text_file, import_format):
+    """
+    Import the keep/unfollow decisions from the CSV or NDJSON file.
+
+    Arguments:
+        text_file {file object} -- The text file
+        import_format {str} -- 'csv' or 'ndjson'
+
+    Returns:
+        dict -- The import report:
+                'decisions' -- count of the loaded decisions
+                'updated' -- count of the updated NotFollowerTwFriend objects
+                'unmatched_count', 'unmatched' -- the decisions without
+                                                  NotFollowerTwFriend object
+                'errors_count', 'errors' -- the lines which aren't valid decisions
+    """
+
+    batch = uuid.uuid4().hex
+
+    with transaction.atomic():
+        loaded_count, errors_count, errors = load_staging(
+            batch, iter_records(text_file, import_format))
+        updated_count = apply_staging(batch)
+        unmatched_count, unmatched = get_unmatched(batch)
+        NeedUnfollowDecisionStaging.objects.filter(batch=batch).delete()
+
+    return {
+        'decisions': loaded_count,
+        'updated': updated_count,
+        'unmatched_count': unmatched_count,
+        'unmatched': unmatched,
+        'errors_count': errors_count,
+        'errors': errors,
+    }
@@ -0,0 +1,311 @@
+"""
+The load test of the REST endpoints of the Twitter friends who aren't followers:
+    1. seed_not_followers_tw_friends() replaces the NotFollowerTwFriend objects
+       with the rows of the synthetic account of the Twitter API stub
+       (see api/twitter_stub.py), from 1k to 1M rows
+    2. LoadRunner sends the mix of the list, PATCH, check and unfollow requests
+       to the running server by 'concurrency' threads,
+       the server runs with 'settings.TWITTER_API_CLASS' of the stub
+    3. LoadReport has the throughput, the p50/p95/p99 latencies
+       and the error rates of each operation
+
+Example of the script (see also 'loadtest' management command):
+    runner = LoadRunner('http://localhost:8000', 'Token <key>',
+                        parse_mix('list=80,patch=15,check=4,unfollow=1'),
+                        concurrency=16, duration=60, screen_names=['stub_1'])
+    print(runner.run().format())
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.db import transaction
+from django.urls import reverse
+
+from . import stats
+from .models import NotFollowerTwFriend, NotFollowerTwFriendTombstone
+from .twitter_stub import is_stub_follower, make_stub_user
+
+# Count of the NotFollowerTwFriend objects in the single INSERT query of the seed
+SEED_BATCH_SIZE = 5000
+
+MIN_SEED_ROWS = 1000
+MAX_SEED_ROWS = 1000000
+
+OPERATIONS = ('list', 'patch', 'check', 'unfollow')
+DEFAULT_MIX = 'list=80,patch=15,check=4,unfollow=1'
+
+
+def seed_not_followers_tw_friends(rows):
+    """
+    Replace the NotFollowerTwFriend objects with the 'rows' not-followers
+    of the synthetic account (the friends with the odd IDs), each third one is kept.
+    The stub must have 2 * 'rows' friends ('settings.TWITTER_STUB_FRIENDS_COUNT'),
+    so the check with the stub finds the same rows.
+
+    Arguments:
+        rows {int} -- Count of the rows, from MIN_SEED_ROWS to MAX_SEED_ROWS
+
+    Returns:
+        int -- TWITTER_STUB_FRIENDS_COUNT for the server
+    """
+
+    if not MIN_SEED_ROWS <= rows <= MAX_SEED_ROWS:
+        raise ValueError('The count of the rows must be from %s to %s.' % (
+            MIN_SEED_ROWS, MAX_SEED_ROWS))
+
+    # The check imports python-twitter, so it isn't imported with the runner
+    from .check_not_followers_tw_friends import CrawlRecord
+
+    friends_count = 2 * rows
+    with transaction.atomic():
+        NotFollowerTwFriend.objects.all().delete()
+        NotFollowerTwFriendTombstone.objects.all().delete()
+
+        batch = []
+        for user_id in range(1, friends_count + 1):
+            if is_stub_follower(user_id):
+                continue
+            batch.append(CrawlRecord(make_stub_user(user_id)).to_model(
+                need_unfollow=user_id % 3 != 0))
+            if len(batch) >= SEED_BATCH_SIZE:
+                NotFollowerTwFriend.objects.bulk_create(batch)
+                batch = []
+        NotFollowerTwFriend.objects.bulk_create(batch)
+
+        stats.recompute_stats()
+
+    return friends_count
+
+
+def parse_mix(mix):
+    """
+    Parse the mix of the operations, e.g. 'list=80,patch=15,check=4,unfollow=1'.
+
+    Returns:
+        dict -- The weights of the operations
+
+    Raises:
+        ValueError -- The unknown operation or the invalid weight
+    """
+
+    weights = {}
+    for item in mix.split(','):
+        operation, _, weight = item.strip().partition('=')
+        if operation not in OPERATIONS:
+            raise ValueError('Unknown operation "%s", must be one of %s.' % (
+                operation, ', '.join(OPERATIONS)))
+        weights[operation] = float(weight or 1)
+        if weights[operation] < 0:
+            raise ValueError('The weight of "%s" must be >= 0.' % operation)
+    if not any(weights.values()):
+        raise ValueError('At least one operation must have the weight > 0.')
+    return weights
+
+
+def percentile(sorted_values, percent):
+    """
+    Return the 'percent' percentile of the sorted list of values
+    """
+
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadReport(object):
+    """
+    The latencies, the status codes and the errors of the sent requests
+    """
+
+    def __init__(self):
+        self.results = {operation: [] for operation in OPERATIONS}
+        self.lock = threading.Lock()
+        self.elapsed = 0.0
+
+    def add(self, operation, latency, status_code):
+        """
+        Add the result of the request, 'status_code' is None for the connection error.
+        """
+
+        with self.lock:
+            self.results[operation].append((latency, status_code))
+
+    def summarize(self, results):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, status_code in results if status_code is None or status_code >= 400)
+        return {
+            'requests': len(results),
+            'throughput': len(results) / self.elapsed if self.elapsed else 0.0,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'errors': errors,
+            'error_rate': errors / len(results) if results else 0.0,
+        }
+
+    def summary(self):
+        """
+        Returns:
+            dict -- The summaries of the operations and of all the requests ('total')
+        """
+
+        summary = {
+            operation: self.summarize(results)
+            for operation, results in self.results.items() if results
+        }
+        summary['total'] = self.summarize(
+            [result for results in self.results.values() for result in results])
+        return summary
+
+    def format(self):
+        """
+        Returns:
+            str -- The summary as the text table
+        """
+
+        lines = ['%-10s %9s %10s %9s %9s %9s %8s' % (
+            'operation', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors')]
+        for operation, summary in self.summary().items():
+            lines.append('%-10s %9d %10.1f %9.1f %9.1f %9.1f %7.1f%%' % (
+                operation, summary['requests'], summary['throughput'], summary['p50_ms'],
+                summary['p95_ms'], summary['p99_ms'], summary['error_rate'] * 100))
+        return '\n'.join(lines)
+
+
+class LoadRunner(object):
+    """
+    Send the mix of the requests to the running server by 'concurrency' threads
+    until 'requests' are sent or 'duration' seconds are passed.
+    """
+
+    def __init__(self, base_url, authorization, mix, concurrency=1, requests=None,
+                 duration=None, screen_names=(), list_query='', timeout=60, seed=None):
+        """
+        Arguments:
+            base_url {str} -- URL of the server, e.g. 'http://localhost:8000'
+            authorization {str} -- 'Authorization' header, e.g. 'Token <key>'
+            mix {dict} -- The weights of the operations (see parse_mix())
+            concurrency {int} -- Count of the threads (default: {1})
+            requests {int} -- Count of the requests (default: {None})
+            duration {float} -- Seconds of the load (default: {None})
+            screen_names {list} -- Screen names of the PATCH requests (default: {()})
+            list_query {str} -- Query string of the list requests, e.g. 'fields=id_str'
+                                (default: {''})
+            timeout {float} -- Seconds of the request timeout (default: {60})
+            seed {int} -- Seed of the random choices (default: {None})
+        """
+
+        if requests is None and duration is None:
+            raise ValueError('The count of the requests or the duration must be set.')
+        if mix.get('patch') and not screen_names:
+            raise ValueError('The screen names of the PATCH requests must be set.')
+
+        self.base_url = base_url.rstrip('/')
+        self.authorization = authorization
+        self.operations = [operation for operation in OPERATIONS if mix.get(operation)]
+        self.weights = [mix[operation] for operation in self.operations]
+        self.concurrency = max(concurrency, 1)
+        self.requests = requests
+        self.duration = duration
+        self.screen_names = list(screen_names)
+        self.list_query = list_query
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sent = 0
+
+    def get_request(self, operation):
+        """
+        Return the urllib.request.Request object of the 'operation'.
+        """
+
+        data = None
+        if operation == 'list':
+            method, path = 'GET', reverse('get_not_followers_tw_friends')
+            if self.list_query:
+                path += '?' + self.list_query
+        elif operation == 'patch':
+            with self.lock:
+                screen_name = self.random.choice(self.screen_names)
+                need_unfollow = self.random.random() < 0.5
+            method = 'PATCH'
+            path = reverse('patch_not_followers_tw_friends_need_unfollow_update',
+                           kwargs={'screen_name': screen_name})
+            data = json.dumps({'need_unfollow': need_unfollow}).encode()
+        elif operation == 'check':
+            method, path = 'GET', reverse('get_not_followers_tw_friends_check')
+        else:
+            method, path = 'DELETE', reverse('delete_not_followers_tw_friends_unfollow')
+
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        request.add_header('Authorization', self.authorization)
+        request.add_header('Accept', 'application/json')
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        return request
+
+    def send(self, operation):
+        """
+        Send the request of the 'operation'.
+
+        Returns:
+            tuple -- (latency in seconds, the status code or None for the connection error)
+        """
+
+        request = self.get_request(operation)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status_code = response.status
+        except urllib.error.HTTPError as error:
+            status_code = error.code
+        except (urllib.error.URLError, OSError):
+            status_code = None
+        return time.perf_counter() - started, status_code
+
+    def next_operation(self, deadline):
+        """
+        Return the next operation or None at the end of the load.
+        """
+
+        with self.lock:
+            if self.requests is not None and self.sent >= self.requests:
+                return None
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            self.sent += 1
+            return self.random.choices(self.operations, weights=self.weights)[0]
+
+    def run(self):
+        """
+        Send the requests by the threads and return the report.
+
+        Returns:
+            LoadReport -- The results of the requests
+        """
+
+        report = LoadReport()
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration is not None else None
+
+        def worker():
+            while True:
+                operation = self.next_operation(deadline)
+                if operation is None:
+                    return
+                report.add(operation, *self.send(operation))
+
+        threads = [threading.Thread(target=worker) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report.elapsed = time.perf_counter() - started
+        return report
@@ -0,0 +1,235 @@
+"""
+Benchmarks of the API:
+    list -- requests per second of the list endpoint
+            with the different CONN_MAX_AGE values of the 'default' db connection
+    startup -- cold start of a new worker process (django.setup(), URLconf import)
+               and the time of its first requests (stats and schema)
+    auth -- per-request cost of the authentication classes
+            (Basic, Token and the signed token with and without the cache)
+
+Example:
+    $ python manage.py benchmark list --requests 1000 --conn-max-age 0 60
+    $ python manage.py benchmark startup --runs 10
+    $ python manage.py benchmark auth --requests 200
+"""
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.urls import reverse
+
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from ...authentication import SignedTokenAuthentication, create_signed_token, get_token_cache
+
+
+# The script of the new worker process measured by 'startup' benchmark
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_finished = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf_finished = time.perf_counter()
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+client = APIClient(HTTP_HOST='localhost')
+client.force_authenticate(user=User.objects.get(pk=int(sys.argv[1])))
+timings = {
+    'setup': setup_finished - started,
+    'urlconf': urlconf_finished - setup_finished,
+}
+for name, url in zip(('first_stats_request', 'first_schema_request'), sys.argv[2:]):
+    request_started = time.perf_counter()
+    status_code = client.get(url).status_code
+    timings[name] = time.perf_counter() - request_started
+    if status_code != 200:
+        sys.exit('%s returned %s' % (url, status_code))
+timings['total'] = time.perf_counter() - started
+timings['twitter_imported'] = 'twitter' in sys.modules
+print(json.dumps(timings))
+"""
+
+
+def percentile(sorted_values, percent):
+    """
+    Return the 'percent' percentile of the sorted list of values
+    """
+
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Run the benchmark of the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['list', 'startup', 'auth'])
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Count of the requests for each measurement')
+        parser.add_argument('--conn-max-age', type=int, nargs='+', default=[0, 60],
+                            help='CONN_MAX_AGE values of the default db connection to compare')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Count of the started worker processes (startup)')
+        parser.add_argument('--username', default=None,
+                            help='User of the requests (the first superuser by default)')
+
+    def get_user(self, username):
+        """
+        Return the User object for the authenticated requests
+        """
+
+        users = User.objects.all()
+        users = users.filter(username=username) if username else users.filter(is_superuser=True)
+        user = users.first()
+        if user is None:
+            raise CommandError('No user for the requests, create a superuser or use --username')
+        return user
+
+    def measure_requests(self, client, url, count):
+        """
+        Send 'count' GET requests to the 'url' and return the latencies (seconds)
+        """
+
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError('%s returned %s' % (url, response.status_code))
+        return latencies
+
+    def report(self, label, latencies):
+        """
+        Write the requests per second and the latency percentiles
+        """
+
+        latencies = sorted(latencies)
+        self.stdout.write(
+            '%-24s %8.1f req/s   p50 %7.2f ms   p99 %7.2f ms' % (
+                label,
+                len(latencies) / sum(latencies),
+                percentile(latencies, 50) * 1000,
+                percentile(latencies, 99) * 1000,
+            )
+        )
+
+    def benchmark_list(self, options):
+        """
+        Requests per second of the list endpoint with the different CONN_MAX_AGE values.
+        The test client sends the request_started/request_finished signals,
+        so the connection is closed or reused as in the server.
+        """
+
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user=self.get_user(options['username']))
+        url = reverse('get_not_followers_tw_friends')
+        conn = connections[DEFAULT_DB_ALIAS]
+
+        for conn_max_age in options['conn_max_age']:
+            conn.close()
+            conn.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+            # Warm-up
+            self.measure_requests(client, url, min(options['requests'], 20))
+            latencies = self.measure_requests(client, url, options['requests'])
+            self.report('CONN_MAX_AGE=%s' % conn_max_age, latencies)
+
+        conn.close()
+
+    def benchmark_startup(self, options):
+        """
+        Cold start of the new worker processes: django.setup(), the URLconf import
+        (with the views) and the first requests of the stats and the schema.
+        """
+
+        user = self.get_user(options['username'])
+        urls = [reverse('get_not_followers_tw_friends_stats'), reverse('get_api_schema')]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+
+        runs = []
+        for _ in range(options['runs']):
+            process = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT, str(user.pk)] + urls,
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True)
+            if process.returncode != 0:
+                raise CommandError(process.stderr.strip())
+            runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+        for name in ('setup', 'urlconf', 'first_stats_request', 'first_schema_request', 'total'):
+            timings = sorted(run[name] for run in runs)
+            self.stdout.write('%-24s p50 %8.1f ms   max %8.1f ms' % (
+                name, percentile(timings, 50) * 1000, timings[-1] * 1000))
+        self.stdout.write('python-twitter imported: %s' % any(
+            run['twitter_imported'] for run in runs))
+
+    def measure_authentication(self, authenticator, authorization, count, before=None):
+        """
+        Call authenticator.authenticate() 'count' times for the request
+        with the 'authorization' header and return the latencies (seconds)
+        """
+
+        django_request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=authorization)
+        latencies = []
+        for _ in range(count):
+            if before is not None:
+                before()
+            request = Request(django_request)
+            started = time.perf_counter()
+            result = authenticator.authenticate(request)
+            latencies.append(time.perf_counter() - started)
+            if result is None:
+                raise CommandError('%s did not authenticate' % type(authenticator).__name__)
+        return latencies
+
+    def benchmark_auth(self, options):
+        """
+        Per-request cost of the authentication classes for the temporary user:
+        BasicAuthentication (the password hash), TokenAuthentication (the db query),
+        SignedTokenAuthentication with the empty cache (the signature and the db lookups)
+        and with the cached token (the signature isn't even verified again).
+        """
+
+        password = uuid.uuid4().hex
+        user = User.objects.create_user(
+            username='benchmark-%s' % uuid.uuid4().hex[:8], password=password)
+        try:
+            basic = 'Basic %s' % base64.b64encode(
+                ('%s:%s' % (user.username, password)).encode()).decode()
+            token = 'Token %s' % Token.objects.create(user=user).key
+            signed = 'Signed %s' % create_signed_token(user)['token']
+            cache = get_token_cache()
+
+            for label, authenticator, authorization, before in (
+                    ('BasicAuthentication', BasicAuthentication(), basic, None),
+                    ('TokenAuthentication', TokenAuthentication(), token, None),
+                    ('Signed (no cache)', SignedTokenAuthentication(), signed, cache.clear),
+                    ('Signed (cached)', SignedTokenAuthentication(), signed, None)):
+                # Warm-up
+                self.measure_authentication(
+                    authenticator, authorization, min(options['requests'], 5), before)
+                latencies = self.measure_authentication(
+                    authenticator, authorization, options['requests'], before)
+                self.report(label, latencies)
+        finally:
+            user.delete()
+
+    def handle(self, *args, **options):
+        getattr(self, 'benchmark_%s' % options['target'])(options)
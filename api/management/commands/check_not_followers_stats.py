@@ -0,0 +1,34 @@
+"""
+Verify the summary statistics counters of the Twitter friends who aren't followers
+against the full recomputation (see api/stats.py).
+
+Example:
+    $ python manage.py check_not_followers_stats --repair
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from ...stats import recompute_stats, verify_stats
+
+
+class Command(BaseCommand):
+    help = 'Verify the summary statistics counters against the full recomputation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', default=False,
+                            help='Replace the counters with the recomputed values')
+
+    def handle(self, *args, **options):
+        mismatches = verify_stats()
+        for key, (stored, recomputed) in sorted(mismatches.items()):
+            self.stdout.write('%s: stored %s, recomputed %s' % (key, stored, recomputed))
+
+        if not mismatches:
+            self.stdout.write('The counters are consistent')
+            return
+
+        if not options['repair']:
+            raise CommandError(
+                '%s counters are inconsistent, use --repair to recompute them' % len(mismatches))
+
+        recompute_stats()
+        self.stdout.write('The counters are recomputed')
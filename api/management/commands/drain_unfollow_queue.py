@@ -0,0 +1,47 @@
+"""
+Drain the unfollow queue within the daily and per-window budgets
+(see api/unfollow_queue.py).
+
+Example:
+    $ python manage.py drain_unfollow_queue --enqueue --loop
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...db_routers import unpin
+from ...unfollow_queue import drain_unfollow_queue, enqueue_need_unfollow, get_queue_status
+
+
+class Command(BaseCommand):
+    help = 'Drain the unfollow queue within the daily and per-window budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enqueue', action='store_true', default=False,
+                            help='Enqueue all the Twitter friends with need_unfollow=True first')
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help='Keep draining across the rate limit windows '
+                                 'until the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            self.stdout.write('Enqueued %s Twitter friends' % enqueue_need_unfollow())
+
+        while True:
+            # Each window of the long-running worker isn't pinned to the primary db
+            # by the writes of the previous one
+            unpin()
+            result = drain_unfollow_queue()
+            self.stdout.write('Unfollowed %(unfollowed)s, skipped %(skipped)s, '
+                              'failed %(failed)s' % result)
+
+            queue_status = get_queue_status()
+            if queue_status['depth'] == 0 or not options['loop']:
+                break
+
+            self.stdout.write('%s Twitter friends in the queue, the next window at %s, '
+                              'projected completion at %s' % (
+                                  queue_status['depth'], queue_status['next_window_at'],
+                                  queue_status['projected_completion_at']))
+            time.sleep(max((queue_status['next_window_at'] - timezone.now()).total_seconds(), 1))
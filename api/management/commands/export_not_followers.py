@@ -0,0 +1,47 @@
+"""
+Export all the NotFollowerTwFriend objects as CSV, NDJSON or Parquet file
+(see api/export.py).
+
+Example:
+    $ python manage.py export_not_followers --format csv --output not_followers.csv
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import export
+
+
+class Command(BaseCommand):
+    help = 'Export all the Twitter friends who aren\'t followers as CSV, NDJSON or Parquet file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=export.EXPORT_FORMATS,
+                            default='csv')
+        parser.add_argument('--output', default='-',
+                            help='Output file path ("-" is stdout for CSV and NDJSON)')
+
+    def handle(self, *args, **options):
+        export_format = options['export_format']
+        output = options['output']
+
+        if export_format == 'parquet':
+            if output == '-':
+                raise CommandError('Parquet export requires the --output file path')
+            if not export.is_parquet_available():
+                raise CommandError(export.PARQUET_UNAVAILABLE_MESSAGE)
+            with open(output, 'wb') as parquet_file:
+                export.write_parquet(parquet_file)
+            return
+
+        output_file = sys.stdout if output == '-' else open(output, 'w', newline='')
+        try:
+            if export_format == 'csv' and export.can_copy():
+                # COPY writes to the file right away
+                export.copy_csv_to(output_file)
+            else:
+                for chunk in export.iter_export(export_format):
+                    output_file.write(chunk)
+        finally:
+            if output_file is not sys.stdout:
+                output_file.close()
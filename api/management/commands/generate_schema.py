@@ -0,0 +1,40 @@
+"""
+Pre-generate the API schema at deploy time into 'settings.API_SCHEMA_FILE'
+(see api/schema.py) for each permission scope, so the workers don't introspect the views.
+
+Example:
+    $ python manage.py generate_schema --output api_schema.json
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.schemas.generators import SchemaGenerator
+
+from ...schema import DOCS_TITLE, SCHEMA_TITLE, SCOPES, encode_schemas, get_schema_file, \
+    get_scope_request
+
+
+class Command(BaseCommand):
+    help = 'Pre-generate the API schema into the schema file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='Schema file path (settings.API_SCHEMA_FILE by default)')
+
+    def handle(self, *args, **options):
+        path = options['output'] or get_schema_file()
+        if not path:
+            raise CommandError('Set settings.API_SCHEMA_FILE or use --output')
+
+        # The URL is relative to the host, the schema isn't generated by the request
+        schemas = {
+            scope: {
+                title: SchemaGenerator(title=title, url='/').get_schema(
+                    request=get_scope_request(scope))
+                for title in (SCHEMA_TITLE, DOCS_TITLE)
+            }
+            for scope in SCOPES
+        }
+        with open(path, 'w', encoding='utf-8') as schema_file:
+            schema_file.write(encode_schemas(schemas))
+
+        self.stdout.write('The schema is written to %s' % path)
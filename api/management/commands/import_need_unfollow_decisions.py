@@ -0,0 +1,33 @@
+"""
+Import the keep/unfollow decisions ('need_unfollow' field values)
+from CSV or NDJSON file (see api/import_need_unfollow_decisions.py).
+
+Example:
+    $ python manage.py import_need_unfollow_decisions keep_list.csv
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...import_need_unfollow_decisions import IMPORT_FORMATS, import_need_unfollow_decisions
+
+
+class Command(BaseCommand):
+    help = 'Import the keep/unfollow decisions from CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file path')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS,
+                            default=None, help='File format (by the file extension by default)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['import_format'] or \
+            path.rsplit('.', 1)[-1].lower().replace('jsonl', 'ndjson')
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError('Unknown file format, use --format csv|ndjson')
+
+        with open(path, encoding='utf-8-sig', newline='') as text_file:
+            report = import_need_unfollow_decisions(text_file, import_format)
+
+        self.stdout.write(json.dumps(report, indent=4))
@@ -0,0 +1,114 @@
+"""
+Load test of the REST endpoints (see api/loadtest.py):
+    seed -- replace the NotFollowerTwFriend objects with the rows
+            of the synthetic account of the Twitter API stub
+    run -- send the mix of the list, PATCH, check and unfollow requests
+           to the running server and report the throughput,
+           the p50/p95/p99 latencies and the error rates
+
+Example:
+    $ python manage.py loadtest seed --rows 100000
+    $ TWITTER_API_CLASS=api.twitter_stub.StubTwitterApi TWITTER_STUB_FRIENDS_COUNT=200000 \\
+        python manage.py runserver --noreload
+    $ python manage.py loadtest run --mix list=80,patch=15,check=4,unfollow=1 \\
+        --concurrency 16 --duration 60
+"""
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.authtoken.models import Token
+
+from ...loadtest import DEFAULT_MIX, LoadRunner, parse_mix, seed_not_followers_tw_friends
+from ...models import NotFollowerTwFriend
+
+# Count of the screen names of the PATCH requests
+PATCH_SCREEN_NAMES_COUNT = 1000
+
+
+class Command(BaseCommand):
+    help = 'Seed the rows of the Twitter API stub or run the load test of the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['seed', 'run'])
+        parser.add_argument('--rows', type=int, default=1000,
+                            help='Count of the seeded rows, from 1000 to 1000000 (seed)')
+        parser.add_argument('--force', action='store_true',
+                            help='Replace the existing rows (seed)')
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='URL of the running server (run)')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='Weights of the operations: list, patch, check, unfollow (run)')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Count of the concurrent clients (run)')
+        parser.add_argument('--requests', type=int, default=None,
+                            help='Count of the requests (run)')
+        parser.add_argument('--duration', type=float, default=None,
+                            help='Seconds of the load, 30 if --requests isn\'t set (run)')
+        parser.add_argument('--list-query', default='',
+                            help='Query string of the list requests, e.g. "fields=id_str" (run)')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds of the request timeout (run)')
+        parser.add_argument('--username', default=None,
+                            help='User of the requests (the first superuser by default)')
+        parser.add_argument('--json', action='store_true',
+                            help='Write the report as JSON (run)')
+
+    def get_authorization(self, username):
+        """
+        Return the 'Authorization' header with the Token of the user
+        (the password hash of BasicAuthentication would be measured instead of the views)
+        """
+
+        users = User.objects.all()
+        users = users.filter(username=username) if username else users.filter(is_superuser=True)
+        user = users.first()
+        if user is None:
+            raise CommandError('No user for the requests, create a superuser or use --username')
+        return 'Token %s' % Token.objects.get_or_create(user=user)[0].key
+
+    def loadtest_seed(self, options):
+        if NotFollowerTwFriend.objects.exists() and not options['force']:
+            raise CommandError('The table has the rows, use --force to replace them')
+
+        try:
+            friends_count = seed_not_followers_tw_friends(options['rows'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write('Seeded %s rows, start the server with the Twitter API stub:' % (
+            options['rows']))
+        self.stdout.write(
+            'TWITTER_API_CLASS=api.twitter_stub.StubTwitterApi '
+            'TWITTER_STUB_FRIENDS_COUNT=%s python manage.py runserver --noreload' % friends_count)
+
+    def loadtest_run(self, options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        duration = options['duration']
+        if duration is None and options['requests'] is None:
+            duration = 30
+
+        screen_names = list(NotFollowerTwFriend.objects.order_by('?').values_list(
+            'screen_name', flat=True)[:PATCH_SCREEN_NAMES_COUNT])
+        if mix.get('patch') and not screen_names:
+            raise CommandError('No rows for the PATCH requests, seed them first')
+
+        runner = LoadRunner(
+            options['url'], self.get_authorization(options['username']), mix,
+            concurrency=options['concurrency'], requests=options['requests'],
+            duration=duration, screen_names=screen_names, list_query=options['list_query'],
+            timeout=options['timeout'])
+        report = runner.run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.summary(), indent=2, sort_keys=True))
+        else:
+            self.stdout.write(report.format())
+
+    def handle(self, *args, **options):
+        getattr(self, 'loadtest_%s' % options['target'])(options)
@@ -0,0 +1,41 @@
+"""
+Apply the queued account activity events to the NotFollowerTwFriend objects
+(see api/activity_events.py).
+
+Example:
+    $ python manage.py process_activity_events --loop
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...activity_events import process_activity_events
+from ...db import close_old_db_connections
+from ...db_routers import unpin
+
+
+class Command(BaseCommand):
+    help = 'Apply the queued account activity events to the Twitter friends who aren\'t followers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Max count of the events applied at once')
+        parser.add_argument('--loop', action='store_true', default=False,
+                            help='Keep polling the queue for the new events')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between the polls of the empty queue (--loop)')
+
+    def handle(self, *args, **options):
+        while True:
+            # The long-running worker drops its unusable or obsolete db connection
+            # and its pinning to the primary db
+            close_old_db_connections()
+            unpin()
+            result = process_activity_events(limit=options['limit'])
+            if result['applied'] or result['failed'] or not options['loop']:
+                self.stdout.write('Applied %(applied)s, failed %(failed)s' % result)
+
+            if not options['loop']:
+                break
+            if not result['applied'] and not result['failed']:
+                time.sleep(options['interval'])
@@ -0,0 +1,82 @@
+"""
+Replay the recorded account activity payloads to the webhook
+(see api/activity_events.py): each payload is signed as by Twitter
+and passed to the webhook view in this process, or to the running server with --url.
+
+The file is NDJSON (one payload per line) or the JSON list of the payloads.
+
+Example:
+    $ python manage.py replay_activity_events events.ndjson --process
+    $ python manage.py replay_activity_events events.ndjson --url http://localhost:8000/api/v1/activity/webhook/
+"""
+import json
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+
+from ...activity_events import SIGNATURE_HEADER, process_activity_events, sign
+from ...views import ActivityWebhook
+
+
+def read_payloads(path):
+    """
+    Return the list of the payloads from NDJSON or JSON list file
+    """
+
+    with open(path, encoding='utf-8') as payloads_file:
+        text = payloads_file.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Replay the recorded account activity payloads to the webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON or JSON file of the payloads')
+        parser.add_argument('--url', default=None,
+                            help='Webhook URL of the running server '
+                                 '(the local webhook view by default)')
+        parser.add_argument('--process', action='store_true', default=False,
+                            help='Apply the queued events after the replay')
+
+    def post(self, body, url):
+        """
+        Send the signed payload and return the count of the queued events
+        """
+
+        signature = sign(body)
+        if url is None:
+            request = RequestFactory().post(
+                reverse('activity_webhook'), body, content_type='application/json',
+                **{SIGNATURE_HEADER: signature})
+            response = ActivityWebhook.as_view()(request)
+            if response.status_code != 200:
+                raise CommandError('The webhook returned %s: %s' % (
+                    response.status_code, response.data))
+            return response.data['queued']
+
+        request = urllib.request.Request(url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-Twitter-Webhooks-Signature': signature,
+        })
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))['queued']
+
+    def handle(self, *args, **options):
+        try:
+            payloads = read_payloads(options['path'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        queued = 0
+        for payload in payloads:
+            queued += self.post(json.dumps(payload).encode('utf-8'), options['url'])
+        self.stdout.write('Replayed %s payloads, queued %s events' % (len(payloads), queued))
+
+        if options['process']:
+            result = process_activity_events()
+            self.stdout.write('Applied %(applied)s, failed %(failed)s' % result)
@@ -0,0 +1,302 @@
+"""
+Hot-path instrumentation for the check and unfollow runs:
+    1. Counters and timing spans (count and sum of seconds) with labels
+    2. Per-run summary of the counters and timing spans,
+       stored with each TwFriendsRun object
+    3. Per-request summary of the profiled request (see api/profiling.py)
+    4. Rendering of all the metrics in the Prometheus text format
+
+Instrumentation is switched by 'settings.API_METRICS_ENABLED' (True by default).
+When it is disabled, every call returns right after the flag check.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+# Prefix for the names of all the metrics in the Prometheus text format
+METRIC_PREFIX = 'avt_'
+
+# Process-wide metrics storage:
+# {(metric_name, ((label_name, label_value), ...)): value}
+_counters = {}
+# {(metric_name, ((label_name, label_value), ...)): [count, sum_seconds]}
+_timers = {}
+_lock = threading.Lock()
+
+# Per-run summary (dict, see record_run()) and per-request summary
+# of the profiled request (dict, see collect_request_summary()) of the current thread
+_local = threading.local()
+
+
+def is_enabled():
+    """
+    Returns:
+        bool -- True if the instrumentation is enabled
+    """
+
+    return getattr(settings, 'API_METRICS_ENABLED', True)
+
+
+def _summary_key(name, labels):
+    """
+    Return the key of the metric in the per-run summary,
+    e.g. 'twitter_api_calls_total{endpoint=GetFriendsPaged}'
+    """
+
+    if not labels:
+        return name
+    return '%s{%s}' % (name, ','.join('%s=%s' % item for item in labels))
+
+
+def _get_summaries():
+    """
+    Return the per-run and per-request summaries of the current thread
+    which collect the metrics.
+    """
+
+    return [
+        summary for summary in (
+            getattr(_local, 'summary', None), getattr(_local, 'request_summary', None))
+        if summary is not None
+    ]
+
+
+def inc(name, value=1, **labels):
+    """
+    Increment the counter 'name' with 'labels' by 'value'.
+
+    Arguments:
+        name {str} -- The name of the counter
+        value {int|float} -- The increment (default: {1})
+        **labels -- Labels of the counter, e.g. endpoint='GetFriendsPaged'
+    """
+
+    if not is_enabled():
+        return
+
+    labels = tuple(sorted(labels.items()))
+    summaries = _get_summaries()
+    with _lock:
+        _counters[(name, labels)] = _counters.get((name, labels), 0) + value
+
+        if summaries:
+            key = _summary_key(name, labels)
+            for summary in summaries:
+                summary[key] = summary.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """
+    Record the duration 'seconds' of the timing span 'name' with 'labels'.
+
+    Arguments:
+        name {str} -- The name of the timing span
+        seconds {float} -- The duration of the span
+        **labels -- Labels of the timing span
+    """
+
+    if not is_enabled():
+        return
+
+    labels = tuple(sorted(labels.items()))
+    summaries = _get_summaries()
+    with _lock:
+        timer = _timers.setdefault((name, labels), [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+        if summaries:
+            key = _summary_key(name, labels)
+            for summary in summaries:
+                summary[key] = round(summary.get(key, 0.0) + seconds, 6)
+
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Context manager which records the duration of its block
+    as the timing span 'name' with 'labels'.
+    """
+
+    if not is_enabled():
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+@contextmanager
+def count_db_queries():
+    """
+    Context manager which counts all the DB queries executed in its block
+    by the default connection ('db_queries_total' counter).
+    Requires 'connection.execute_wrapper()' (Django 2.0+),
+    otherwise the DB queries aren't counted.
+    """
+
+    if not is_enabled() or not hasattr(connection, 'execute_wrapper'):
+        yield
+        return
+
+    def counting_wrapper(execute, sql, params, many, context):
+        inc('db_queries_total')
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counting_wrapper):
+        yield
+
+
+@contextmanager
+def record_run(kind, run=None):
+    """
+    Context manager which records a check or unfollow run:
+        1. Create a TwFriendsRun object with 'status=running' (if 'run' is None)
+        2. Collect the per-run summary of all the metrics in its block
+           (including the count of DB queries)
+        3. Store the summary and the final status with the TwFriendsRun object
+
+    Arguments:
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+        run {TwFriendsRun} -- Already created run object (default: {None})
+
+    Yields:
+        TwFriendsRun object -- The recorded run
+    """
+
+    from .models import TwFriendsRun
+
+    if run is None:
+        run = TwFriendsRun.objects.create(kind=kind)
+
+    previous_summary = getattr(_local, 'summary', None)
+    _local.summary = {}
+    started = time.perf_counter()
+    try:
+        with count_db_queries():
+            yield run
+    except BaseException:
+        run.status = TwFriendsRun.STATUS_FAILED
+        raise
+    else:
+        run.status = TwFriendsRun.STATUS_SUCCEEDED
+    finally:
+        summary = _local.summary
+        _local.summary = previous_summary
+        duration = time.perf_counter() - started
+        observe('run_seconds', duration, kind=kind)
+        if is_enabled():
+            summary['run_seconds'] = round(duration, 6)
+        run.summary = json.dumps(summary, sort_keys=True)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'summary', 'finished_at'])
+
+
+def current_summary():
+    """
+    Returns:
+        tuple -- The per-run and per-request summaries of the current thread
+                 (each one is dict or None)
+    """
+
+    return getattr(_local, 'summary', None), getattr(_local, 'request_summary', None)
+
+
+@contextmanager
+def use_summary(summaries):
+    """
+    Context manager which collects the metrics of its block
+    to the per-run and per-request 'summaries' of another thread
+    (for the worker threads of the run, see current_summary()).
+    """
+
+    previous_summaries = current_summary()
+    _local.summary, _local.request_summary = summaries
+    try:
+        yield
+    finally:
+        _local.summary, _local.request_summary = previous_summaries
+
+
+@contextmanager
+def collect_request_summary():
+    """
+    Context manager which collects all the metrics of its block
+    (including the runs and their worker threads) to the per-request summary
+    of the profiled request (see api/profiling.py).
+
+    Yields:
+        dict -- The per-request summary
+    """
+
+    previous_request_summary = getattr(_local, 'request_summary', None)
+    _local.request_summary = {}
+    try:
+        yield _local.request_summary
+    finally:
+        _local.request_summary = previous_request_summary
+
+
+def reset():
+    """
+    Reset all the process-wide metrics (used by tests).
+    """
+
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+
+
+def _format_labels(labels):
+    """
+    Format 'labels' in the Prometheus text format, e.g. '{endpoint="GetFriendsPaged"}'
+    """
+
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (label_name, str(label_value).replace('\\', '\\\\').replace('"', '\\"'))
+        for label_name, label_value in labels
+    )
+
+
+def render_prometheus():
+    """
+    Render all the process-wide metrics in the Prometheus text format:
+    counters as 'counter' type, timing spans as 'summary' type
+    (with '_count' and '_sum' samples).
+
+    Returns:
+        str -- The metrics in the Prometheus text format
+    """
+
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted((key, list(value)) for key, value in _timers.items())
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric_name = METRIC_PREFIX + name
+        if metric_name not in typed:
+            typed.add(metric_name)
+            lines.append('# TYPE %s counter' % metric_name)
+        lines.append('%s%s %s' % (metric_name, _format_labels(labels), value))
+
+    for (name, labels), (count, total) in timers:
+        metric_name = METRIC_PREFIX + name
+        if metric_name not in typed:
+            typed.add(metric_name)
+            lines.append('# TYPE %s summary' % metric_name)
+        lines.append('%s_count%s %s' % (metric_name, _format_labels(labels), count))
+        lines.append('%s_sum%s %.6f' % (metric_name, _format_labels(labels), total))
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,55 @@
+"""
+Compression of the API responses negotiated with 'Accept-Encoding' header:
+brotli (if the optional 'brotli' package is installed) or gzip
+"""
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+# The responses shorter than this aren't worth compressing (the same as GZipMiddleware)
+MIN_COMPRESS_LENGTH = 200
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress the responses with brotli if the client accepts 'br'
+    and the 'brotli' package is installed, otherwise with gzip.
+    The server-sent events streams aren't compressed, so the events
+    aren't held back in the compressor buffers.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or response.streaming or not re_accepts_brotli.search(accept_encoding):
+            return super(CompressionMiddleware, self).process_response(request, response)
+
+        if len(response.content) < MIN_COMPRESS_LENGTH or response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        # Return the compressed content only if it's actually shorter
+        compressed_content = brotli.compress(response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response['Content-Length'] = str(len(response.content))
+
+        # The compressed representation has the weak ETag (RFC 7232 section 2.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+
+        return response
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_tw_friends_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwFriendsRunEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('event', models.CharField(max_length=20)),
+                ('data', models.TextField(default='{}')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.TwFriendsRun')),
+            ],
+            options={
+                'ordering': ['run', 'seq'],
+                'unique_together': {('run', 'seq')},
+            },
+        ),
+    ]
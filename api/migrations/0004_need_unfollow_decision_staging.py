@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tw_friends_run_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NeedUnfollowDecisionStaging',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.CharField(db_index=True, max_length=32)),
+                ('line', models.PositiveIntegerField()),
+                ('id_str', models.CharField(blank=True, db_index=True, default='', max_length=25)),
+                ('screen_name', models.CharField(blank=True, db_index=True, default='', max_length=20)),
+                ('need_unfollow', models.BooleanField()),
+            ],
+        ),
+    ]
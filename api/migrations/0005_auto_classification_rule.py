@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_need_unfollow_decision_staging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutoClassificationRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('field', models.CharField(choices=[('tff_ratio', 'TFF Ratio'), ('avg_tweetsperday', 'Average tweets per day'), ('followers_count', 'Followers count'), ('friends_count', 'Friends count'), ('statuses_count', 'Statuses count')], max_length=20)),
+                ('operator', models.CharField(choices=[('gt', '>'), ('gte', '>='), ('lt', '<'), ('lte', '<='), ('exact', '=')], max_length=5)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('enabled', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
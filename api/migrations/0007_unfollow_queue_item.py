@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_not_followers_tw_friends_stat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnfollowQueueItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_str', models.CharField(db_index=True, max_length=25)),
+                ('screen_name', models.CharField(max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('unfollowed', 'Unfollowed'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['position'],
+                'index_together': {('status', 'position')},
+            },
+        ),
+    ]
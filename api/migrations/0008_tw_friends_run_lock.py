@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_unfollow_queue_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwFriendsRunLock',
+            fields=[
+                ('kind', models.CharField(choices=[('check', 'Check'), ('unfollow', 'Unfollow')], max_length=10, primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_activity_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotFollowersTwFriendsVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notfollowertwfriend',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterIndexTogether(
+            name='notfollowertwfriend',
+            index_together={('version', 'id_str')},
+        ),
+        migrations.CreateModel(
+            name='NotFollowerTwFriendTombstone',
+            fields=[
+                ('id_str', models.CharField(max_length=25, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'index_together': {('version', 'id_str')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 13:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_changes_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notfollowertwfriend',
+            name='last_seen_run',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.8 on 2026-10-19 14:21
+from __future__ import unicode_literals
+
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import migrations, models
+
+# Max count of the 'id_str' values in the single UPDATE query
+UPDATE_CHUNK_SIZE = 500
+
+
+def fill_created_at_day(apps, schema_editor):
+    """
+    Fill 'created_at_day' (date.toordinal()) from the 'created_at' strings
+    of Twitter API, e.g. 'Mon Nov 29 21:18:15 +0000 2010'
+    """
+
+    NotFollowerTwFriend = apps.get_model('api', 'NotFollowerTwFriend')
+
+    id_str_by_day = defaultdict(list)
+    for id_str, created_at in NotFollowerTwFriend.objects.values_list(
+            'id_str', 'created_at').iterator():
+        try:
+            created_at_dt = datetime.strptime(created_at, '%a %b %d %H:%M:%S %z %Y')
+        except ValueError:
+            continue
+        id_str_by_day[created_at_dt.toordinal()].append(id_str)
+
+    for day, id_str_list in id_str_by_day.items():
+        for i in range(0, len(id_str_list), UPDATE_CHUNK_SIZE):
+            NotFollowerTwFriend.objects.filter(
+                id_str__in=id_str_list[i:i + UPDATE_CHUNK_SIZE]).update(created_at_day=day)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_request_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notfollowertwfriend',
+            name='created_at_day',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_created_at_day, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notfollowertwfriend',
+            name='avg_tweetsperday',
+        ),
+        migrations.AlterField(
+            model_name='notfollowertwfriend',
+            name='tff_ratio',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,171 @@
+"""
+Mixins for the list views:
+    1. Sparse fieldsets ('?fields=screen_name,tff_ratio') with the matching
+       query projection, so the dropped fields aren't read from db
+    2. Compact formats of the NotFollowerTwFriend lists (columnar JSON, MessagePack)
+"""
+from decimal import Decimal
+
+from django.db import models
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .renderers import ColumnarJSONRenderer, LIST_RENDERER_CLASSES
+
+
+def format_decimal(value, decimal_places):
+    """
+    Format the decimal value with 'decimal_places' as in the serializer data.
+    """
+
+    if value is None:
+        return None
+    return str(Decimal(value).quantize(Decimal(10) ** -decimal_places))
+
+
+def get_columnar_data(queryset, fields):
+    """
+    Return the columnar representation of the queryset:
+    the field names once and the parallel arrays of the field values.
+    The rows are read with values_list(), without model instances
+    and per-row dicts; decimal values are strings as in the serializer data.
+
+    Arguments:
+        queryset {QuerySet} -- The NotFollowerTwFriend objects
+        fields {list} -- The field names
+
+    Returns:
+        dict -- {'fields': [...], 'columns': [[...], ...], 'count': N}
+    """
+
+    rows = list(queryset.values_list(*fields))
+    columns = list(zip(*rows)) if rows else [() for _ in fields]
+
+    # The annotations (e.g. 'avg_tweetsperday') have the output field of their expression
+    model_fields = [
+        queryset.query.annotations[field_name].output_field
+        if field_name in queryset.query.annotations
+        else queryset.model._meta.get_field(field_name)
+        for field_name in fields
+    ]
+    return {
+        'fields': list(fields),
+        'columns': [
+            [format_decimal(value, model_field.decimal_places) for value in column]
+            if isinstance(model_field, models.DecimalField) else list(column)
+            for model_field, column in zip(model_fields, columns)
+        ],
+        'count': len(rows),
+    }
+
+
+class SparseFieldsMixin(object):
+    """
+    Return only the fields requested with '?fields=' query param in the list responses.
+    The serializer outputs these fields (see SparseFieldsSerializerMixin),
+    and the queryset reads only the matching columns with QuerySet.only().
+    """
+
+    # The model fields read for the serializer fields which aren't model fields
+    # e.g. {'rule': ('field', 'operator', 'value')}
+    field_sources = {}
+
+    fields_query_param = 'fields'
+
+    def get_requested_fields(self):
+        """
+        Returns:
+            list -- The requested serializer fields, or None for all the fields
+
+        Raises:
+            ValidationError -- Unknown fields are requested (400 Bad Request)
+        """
+
+        # The input of the create and update requests is validated with all the fields,
+        # the schema generator introspects the views without the request
+        request = getattr(self, 'request', None)
+        if request is None or request.method in ('POST', 'PUT', 'PATCH'):
+            return None
+
+        value = request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+
+        all_fields = self.get_serializer_class().Meta.fields
+        fields = [field_name.strip() for field_name in value.split(',') if field_name.strip()]
+        unknown_fields = [field_name for field_name in fields if field_name not in all_fields]
+        if unknown_fields or not fields:
+            raise ValidationError({self.fields_query_param: [
+                'Unknown fields: %s. Available fields: %s.' % (
+                    ', '.join(unknown_fields), ', '.join(all_fields))
+            ]})
+
+        # The fields in the order of the serializer fields
+        return [field_name for field_name in all_fields if field_name in fields]
+
+    def project_queryset(self, queryset, fields):
+        """
+        Narrow the queryset to the columns of the requested fields.
+
+        Arguments:
+            queryset {QuerySet} -- The queryset of the list
+            fields {list} -- The requested serializer fields or None
+
+        Returns:
+            QuerySet -- The queryset with QuerySet.only()
+        """
+
+        if fields is None:
+            return queryset
+
+        model_field_names = [
+            field.name for field in queryset.model._meta.concrete_fields]
+        only_fields = []
+        for field_name in fields:
+            for source in self.field_sources.get(field_name, (field_name, )):
+                if source in model_field_names and source not in only_fields:
+                    only_fields.append(source)
+
+        return queryset.only(*only_fields)
+
+    def filter_queryset(self, queryset):
+        queryset = super(SparseFieldsMixin, self).filter_queryset(queryset)
+        return self.project_queryset(queryset, self.get_requested_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super(SparseFieldsMixin, self).get_serializer(*args, **kwargs)
+
+
+class ColumnarListMixin(SparseFieldsMixin):
+    """
+    Negotiate the compact formats of the list responses:
+    the columnar JSON (serialized straight from the queryset rows)
+    and MessagePack, in addition to the default JSON.
+    The responses have only the fields requested with '?fields=' query param.
+    """
+
+    renderer_classes = LIST_RENDERER_CLASSES
+
+    def list_response(self, queryset):
+        """
+        Return the list of the queryset objects in the format accepted by the client.
+
+        Arguments:
+            queryset {QuerySet} -- The NotFollowerTwFriend objects
+
+        Returns:
+            Response object {TemplateResponse} -- The serializer data
+                                                  or the columnar data
+        """
+
+        serializer_class = self.get_serializer_class()
+        fields = self.get_requested_fields()
+        if isinstance(getattr(self.request, 'accepted_renderer', None), ColumnarJSONRenderer):
+            return Response(get_columnar_data(
+                queryset, fields or serializer_class.Meta.fields))
+
+        serializer = serializer_class(
+            self.project_queryset(queryset, fields), many=True, fields=fields)
+        return Response(serializer.data)
@@ -1,4 +1,52 @@
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Func, Value
+from django.db.models.functions import Cast, Greatest
+from django.utils import timezone
+
+
+def get_avg_tweetsperday_expression(today=None):
+    """
+    Return the SQL expression of the average number of tweets per day
+    for the whole lifetime of the account until 'today':
+    'statuses_count' / (today - 'created_at_day') rounded to 2 decimal places.
+
+    Arguments:
+        today {date} -- The current date (default: {None} -- date.today())
+
+    Returns:
+        Expression -- The DecimalField expression
+    """
+
+    today = today or date.today()
+    lifetime_days = Greatest(Value(today.toordinal()) - F('created_at_day'), Value(1))
+    output_field = models.DecimalField(max_digits=12, decimal_places=2)
+    return Func(
+        Cast(Cast(F('statuses_count'), models.FloatField()) / lifetime_days, output_field),
+        Value(2), function='ROUND', output_field=output_field)
+
+
+class NotFollowerTwFriendQuerySet(models.QuerySet):
+    """
+    The queryset of the NotFollowerTwFriend objects
+    """
+
+    def with_avg_tweetsperday(self, today=None):
+        """
+        Annotate 'avg_tweetsperday' computed in SQL at the query time, so reading,
+        filtering and sorting on it is always current without the check.
+        Only the querysets which need it (the lists, the export, the keep rules)
+        pay for the expression.
+
+        Arguments:
+            today {date} -- The current date (default: {None} -- date.today())
+        """
+
+        return self.annotate(avg_tweetsperday=get_avg_tweetsperday_expression(today))
+
 
 # Create your models here.
 class NotFollowerTwFriend(models.Model):
@@ -14,10 +62,326 @@ class NotFollowerTwFriend(models.Model):
     followers_count = models.PositiveIntegerField(default=0)
     friends_count = models.PositiveIntegerField(default=0)
     created_at = models.CharField(max_length=50)
+    # The day of the account creation ('created_at') as date.toordinal()
+    created_at_day = models.PositiveIntegerField(default=0)
     location = models.CharField(max_length=100, default='')
-    avg_tweetsperday = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    tff_ratio = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # 'avg_tweetsperday' isn't stored, see NotFollowerTwFriendQuerySet.with_avg_tweetsperday()
+    tff_ratio = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, db_index=True)
     need_unfollow = models.BooleanField(default=True)
+    # The version of the last change of the row (see api/changes.py)
+    version = models.BigIntegerField(default=0)
+    # ID of the last check run which found the Twitter friend
+    last_seen_run = models.PositiveIntegerField(default=0)
+
+    objects = NotFollowerTwFriendQuerySet.as_manager()
+
+    class Meta:
+        index_together = ('version', 'id_str')
+
+    def __str__(self):
+        return self.id_str
+
+    @property
+    def avg_tweetsperday(self):
+        """
+        The value of the query annotation (see NotFollowerTwFriendQuerySet),
+        or the same value counted in Python for the object which isn't read from db.
+        The float quotient is converted to Decimal with 15 significant digits
+        and rounded half up, as the cast of the float to numeric in SQL does,
+        so the value is the same near the histogram bucket bounds (see api/stats.py).
+        """
+
+        value = self.__dict__.get('_avg_tweetsperday')
+        if value is None:
+            lifetime_days = max(date.today().toordinal() - self.created_at_day, 1)
+            value = Decimal('%.15g' % (self.statuses_count / lifetime_days)).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return value
+
+    @avg_tweetsperday.setter
+    def avg_tweetsperday(self, value):
+        self._avg_tweetsperday = value
+
+
+class TwFriendsRun(models.Model):
+    '''
+    Model for a single check or unfollow run
+    with the per-run summary of the instrumentation metrics
+    '''
+
+    KIND_CHECK = 'check'
+    KIND_UNFOLLOW = 'unfollow'
+    KIND_CHOICES = (
+        (KIND_CHECK, 'Check'),
+        (KIND_UNFOLLOW, 'Unfollow'),
+    )
+
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # The last sign of life of the running run (see api/runs.py)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+    # JSON encoded per-run summary of the metrics (see api/metrics.py)
+    summary = models.TextField(default='{}')
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return '%s #%s' % (self.kind, self.pk)
+
+
+class TwFriendsRunLock(models.Model):
+    '''
+    Model for the lock row of the check or unfollow runs,
+    locked with SELECT ... FOR UPDATE while the run is looked up or started,
+    so the concurrent requests attach to the same run (see api/runs.py)
+    '''
+
+    kind = models.CharField(max_length=10, primary_key=True, choices=TwFriendsRun.KIND_CHOICES)
+
+    def __str__(self):
+        return self.kind
+
+
+class TwFriendsRunEvent(models.Model):
+    '''
+    Model for an event (found not-follower, progress, done, error)
+    of the check run, streamed to the clients as server-sent events
+    '''
+
+    run = models.ForeignKey(TwFriendsRun, on_delete=models.CASCADE, related_name='events')
+    seq = models.PositiveIntegerField()
+    event = models.CharField(max_length=20)
+    # JSON encoded event data
+    data = models.TextField(default='{}')
+
+    class Meta:
+        ordering = ['run', 'seq']
+        unique_together = ('run', 'seq')
+
+    def __str__(self):
+        return '%s:%s' % (self.run_id, self.seq)
+
+
+class NeedUnfollowDecisionStaging(models.Model):
+    '''
+    Model for the staging table of the imported keep/unfollow decisions
+    (see api/import_need_unfollow_decisions.py)
+    '''
+
+    batch = models.CharField(max_length=32, db_index=True)
+    line = models.PositiveIntegerField()
+    id_str = models.CharField(max_length=25, blank=True, default='', db_index=True)
+    screen_name = models.CharField(max_length=20, blank=True, default='', db_index=True)
+    need_unfollow = models.BooleanField()
+
+    def __str__(self):
+        return '%s:%s' % (self.batch, self.line)
+
+
+class AutoClassificationRule(models.Model):
+    '''
+    Model for the rule which keeps the Twitter friends who aren't followers
+    (sets 'need_unfollow=False') after each check,
+    e.g. "keep if tff_ratio >= 2" (see api/auto_classification.py)
+    '''
+
+    FIELD_CHOICES = (
+        ('tff_ratio', 'TFF Ratio'),
+        ('avg_tweetsperday', 'Average tweets per day'),
+        ('followers_count', 'Followers count'),
+        ('friends_count', 'Friends count'),
+        ('statuses_count', 'Statuses count'),
+    )
+
+    OPERATOR_CHOICES = (
+        ('gt', '>'),
+        ('gte', '>='),
+        ('lt', '<'),
+        ('lte', '<='),
+        ('exact', '='),
+    )
+
+    name = models.CharField(max_length=100)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    operator = models.CharField(max_length=5, choices=OPERATOR_CHOICES)
+    value = models.DecimalField(max_digits=14, decimal_places=2)
+    enabled = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return 'keep if %s %s %s' % (
+            self.field, self.get_operator_display(), self.value)
+
+
+class NotFollowersTwFriendsStat(models.Model):
+    '''
+    Model for the summary statistics counter of the Twitter friends who aren't followers
+    (total, need_unfollow count, histogram buckets), maintained incrementally
+    by the check, unfollow and update paths (see api/stats.py)
+    '''
+
+    key = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return '%s=%s' % (self.key, self.value)
+
+
+class UnfollowQueueItem(models.Model):
+    '''
+    Model for the Twitter friend who isn't follower in the unfollow queue,
+    drained in the order of 'position' within the daily and per-window budgets
+    (see api/unfollow_queue.py)
+    '''
+
+    STATUS_PENDING = 'pending'
+    STATUS_UNFOLLOWED = 'unfollowed'
+    STATUS_SKIPPED = 'skipped'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_UNFOLLOWED, 'Unfollowed'),
+        (STATUS_SKIPPED, 'Skipped'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    id_str = models.CharField(max_length=25, db_index=True)
+    screen_name = models.CharField(max_length=20)
+    position = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    error = models.TextField(default='', blank=True)
+
+    class Meta:
+        ordering = ['position']
+        index_together = ('status', 'position')
+
+    def __str__(self):
+        return '%s (%s)' % (self.id_str, self.status)
+
+
+class SignedTokenRevocation(models.Model):
+    '''
+    Model for the revoked signed API token (see api/authentication.py),
+    kept until the token expires
+    '''
+
+    jti = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class TwFollower(models.Model):
+    '''
+    Model for the follower ID of Twitter account, replaced by each check
+    and updated by the follow activity events (see api/activity_events.py)
+    '''
+
+    id_str = models.CharField(max_length=25, primary_key=True)
 
     def __str__(self):
         return self.id_str
+
+
+class ActivityEvent(models.Model):
+    '''
+    Model for the verified account activity event (follow, unfollow, user update)
+    queued for the incremental update of the NotFollowerTwFriend objects
+    (see api/activity_events.py)
+    '''
+
+    TYPE_FOLLOW = 'follow'
+    TYPE_UNFOLLOW = 'unfollow'
+    TYPE_USER_UPDATE = 'user_update'
+    TYPE_CHOICES = (
+        (TYPE_FOLLOW, 'Follow'),
+        (TYPE_UNFOLLOW, 'Unfollow'),
+        (TYPE_USER_UPDATE, 'User update'),
+    )
+
+    event_type = models.CharField(max_length=12, choices=TYPE_CHOICES)
+    for_user_id = models.CharField(max_length=25)
+    # JSON encoded event of the Account Activity API payload
+    payload = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    error = models.TextField(default='', blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return '%s #%s' % (self.event_type, self.pk)
+
+
+class NotFollowersTwFriendsVersion(models.Model):
+    '''
+    Model for the last allocated version of the changes of the Twitter friends
+    who aren't followers (the single row, see api/changes.py)
+    '''
+
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.value)
+
+
+class NotFollowerTwFriendTombstone(models.Model):
+    '''
+    Model for the deleted Twitter friend who isn't follower
+    with the version of the deletion (see api/changes.py)
+    '''
+
+    id_str = models.CharField(max_length=25, primary_key=True)
+    version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        index_together = ('version', 'id_str')
+
+    def __str__(self):
+        return '%s (deleted in %s)' % (self.id_str, self.version)
+
+
+class RequestProfile(models.Model):
+    '''
+    Model for the profile of the single API request captured
+    on demand of the staff user (see api/profiling.py)
+    '''
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    duration = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # JSON encoded summary of the profile: the slowest functions, the SQL queries
+    # and the metrics of the request (Twitter API calls, check spans)
+    summary = models.TextField(default='{}')
+    # The marshalled cProfile stats, loaded by pstats
+    stats = models.BinaryField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return '%s %s #%s' % (self.method, self.path, self.pk)
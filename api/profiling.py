@@ -0,0 +1,238 @@
+"""
+On-demand profiling of the single API request of the staff user:
+    1. The request with 'X-Profile: 1' header or '?profile=1' query param
+       runs under cProfile, the profile has the time spent inside the views,
+       check_tw_friends() and the other runs in the request thread
+    2. The SQL queries of the request thread are counted and timed,
+       the slowest ones are kept with the profile
+    3. All the metrics of the request (Twitter API calls and their seconds,
+       the check spans, see api/metrics.py) are collected including the worker threads
+    4. The profile is stored as RequestProfile object (the last
+       'settings.API_PROFILES_KEEP' ones), its ID is returned in 'X-Profile-Id' header,
+       and the profile is retrieved from '/api/v1/profiles/<id>/'
+
+The flag of the other users is ignored. Without the flag the middleware
+only looks up the header and the query param, so there is no overhead.
+The content of the streaming responses is generated after the profile is stored.
+
+Example:
+    $ http -a <staff-username>:<password> http://localhost:8000/api/v1/not_followers_tw_friends/check/ X-Profile:1
+    $ http -a <staff-username>:<password> http://localhost:8000/api/v1/profiles/<id>/
+    $ http -a <staff-username>:<password> http://localhost:8000/api/v1/profiles/<id>/pstats/ > request.prof
+    $ python -m pstats request.prof
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import metrics
+from .models import RequestProfile
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# Values of the header and the query param which switch the profiling on
+PROFILE_FLAG_VALUES = ('1', 'true', 'yes')
+
+# Count of the slowest functions (by cumulative time) in the summary of the profile
+TOP_FUNCTIONS_COUNT = 30
+# Count of the slowest SQL queries in the summary of the profile
+TOP_SQL_QUERIES_COUNT = 10
+
+
+def is_profile_requested(request):
+    """
+    Check whether the request has the profiling flag (header or query param).
+    """
+
+    flag = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_QUERY_PARAM)
+    return flag is not None and flag.lower() in PROFILE_FLAG_VALUES
+
+
+def get_staff_user(request):
+    """
+    Authenticate the request with the authentication classes of the API views.
+
+    Returns:
+        User object -- The staff user of the request or None
+    """
+
+    drf_request = Request(request, authenticators=[
+        authentication_class()
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        # The view rejects the invalid credentials itself
+        return None
+    return user if user is not None and user.is_staff else None
+
+
+class SQLRecorder(object):
+    """
+    The execute wrapper of the db connections which counts and times
+    the SQL queries and keeps the slowest ones.
+    Requires 'connection.execute_wrapper()' (Django 2.0+),
+    otherwise the SQL queries aren't recorded.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.seconds += duration
+            self.queries.append((duration, context['connection'].alias, sql))
+            if len(self.queries) > 2 * TOP_SQL_QUERIES_COUNT:
+                self.queries = sorted(self.queries, reverse=True)[:TOP_SQL_QUERIES_COUNT]
+
+    def record(self, stack):
+        """
+        Wrap all the db connections of the current thread for the block of 'stack' (ExitStack).
+        """
+
+        for alias in connections:
+            connection = connections[alias]
+            if hasattr(connection, 'execute_wrapper'):
+                stack.enter_context(connection.execute_wrapper(self))
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 6),
+            'slowest': [
+                {'seconds': round(duration, 6), 'db': alias, 'sql': sql}
+                for duration, alias, sql in sorted(self.queries, reverse=True)[
+                    :TOP_SQL_QUERIES_COUNT]
+            ],
+        }
+
+
+def summarize_functions(stats):
+    """
+    Return the TOP_FUNCTIONS_COUNT slowest functions of the pstats.Stats object
+    by the cumulative time.
+    """
+
+    functions = sorted(
+        stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS_COUNT]
+    return [
+        {
+            'function': '%s:%s(%s)' % function,
+            'calls': calls,
+            'total_seconds': round(total_time, 6),
+            'cumulative_seconds': round(cumulative_time, 6),
+        }
+        for function, (_, calls, total_time, cumulative_time, _) in functions
+    ]
+
+
+def summarize_twitter_calls(request_summary):
+    """
+    Return the count and the seconds of the Twitter API calls
+    from the per-request summary of the metrics.
+    """
+
+    calls = sum(
+        value for key, value in request_summary.items()
+        if key.startswith('twitter_api_calls_total'))
+    seconds = sum(
+        value for key, value in request_summary.items()
+        if key.startswith('twitter_api_call_seconds'))
+    return {'calls': calls, 'seconds': round(seconds, 6)}
+
+
+def save_profile(request, response, user, profiler, duration, sql_recorder, request_summary):
+    """
+    Store the profile of the request and delete the profiles
+    older than the last 'settings.API_PROFILES_KEEP' ones.
+
+    Returns:
+        RequestProfile object -- The stored profile or None if 'settings.API_PROFILES_KEEP' <= 0
+    """
+
+    keep = getattr(settings, 'API_PROFILES_KEEP', 100)
+    if keep <= 0:
+        return None
+
+    stats = pstats.Stats(profiler)
+    summary = {
+        'duration': round(duration, 6),
+        'functions': summarize_functions(stats),
+        'sql': sql_recorder.summary(),
+        'twitter': summarize_twitter_calls(request_summary),
+        'metrics': request_summary,
+    }
+    profile = RequestProfile.objects.create(
+        user=user,
+        method=request.method,
+        path=request.get_full_path()[:2048],
+        status_code=getattr(response, 'status_code', None),
+        duration=duration,
+        summary=json.dumps(summary, sort_keys=True),
+        stats=marshal.dumps(stats.stats),
+    )
+
+    oldest_kept_pks = list(RequestProfile.objects.order_by('-pk').values_list(
+        'pk', flat=True)[keep - 1:keep])
+    if oldest_kept_pks:
+        RequestProfile.objects.filter(pk__lt=oldest_kept_pks[0]).delete()
+
+    return profile
+
+
+class ProfilingMiddleware(object):
+    """
+    Profile the request of the staff user with the profiling flag
+    ('X-Profile: 1' header or '?profile=1' query param).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_profile_requested(request):
+            return self.get_response(request)
+
+        user = get_staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        sql_recorder = SQLRecorder()
+        with ExitStack() as stack:
+            sql_recorder.record(stack)
+            request_summary = stack.enter_context(metrics.collect_request_summary())
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - started
+
+        profile = save_profile(
+            request, response, user, profiler, duration, sql_recorder, request_summary)
+        if profile is not None:
+            response[PROFILE_ID_HEADER] = str(profile.pk)
+
+        return response
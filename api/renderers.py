@@ -0,0 +1,63 @@
+"""
+Renderers for the API responses
+"""
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Renderer for the server-sent events streams ('text/event-stream').
+    The streaming views return StreamingHttpResponse objects,
+    so this renderer is used only for the content negotiation
+    and for the error responses (as the 'error' event).
+    """
+
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b'event: error\ndata: ' + renderers.JSONRenderer().render(data) + b'\n\n'
+
+
+class ColumnarJSONRenderer(renderers.JSONRenderer):
+    """
+    Renderer for the list responses in the columnar JSON format:
+    the field names once and the parallel arrays of the field values
+    ({"fields": [...], "columns": [[...], ...], "count": N}),
+    the columns are built by ColumnarListMixin (see api/mixins.py).
+    """
+
+    media_type = 'application/vnd.avt.columnar+json'
+    format = 'columnar'
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renderer for the responses in the MessagePack format.
+    Requires the optional 'msgpack' package.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+# The renderers of the list responses: the default ones (JSON, browsable API),
+# the columnar JSON and MessagePack (if the 'msgpack' package is installed)
+LIST_RENDERER_CLASSES = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (ColumnarJSONRenderer, ) + \
+    ((MessagePackRenderer, ) if msgpack is not None else ())
@@ -0,0 +1,469 @@
+"""
+Execution of the check and unfollow runs with progress events:
+    1. Record the events (found not-follower, progress, done, error)
+       of the run as TwFriendsRunEvent objects
+    2. Execute the run in the background thread,
+       so the request thread isn't occupied for the whole run
+    3. Stream the events of the run as server-sent events
+       with the reconnect from the last event ID
+    4. Single-flight: the concurrent check (or unfollow) requests attach
+       to the run already in progress, and the check requested within
+       'settings.API_CHECK_MIN_INTERVAL' seconds after the last one
+       returns its result instead of starting a new run; the run in progress
+       without the heartbeat for 'settings.API_RUN_STALE_SECONDS' is dead
+       (left by a crashed or restarted process) and marked as failed
+    5. Deadline-bounded wait for the run: the request returns before the end
+       of the run with the continuation token (the run ID), and the next request
+       with the token waits for the same run instead of starting a new one
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .db import close_old_db_connections
+from .db_routers import unpin
+from .models import TwFriendsRun, TwFriendsRunEvent, TwFriendsRunLock
+
+# Names of the events of the run
+EVENT_NOT_FOLLOWER = 'not_follower'
+EVENT_PROGRESS = 'progress'
+EVENT_DONE = 'done'
+EVENT_ERROR = 'error'
+
+# The background threads executor for the runs, see get_runs_executor()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class RunEventRecorder(object):
+    """
+    Buffer the events of the run and store them
+    as TwFriendsRunEvent objects with flush().
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.seq = TwFriendsRunEvent.objects.filter(run=run).count()
+        self.buffer = []
+
+    def emit(self, event, data):
+        """
+        Add the event to the buffer.
+
+        Arguments:
+            event {str} -- The name of the event, e.g. EVENT_NOT_FOLLOWER
+            data {dict} -- The event data
+        """
+
+        self.seq += 1
+        self.buffer.append(TwFriendsRunEvent(
+            run=self.run,
+            seq=self.seq,
+            event=event,
+            data=json.dumps(data),
+        ))
+
+    def flush(self):
+        """
+        Store all the buffered events in the db with the single query.
+        """
+
+        if self.buffer:
+            TwFriendsRunEvent.objects.bulk_create(self.buffer)
+            self.buffer = []
+
+
+def runs_in_background():
+    """
+    Returns:
+        bool -- True if the started runs are executed in the background threads
+                ('settings.API_RUNS_IN_BACKGROUND'), not in the request thread
+    """
+
+    return getattr(settings, 'API_RUNS_IN_BACKGROUND', True)
+
+
+def get_runs_executor():
+    """
+    Return the background threads executor for the runs
+    with 'settings.API_RUN_WORKERS' threads.
+    """
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'API_RUN_WORKERS', 2))
+        return _executor
+
+
+def execute_run(run):
+    """
+    Execute check_tw_friends() or unfollow_tw_friends() for the 'run'
+    with recording of its events.
+    The final 'done' or 'error' event is recorded after the synchronization.
+
+    Arguments:
+        run {TwFriendsRun} -- The created check or unfollow run
+    """
+
+    from .check_not_followers_tw_friends import check_tw_friends
+    from .unfollow_not_followers_tw_friends import unfollow_tw_friends
+
+    events = RunEventRecorder(run)
+    try:
+        if run.kind == TwFriendsRun.KIND_CHECK:
+            check_tw_friends(run=run, events=events)
+        else:
+            unfollow_tw_friends(run=run)
+    except Exception as error:
+        events.emit(EVENT_ERROR, {'detail': str(error)})
+        raise
+    else:
+        events.emit(EVENT_DONE, {'status': run.status})
+    finally:
+        events.flush()
+
+
+def _execute_run_in_thread(run):
+    """
+    Execute the run in the background thread,
+    and close the db connection of this thread at the end.
+    """
+
+    # The thread is reused by the executor: drop its unusable or obsolete connection
+    # and its pinning to the primary db
+    close_old_db_connections()
+    unpin()
+    try:
+        execute_run(run)
+    except Exception:
+        # The error is recorded as the TwFriendsRun status and the 'error' event
+        pass
+    finally:
+        unpin()
+        connection.close()
+
+
+def touch_run(run):
+    """
+    Store the heartbeat of the running run (e.g. after each page of the check).
+
+    Arguments:
+        run {TwFriendsRun} -- The running run
+    """
+
+    run.heartbeat_at = timezone.now()
+    TwFriendsRun.objects.filter(pk=run.pk, status=TwFriendsRun.STATUS_RUNNING).update(
+        heartbeat_at=run.heartbeat_at)
+
+
+def get_stale_heartbeat_at():
+    """
+    Returns:
+        datetime -- The heartbeat of the running run before this time is stale
+    """
+
+    return timezone.now() - timedelta(
+        seconds=getattr(settings, 'API_RUN_STALE_SECONDS', 45 * 60))
+
+
+def fail_stale_runs(queryset):
+    """
+    Mark the running runs of the queryset with the stale heartbeat as failed
+    with the 'error' event, the concurrent requests mark each run once.
+
+    Arguments:
+        queryset {QuerySet} -- TwFriendsRun objects
+
+    Returns:
+        int -- Count of the failed runs
+    """
+
+    stale_heartbeat_at = get_stale_heartbeat_at()
+    failed_count = 0
+    for run in queryset.filter(status=TwFriendsRun.STATUS_RUNNING,
+                               heartbeat_at__lt=stale_heartbeat_at):
+        if not TwFriendsRun.objects.filter(
+                pk=run.pk, status=TwFriendsRun.STATUS_RUNNING,
+                heartbeat_at__lt=stale_heartbeat_at).update(
+                    status=TwFriendsRun.STATUS_FAILED, finished_at=timezone.now()):
+            continue
+        events = RunEventRecorder(run)
+        events.emit(EVENT_ERROR, {
+            'detail': 'The %s run #%s has stopped without the heartbeat since %s' % (
+                run.kind, run.pk, run.heartbeat_at.isoformat())})
+        events.flush()
+        failed_count += 1
+    return failed_count
+
+
+def get_attachable_run(kind):
+    """
+    Return the run which the new request of the 'kind' attaches to:
+        1. The run of the 'kind' in progress (with the heartbeat within
+           'settings.API_RUN_STALE_SECONDS', see fail_stale_runs())
+        2. For the check: the last succeeded check finished
+           within 'settings.API_CHECK_MIN_INTERVAL' seconds
+
+    Arguments:
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+
+    Returns:
+        TwFriendsRun object -- The run or None
+    """
+
+    now = timezone.now()
+    run = TwFriendsRun.objects.filter(
+        kind=kind,
+        status=TwFriendsRun.STATUS_RUNNING,
+        heartbeat_at__gte=get_stale_heartbeat_at(),
+    ).first()
+    if run is not None:
+        return run
+
+    min_interval = getattr(settings, 'API_CHECK_MIN_INTERVAL', 0)
+    if kind == TwFriendsRun.KIND_CHECK and min_interval > 0:
+        return TwFriendsRun.objects.filter(
+            kind=kind,
+            status=TwFriendsRun.STATUS_SUCCEEDED,
+            finished_at__gte=now - timedelta(seconds=min_interval),
+        ).order_by('-finished_at').first()
+
+    return None
+
+
+def get_or_create_run(kind):
+    """
+    Return the run which the request attaches to (see get_attachable_run())
+    or create a new one. The lock row of the 'kind' is locked with
+    SELECT ... FOR UPDATE, so the concurrent requests don't create two runs.
+
+    Arguments:
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+
+    Returns:
+        tuple -- (TwFriendsRun object, True if the run is created)
+    """
+
+    with transaction.atomic():
+        TwFriendsRunLock.objects.select_for_update().get_or_create(kind=kind)
+        fail_stale_runs(TwFriendsRun.objects.filter(kind=kind))
+        run = get_attachable_run(kind)
+        if run is not None:
+            return run, False
+        return TwFriendsRun.objects.create(kind=kind), True
+
+
+def start_run(kind):
+    """
+    Start a check or unfollow run in the background thread
+    (if 'settings.API_RUNS_IN_BACKGROUND' is True) or right away,
+    or attach to the run in progress (see get_or_create_run()).
+
+    Arguments:
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+
+    Returns:
+        TwFriendsRun object -- The started or attached run
+    """
+
+    run, created = get_or_create_run(kind)
+    if not created:
+        return run
+
+    if runs_in_background():
+        get_runs_executor().submit(_execute_run_in_thread, run)
+    else:
+        try:
+            execute_run(run)
+        except Exception:
+            pass
+
+    return run
+
+
+def wait_for_run(run, timeout=None):
+    """
+    Wait until the run isn't running, polling its status
+    every 'settings.API_RUN_EVENTS_POLL_INTERVAL' seconds.
+    The run with the stale heartbeat is marked as failed (see fail_stale_runs()).
+
+    Arguments:
+        run {TwFriendsRun} -- The run
+        timeout {float} -- Max seconds of the wait, None waits for the end
+                           of the run (default: {None})
+
+    Returns:
+        TwFriendsRun object -- The finished run, or the running one after the timeout
+    """
+
+    poll_interval = getattr(settings, 'API_RUN_EVENTS_POLL_INTERVAL', 0.5)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while run.status == TwFriendsRun.STATUS_RUNNING:
+        if run.heartbeat_at < get_stale_heartbeat_at():
+            # The run is left by a dead process
+            fail_stale_runs(TwFriendsRun.objects.filter(pk=run.pk))
+            run.refresh_from_db(fields=['status', 'finished_at', 'summary'])
+            break
+        if deadline is None:
+            time.sleep(poll_interval)
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(poll_interval, remaining))
+        run.refresh_from_db(fields=['status', 'finished_at', 'summary', 'heartbeat_at'])
+    return run
+
+
+def parse_continuation(continuation, kind):
+    """
+    Return the run of the continuation token returned by the deadline-bounded request.
+
+    Arguments:
+        continuation {str} -- The continuation token (the run ID)
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+
+    Returns:
+        TwFriendsRun object -- The run or None if the token is invalid
+    """
+
+    try:
+        run_id = int(continuation)
+    except (TypeError, ValueError):
+        return None
+    return TwFriendsRun.objects.filter(pk=run_id, kind=kind).first()
+
+
+def get_run_error(run):
+    """
+    Arguments:
+        run {TwFriendsRun} -- The failed run
+
+    Returns:
+        str -- The detail of the 'error' event of the run or None if it isn't recorded
+    """
+
+    event = TwFriendsRunEvent.objects.filter(run=run, event=EVENT_ERROR).last()
+    return json.loads(event.data).get('detail') if event is not None else None
+
+
+class RunFailedError(Exception):
+    """
+    The run which the request attached to has failed
+    """
+
+    def __init__(self, run):
+        super(RunFailedError, self).__init__('The %s run #%s has failed' % (run.kind, run.pk))
+        self.run = run
+
+
+def run_single_flight(kind):
+    """
+    Execute a check or unfollow run in the request thread, or attach to the run
+    in progress and wait for its end (see get_or_create_run()).
+    The result of the run is the NotFollowerTwFriend objects in db.
+
+    Arguments:
+        kind {str} -- TwFriendsRun.KIND_CHECK or TwFriendsRun.KIND_UNFOLLOW
+
+    Returns:
+        TwFriendsRun object -- The finished run
+
+    Raises:
+        Exception -- The error of the run executed by this request
+        RunFailedError -- The attached run has failed
+    """
+
+    run, created = get_or_create_run(kind)
+    if created:
+        execute_run(run)
+        return run
+
+    run = wait_for_run(run)
+    if run.status == TwFriendsRun.STATUS_FAILED:
+        raise RunFailedError(run)
+    return run
+
+
+def parse_last_event_id(last_event_id):
+    """
+    Parse the last event ID '<run_id>:<seq>' sent by the reconnecting client.
+
+    Arguments:
+        last_event_id {str} -- The 'Last-Event-ID' header value
+
+    Returns:
+        tuple -- (run_id, seq) or None if the last event ID is invalid
+    """
+
+    try:
+        run_id, seq = last_event_id.split(':')
+        return int(run_id), int(seq)
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_sse(run_id, event):
+    """
+    Format the TwFriendsRunEvent object as the server-sent event.
+    """
+
+    return 'id: %s:%s\nevent: %s\ndata: %s\n\n' % (run_id, event.seq, event.event, event.data)
+
+
+def iter_run_events_sse(run_id, after_seq=0):
+    """
+    Generate the events of the run after 'after_seq' as server-sent events,
+    polling the db every 'settings.API_RUN_EVENTS_POLL_INTERVAL' seconds
+    until the final 'done' or 'error' event of the run is sent.
+
+    Arguments:
+        run_id {int} -- The ID of the TwFriendsRun object
+        after_seq {int} -- The sequence number of the last received event
+
+    Yields:
+        str -- The server-sent event (or the keep-alive comment)
+    """
+
+    poll_interval = getattr(settings, 'API_RUN_EVENTS_POLL_INTERVAL', 0.5)
+    keep_alive_interval = getattr(settings, 'API_RUN_EVENTS_KEEP_ALIVE', 15)
+
+    # Reconnection time for the client (milliseconds)
+    yield 'retry: 3000\n\n'
+
+    last_sent = time.monotonic()
+    run_finished_polls = 0
+    while True:
+        # Read the run status before the events of this poll
+        run_status = TwFriendsRun.objects.filter(pk=run_id).values_list(
+            'status', flat=True).first()
+        events = list(TwFriendsRunEvent.objects.filter(run_id=run_id, seq__gt=after_seq))
+        for event in events:
+            after_seq = event.seq
+            yield format_sse(run_id, event)
+            if event.event in (EVENT_DONE, EVENT_ERROR):
+                return
+        if events:
+            last_sent = time.monotonic()
+
+        # The run is finished (or doesn't exist), but its final event
+        # isn't stored yet: wait for it with the one more poll
+        if run_status != TwFriendsRun.STATUS_RUNNING:
+            run_finished_polls += 1
+            if run_finished_polls > 1:
+                return
+
+        if time.monotonic() - last_sent >= keep_alive_interval:
+            last_sent = time.monotonic()
+            yield ': keep-alive\n\n'
+
+        time.sleep(poll_interval)
@@ -0,0 +1,146 @@
+"""
+Cached schema of the API:
+    1. The schema is generated by the introspection of all the views once per process
+       (on the first request of the schema or the docs), not on each request
+    2. The schema can be pre-generated at deploy time with 'generate_schema'
+       management command into 'settings.API_SCHEMA_FILE', then it's loaded
+       from the file without the introspection at all
+    3. The schema has only the endpoints permitted to the user, so it's cached
+       and pre-generated for each permission scope (the staff users see the admin endpoints)
+"""
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpRequest
+
+from rest_framework.compat import coreapi
+from rest_framework.request import Request
+from rest_framework.schemas.generators import SchemaGenerator
+
+SCHEMA_TITLE = 'avt_checktwfriends API schema'
+DOCS_TITLE = 'avt_checktwfriends API docs'
+
+# The permission scopes of the schema
+SCOPE_STAFF = 'staff'
+SCOPE_USER = 'user'
+SCOPES = (SCOPE_STAFF, SCOPE_USER)
+
+# The generated schemas by (title, url, description, scope)
+_schemas = {}
+_lock = threading.Lock()
+
+
+def get_schema_file():
+    """
+    Returns:
+        str -- Path of the pre-generated schema file or None
+    """
+
+    return getattr(settings, 'API_SCHEMA_FILE', None)
+
+
+def get_permission_scope(request):
+    """
+    Arguments:
+        request {Request} -- The request of the schema
+
+    Returns:
+        str -- The permission scope of the request user or None for the anonymous user
+    """
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return SCOPE_STAFF if user.is_staff else SCOPE_USER
+
+
+def get_scope_request(scope):
+    """
+    Return the request of the user of the permission 'scope'
+    to generate its schema without the request (see generate_schema command).
+    """
+
+    request = Request(HttpRequest())
+    request.user = User(username=scope, is_staff=scope == SCOPE_STAFF)
+    return request
+
+
+def encode_schemas(schemas):
+    """
+    Encode the schema documents to the JSON of the schema file.
+
+    Arguments:
+        schemas {dict} -- {scope: {title: coreapi.Document}}
+
+    Returns:
+        str -- JSON object {scope: {title: Core JSON document}}
+    """
+
+    codec = coreapi.codecs.CoreJSONCodec()
+    return json.dumps({
+        scope: {
+            title: json.loads(codec.encode(document).decode('utf-8'))
+            for title, document in scope_schemas.items()
+        }
+        for scope, scope_schemas in schemas.items()
+    }, sort_keys=True)
+
+
+def load_schema(title, scope):
+    """
+    Load the schema document with the 'title' of the permission 'scope'
+    from the pre-generated schema file.
+
+    Arguments:
+        title {str} -- The schema title
+        scope {str} -- The permission scope
+
+    Returns:
+        coreapi.Document -- The schema document or None if there is no file, no scope or no title
+    """
+
+    path = get_schema_file()
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path, encoding='utf-8') as schema_file:
+        schemas = json.load(schema_file).get(scope)
+    if not isinstance(schemas, dict) or title not in schemas:
+        return None
+
+    codec = coreapi.codecs.CoreJSONCodec()
+    return codec.decode(json.dumps(schemas[title]).encode('utf-8'))
+
+
+def reset_schema_cache():
+    """
+    Drop the generated schemas of this process.
+    """
+
+    with _lock:
+        _schemas.clear()
+
+
+class CachedSchemaGenerator(SchemaGenerator):
+    """
+    Schema generator which generates the schema of each permission scope
+    once per process or loads it from the pre-generated schema file.
+    The schema of the anonymous user (and the public one) isn't cached.
+    """
+
+    def get_schema(self, request=None, public=False):
+        scope = None if public else get_permission_scope(request)
+        if scope is None:
+            return super(CachedSchemaGenerator, self).get_schema(request=request, public=public)
+
+        key = (self.title, self.url, self.description, scope)
+        with _lock:
+            if key not in _schemas:
+                schema = load_schema(self.title, scope)
+                if schema is None:
+                    schema = super(CachedSchemaGenerator, self).get_schema(request=request)
+                _schemas[key] = schema
+            return _schemas[key]
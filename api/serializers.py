@@ -1,12 +1,99 @@
+import json
+
 from rest_framework import serializers
 
-from .models import NotFollowerTwFriend
+from .models import AutoClassificationRule, NotFollowerTwFriend, RequestProfile, TwFriendsRun
+
+
+class SparseFieldsSerializerMixin(object):
+    ''' Serializer which outputs only the fields passed as 'fields' argument'''
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(SparseFieldsSerializerMixin, self).__init__(*args, **kwargs)
 
-class NotFollowerTwFriendSerializer(serializers.ModelSerializer):
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class NotFollowerTwFriendSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     ''' Serializer for NotFollowerTwFriend Model'''
-    
+
+    # Counted in SQL at the query time (see NotFollowerTwFriendQuerySet)
+    avg_tweetsperday = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
     class Meta:
         model = NotFollowerTwFriend
         fields = ['id_str', 'screen_name', 'name', 'description', 'statuses_count',\
             'followers_count', 'friends_count', 'created_at', 'location', \
-            'avg_tweetsperday', 'tff_ratio', 'need_unfollow']
\ No newline at end of file
+            'avg_tweetsperday', 'tff_ratio', 'need_unfollow', 'version']
+        read_only_fields = ['version']
+
+
+class TwFriendsRunSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    ''' Serializer for TwFriendsRun Model'''
+
+    summary = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TwFriendsRun
+        fields = ['id', 'kind', 'status', 'started_at', 'finished_at', 'summary']
+
+    def get_summary(self, obj):
+        ''' Return the JSON encoded per-run summary of the metrics as dict'''
+        return json.loads(obj.summary)
+
+
+class RequestProfileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    ''' Serializer for RequestProfile Model'''
+
+    summary = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RequestProfile
+        fields = ['id', 'user', 'method', 'path', 'status_code', 'duration', 'created_at',
+                  'summary']
+
+    def get_summary(self, obj):
+        ''' Return the JSON encoded summary of the profile as dict'''
+        return json.loads(obj.summary)
+
+
+class AutoClassificationRuleSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    ''' Serializer for AutoClassificationRule Model'''
+
+    rule = serializers.CharField(source='__str__', read_only=True)
+
+    class Meta:
+        model = AutoClassificationRule
+        fields = ['id', 'name', 'field', 'operator', 'value', 'enabled', 'rule']
+
+
+class TwFriendshipsCheckSerializer(serializers.Serializer):
+    ''' Serializer for the users of the targeted check of the relationships'''
+
+    # Max count of the users of the single check (15 LookupFriendship calls
+    # per rate limit window of the credential)
+    MAX_USERS = 1500
+
+    screen_names = serializers.ListField(
+        child=serializers.RegexField(r'^[A-Za-z0-9_]{1,15}$'), required=False, default=list)
+    ids = serializers.ListField(
+        child=serializers.RegexField(r'^[0-9]{1,20}$'), required=False, default=list)
+    need_unfollow = serializers.NullBooleanField(required=False, default=None)
+
+    def validate(self, data):
+        ''' Add the 'id_str' of the NotFollowerTwFriend objects selected
+            by 'need_unfollow' to the 'ids' and check the count of the users'''
+
+        if data['need_unfollow'] is not None:
+            data['ids'] = list(data['ids']) + list(NotFollowerTwFriend.objects.filter(
+                need_unfollow=data['need_unfollow']).values_list('id_str', flat=True))
+
+        count = len(set(data['screen_names'])) + len(set(data['ids']))
+        if not 0 < count <= self.MAX_USERS:
+            raise serializers.ValidationError(
+                'From 1 to %s users must be selected by "screen_names", "ids" '
+                'or "need_unfollow".' % self.MAX_USERS)
+        return data
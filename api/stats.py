@@ -0,0 +1,261 @@
+"""
+Summary statistics of the Twitter friends who aren't followers:
+    1. Counters (NotFollowersTwFriendsStat objects): total, need_unfollow count,
+       histograms of 'tff_ratio' and 'avg_tweetsperday'
+    2. Incremental updates of the counters by the deltas of the changed rows
+       (check sync, unfollow, PATCH, import, auto-classification),
+       so reading the statistics costs O(1) instead of O(rows)
+    3. Consistency check of the counters against the full recomputation
+    4. 'avg_tweetsperday' is counted at the query time from the current date
+       (see NotFollowerTwFriendQuerySet), so the counters are recomputed
+       once per day on the first read or update of the day
+"""
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+
+from .models import NotFollowerTwFriend, NotFollowersTwFriendsStat
+
+TOTAL_KEY = 'total'
+NEED_UNFOLLOW_KEY = 'need_unfollow'
+# The day of the counters computation (date.toordinal())
+DAY_KEY = 'day'
+
+# Histogram buckets [lower, upper) for the fields
+HISTOGRAM_BUCKETS = {
+    'tff_ratio': [0, Decimal('0.5'), 1, 2, 5, 10, None],
+    'avg_tweetsperday': [0, Decimal('0.1'), 1, 5, 20, 50, None],
+}
+
+
+def iter_buckets(field_name):
+    """
+    Generate the histogram buckets of the field.
+
+    Yields:
+        tuple -- (counter key, lower bound, upper bound or None)
+    """
+
+    bounds = HISTOGRAM_BUCKETS[field_name]
+    for lower, upper in zip(bounds, bounds[1:]):
+        label = '%s-%s' % (lower, upper) if upper is not None else '%s+' % lower
+        yield '%s:%s' % (field_name, label), lower, upper
+
+
+def get_stat_keys():
+    """
+    Returns:
+        list -- Keys of all the counters
+    """
+
+    keys = [TOTAL_KEY, NEED_UNFOLLOW_KEY]
+    for field_name in HISTOGRAM_BUCKETS:
+        keys.extend(key for key, _, _ in iter_buckets(field_name))
+    return keys
+
+
+def get_row_stat_keys(not_follower_tw_friend):
+    """
+    Return the keys of the counters which the row contributes to.
+
+    Arguments:
+        not_follower_tw_friend {NotFollowerTwFriend} -- The row (saved or not)
+
+    Returns:
+        list -- The counter keys
+    """
+
+    keys = [TOTAL_KEY]
+    if not_follower_tw_friend.need_unfollow:
+        keys.append(NEED_UNFOLLOW_KEY)
+
+    for field_name in HISTOGRAM_BUCKETS:
+        value = Decimal(str(getattr(not_follower_tw_friend, field_name)))
+        for key, lower, upper in iter_buckets(field_name):
+            if value >= lower and (upper is None or value < upper):
+                keys.append(key)
+                break
+
+    return keys
+
+
+class StatsDelta(Counter):
+    """
+    The deltas of the counters accumulated from the changed rows
+    """
+
+    def add_row(self, not_follower_tw_friend, sign=1):
+        """
+        Add (sign=1) or subtract (sign=-1) the row contribution.
+        """
+
+        for key in get_row_stat_keys(not_follower_tw_friend):
+            self[key] += sign
+
+    def remove_row(self, not_follower_tw_friend):
+        """
+        Subtract the contribution of the deleted (or the old version of updated) row.
+        """
+
+        self.add_row(not_follower_tw_friend, sign=-1)
+
+
+def get_stats_aggregates():
+    """
+    Returns:
+        dict -- Conditional SUM aggregates of all the counters
+    """
+
+    def count_if(condition):
+        return Sum(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+
+    aggregates = {
+        TOTAL_KEY: count_if(Q(pk__isnull=False)),
+        NEED_UNFOLLOW_KEY: count_if(Q(need_unfollow=True)),
+    }
+    for field_name in HISTOGRAM_BUCKETS:
+        for key, lower, upper in iter_buckets(field_name):
+            condition = Q(**{'%s__gte' % field_name: lower})
+            if upper is not None:
+                condition &= Q(**{'%s__lt' % field_name: upper})
+            aggregates[key] = count_if(condition)
+
+    return aggregates
+
+
+def count_stats(queryset=None):
+    """
+    Count all the counters for the rows of the queryset with the single aggregate query.
+
+    Arguments:
+        queryset {QuerySet} -- NotFollowerTwFriend rows (all rows by default)
+
+    Returns:
+        dict -- {counter key: count}
+    """
+
+    if queryset is None:
+        queryset = NotFollowerTwFriend.objects.all()
+    # The histogram of 'avg_tweetsperday' is counted from the annotation
+    queryset = queryset.with_avg_tweetsperday()
+
+    aggregates = get_stats_aggregates()
+    # The keys of the counters aren't valid aggregate aliases
+    counts = queryset.aggregate(**{
+        'stat_%s' % i: aggregate for i, aggregate in enumerate(aggregates.values())
+    })
+    return {
+        key: counts['stat_%s' % i] or 0 for i, key in enumerate(aggregates)
+    }
+
+
+def recompute_stats():
+    """
+    Recompute all the counters from the NotFollowerTwFriend rows (O(rows)).
+
+    Returns:
+        dict -- {counter key: count}
+    """
+
+    counts = count_stats()
+    with transaction.atomic():
+        NotFollowersTwFriendsStat.objects.all().delete()
+        NotFollowersTwFriendsStat.objects.bulk_create([
+            NotFollowersTwFriendsStat(key=key, value=value) for key, value in counts.items()
+        ] + [NotFollowersTwFriendsStat(key=DAY_KEY, value=date.today().toordinal())])
+    return counts
+
+
+def is_stats_initialized():
+    """
+    Returns:
+        bool -- True if the counters were computed today
+    """
+
+    return NotFollowersTwFriendsStat.objects.filter(
+        key=DAY_KEY, value=date.today().toordinal()).exists()
+
+
+def apply_stats_delta(delta):
+    """
+    Apply the deltas to the counters with the atomic 'value = value + delta' updates.
+    If the counters were never computed or weren't computed today,
+    they are recomputed instead.
+
+    Arguments:
+        delta {dict} -- {counter key: delta}
+    """
+
+    if not is_stats_initialized():
+        recompute_stats()
+        return
+
+    for key, value in delta.items():
+        if value:
+            NotFollowersTwFriendsStat.objects.filter(key=key).update(value=F('value') + value)
+
+
+def subtract_queryset_stats(queryset):
+    """
+    Subtract the contribution of the rows of the queryset (before their deletion)
+    with the single aggregate query.
+
+    Arguments:
+        queryset {QuerySet} -- NotFollowerTwFriend rows which will be deleted
+    """
+
+    if not is_stats_initialized():
+        return
+
+    apply_stats_delta({key: -value for key, value in count_stats(queryset).items()})
+
+
+def get_stats():
+    """
+    Return the summary statistics from the counters (O(1)).
+
+    Returns:
+        dict -- 'total', 'need_unfollow', 'keep' counts and
+                'histograms' of 'tff_ratio' and 'avg_tweetsperday'
+    """
+
+    counts = dict(NotFollowersTwFriendsStat.objects.values_list('key', 'value'))
+    if TOTAL_KEY not in counts or counts.get(DAY_KEY) != date.today().toordinal():
+        counts = recompute_stats()
+
+    return {
+        'total': counts.get(TOTAL_KEY, 0),
+        'need_unfollow': counts.get(NEED_UNFOLLOW_KEY, 0),
+        'keep': counts.get(TOTAL_KEY, 0) - counts.get(NEED_UNFOLLOW_KEY, 0),
+        'histograms': {
+            field_name: [
+                {
+                    'bucket': key.split(':', 1)[1],
+                    'count': counts.get(key, 0),
+                }
+                for key, _, _ in iter_buckets(field_name)
+            ]
+            for field_name in HISTOGRAM_BUCKETS
+        },
+    }
+
+
+def verify_stats():
+    """
+    Verify the counters against the full recomputation.
+
+    Returns:
+        dict -- {counter key: (stored value, recomputed value)} of the mismatched counters
+    """
+
+    stored = dict(NotFollowersTwFriendsStat.objects.values_list('key', 'value'))
+    recomputed = count_stats()
+
+    return {
+        key: (stored.get(key), value)
+        for key, value in recomputed.items()
+        if stored.get(key) != value
+    }
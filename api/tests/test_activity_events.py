@@ -0,0 +1,216 @@
+"""
+Test module for the incremental update from the account activity events
+"""
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .. import stats
+from ..activity_events import process_activity_events, sign
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..models import ActivityEvent, NotFollowerTwFriend, TwFollower
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+ACCOUNT_ID = '1000'
+
+
+def make_user(id_str, screen_name, **fields):
+    """
+    Return the user object of the activity payload
+    """
+
+    user = {
+        'id_str': id_str,
+        'screen_name': screen_name,
+        'name': screen_name,
+        'statuses_count': 100,
+        'followers_count': 10,
+        'friends_count': 5,
+        'created_at': 'Mon Jan 01 00:00:00 +0000 2018',
+    }
+    user.update(fields)
+    return user
+
+
+ACCOUNT = make_user(ACCOUNT_ID, 'account')
+
+
+@override_settings(ACTIVITY_WEBHOOK_SECRET='webhook_secret')
+class ActivityEventsTestCase(APITestCase):
+    """
+    Test the verification, the queue and the incremental application of the events
+    """
+
+    def setUp(self):
+        NotFollowerTwFriend.objects.create(
+            id_str='1', screen_name='tw_user_1', name='Twitter User #1',
+            created_at='Mon Jan 01 00:00:00 +0000 2018', tff_ratio=2, need_unfollow=False)
+        NotFollowerTwFriend.objects.create(
+            id_str='2', screen_name='tw_user_2', name='Twitter User #2',
+            created_at='Mon Jan 01 00:00:00 +0000 2018', tff_ratio=0.2)
+        TwFollower.objects.create(id_str='3')
+        stats.recompute_stats()
+        self.url = reverse('activity_webhook')
+
+    def post_payload(self, payload, signature=None):
+        body = json.dumps(payload).encode('utf-8')
+        return self.client.generic(
+            'POST', self.url, body, content_type='application/json',
+            HTTP_X_TWITTER_WEBHOOKS_SIGNATURE=signature or sign(body))
+
+    def follow_event(self, event_type, source, target):
+        return {'type': event_type, 'source': source, 'target': target}
+
+    def test_crc_challenge(self):
+        response = self.client.get(self.url, {'crc_token': 'challenge'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['response_token'], sign(b'challenge'))
+        self.assertTrue(response.data['response_token'].startswith('sha256='))
+
+    def test_crc_signed_payload_rejected(self):
+        body = json.dumps({
+            'for_user_id': ACCOUNT_ID,
+            'follow_events': [self.follow_event('unfollow', ACCOUNT, make_user('2', 'tw_user_2'))],
+        })
+
+        # The CRC challenge doesn't sign the payload
+        response = self.client.get(self.url, {'crc_token': body})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('response_token', response.data)
+        for crc_token in ('a' * 129, 'token with spaces', '{}'):
+            response = self.client.get(self.url, {'crc_token': crc_token})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The signature of the valid CRC token isn't the valid payload
+        response = self.client.get(self.url, {'crc_token': 'challenge'})
+        response = self.client.generic(
+            'POST', self.url, b'challenge', content_type='application/json',
+            HTTP_X_TWITTER_WEBHOOKS_SIGNATURE=response.data['response_token'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ActivityEvent.objects.count(), 0)
+
+    def test_invalid_signature(self):
+        response = self.post_payload({'for_user_id': ACCOUNT_ID}, signature='sha256=invalid')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_payload(self):
+        response = self.post_payload({'follow_events': [{}]})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ActivityEvent.objects.count(), 0)
+
+    def test_apply_events(self):
+        response = self.post_payload({
+            'for_user_id': ACCOUNT_ID,
+            'follow_events': [
+                # The account follows the user who isn't follower -- insert
+                self.follow_event('follow', ACCOUNT, make_user('4', 'tw_user_4')),
+                # The account follows the follower -- nothing
+                self.follow_event('follow', ACCOUNT, make_user('3', 'tw_user_3')),
+                # The account unfollows the user -- delete
+                self.follow_event('unfollow', ACCOUNT, make_user('2', 'tw_user_2')),
+                # The user follows the account -- delete
+                self.follow_event('follow', make_user('1', 'tw_user_1'), ACCOUNT),
+                # The follower followed by the account unfollows it -- insert
+                self.follow_event(
+                    'unfollow', make_user('3', 'tw_user_3', following=True), ACCOUNT),
+            ],
+            'user_update_events': [
+                {'user': make_user('4', 'tw_user_4_renamed', followers_count=50)},
+                # The user isn't in db -- nothing
+                {'user': make_user('5', 'tw_user_5')},
+            ],
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['queued'], 7)
+        # Nothing is applied before the processing
+        self.assertEqual(NotFollowerTwFriend.objects.count(), 2)
+
+        self.assertEqual(process_activity_events(), {'applied': 7, 'failed': 0})
+        self.assertEqual(
+            dict(NotFollowerTwFriend.objects.values_list('id_str', 'screen_name')),
+            {'3': 'tw_user_3', '4': 'tw_user_4_renamed'})
+        self.assertEqual(NotFollowerTwFriend.objects.get(id_str='4').tff_ratio, 10)
+        self.assertEqual(list(TwFollower.objects.values_list('id_str', flat=True)), ['1'])
+        self.assertEqual(stats.verify_stats(), {})
+        self.assertFalse(ActivityEvent.objects.filter(processed_at=None).exists())
+
+    def test_user_update_keeps_decision(self):
+        self.post_payload({
+            'for_user_id': ACCOUNT_ID,
+            'user_update_events': [{'user': make_user('1', 'tw_user_1', statuses_count=0)}],
+        })
+        process_activity_events()
+
+        tw_friend = NotFollowerTwFriend.objects.get(id_str='1')
+        self.assertFalse(tw_friend.need_unfollow)
+        self.assertEqual(tw_friend.avg_tweetsperday, 0)
+
+    def test_failed_event(self):
+        self.post_payload({
+            'for_user_id': ACCOUNT_ID,
+            'follow_events': [self.follow_event('follow', ACCOUNT, {'id_str': '6'})],
+        })
+
+        self.assertEqual(process_activity_events(), {'applied': 0, 'failed': 1})
+        self.assertIn('screen_name', ActivityEvent.objects.get().error)
+        self.assertEqual(process_activity_events(), {'applied': 0, 'failed': 0})
+
+    def test_replay_command(self):
+        payloads = [
+            {'for_user_id': ACCOUNT_ID, 'follow_events': [
+                self.follow_event('follow', ACCOUNT, make_user('4', 'tw_user_4'))]},
+            {'for_user_id': ACCOUNT_ID, 'follow_events': [
+                self.follow_event('follow', make_user('2', 'tw_user_2'), ACCOUNT)]},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as events_file:
+            events_file.write('\n'.join(json.dumps(payload) for payload in payloads))
+        self.addCleanup(os.remove, events_file.name)
+
+        out = io.StringIO()
+        call_command('replay_activity_events', events_file.name, '--process', stdout=out)
+
+        self.assertIn('queued 2 events', out.getvalue())
+        self.assertIn('Applied 2, failed 0', out.getvalue())
+        self.assertEqual(
+            sorted(NotFollowerTwFriend.objects.values_list('id_str', flat=True)), ['1', '4'])
+
+    def test_check_replaces_followers(self):
+        api = make_twitter_api([make_tw_user(4, 'tw_user_4')], follower_ids=[7, 8])
+        with mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                        return_value=api):
+            check_tw_friends()
+
+        self.assertEqual(
+            sorted(TwFollower.objects.values_list('id_str', flat=True)), ['7', '8'])
+
+    def test_check_keeps_events_applied_while_running(self):
+        api = make_twitter_api([make_tw_user(4, 'tw_user_4')], follower_ids=[7, 8])
+
+        def get_friend_ids_paged(**kwargs):
+            # The events are applied after the follower IDs are fetched by the check
+            self.post_payload({'for_user_id': ACCOUNT_ID, 'follow_events': [
+                self.follow_event('follow', make_user('9', 'tw_user_9'), ACCOUNT),
+                self.follow_event('unfollow', make_user('7', 'tw_user_7'), ACCOUNT),
+            ]})
+            process_activity_events()
+            return (0, 0, [4])
+
+        api.GetFriendIDsPaged.side_effect = get_friend_ids_paged
+        with mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                        return_value=api):
+            check_tw_friends()
+
+        self.assertEqual(
+            sorted(TwFollower.objects.values_list('id_str', flat=True)), ['8', '9'])
@@ -0,0 +1,127 @@
+"""
+Test module for the authentication with the short-lived signed API tokens
+"""
+import base64
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient, APITestCase
+from rest_framework import status
+
+from ..authentication import reset_token_cache, TokenCache
+from ..models import SignedTokenRevocation
+
+
+class SignedTokenAuthenticationTestCase(APITestCase):
+    """
+    Test the creation, the cached verification, the expiry
+    and the revocation of the signed tokens
+    """
+
+    def setUp(self):
+        reset_token_cache()
+        self.user = User.objects.create_user(username='test_user', password='top_secret')
+        self.url = reverse('get_not_followers_tw_friends_stats')
+
+    def tearDown(self):
+        reset_token_cache()
+
+    def obtain_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(
+            b'test_user:top_secret').decode())
+        response = client.post(reverse('signed_token'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['token']
+
+    def test_authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + self.obtain_token())
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_cached_token_without_db_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + self.obtain_token())
+        self.client.get(self.url)
+
+        with mock.patch('api.authentication.SignedTokenRevocation.objects') as revocations, \
+                mock.patch('api.authentication.SignedTokenAuthentication.verify_token') \
+                as verify_token:
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        revocations.filter.assert_not_called()
+        verify_token.assert_not_called()
+
+    def test_invalid_token(self):
+        token = self.obtain_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + token[:-1] + 'x')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(API_SIGNED_TOKEN_MAX_AGE=60)
+    def test_expired_token(self):
+        token = self.obtain_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + token)
+
+        with mock.patch('time.time', return_value=time.time() + 61):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + self.obtain_token())
+        self.client.get(self.url)
+
+        response = self.client.delete(reverse('signed_token'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(SignedTokenRevocation.objects.count(), 1)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_in_other_process(self):
+        token = self.obtain_token()
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + token)
+        self.client.delete(reverse('signed_token'))
+
+        # The other process (without the token in its cache) looks up the revocation in db
+        reset_token_cache()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_create_with_signed_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + self.obtain_token())
+
+        response = self.client.post(reverse('signed_token'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_revoke_requires_signed_token(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.delete(reverse('signed_token'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_inactive_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Signed ' + self.obtain_token())
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenCacheTestCase(APITestCase):
+    """
+    Test the LRU eviction and the expiry of the token cache entries
+    """
+
+    def test_lru_and_expiry(self):
+        cache = TokenCache(max_size=2, ttl=10)
+        cache.set('a', 1, 0, 100)
+        cache.set('b', 2, 0, 5)
+        cache.get('a', 1)
+        cache.set('c', 3, 1, 100)
+
+        self.assertIsNone(cache.get('b', 1))
+        self.assertEqual(cache.get('a', 1), 1)
+        # The entry expires with the token if it's earlier than the TTL
+        cache.set('b', 2, 0, 5)
+        self.assertIsNone(cache.get('b', 5))
+        self.assertIsNone(cache.get('a', 10))
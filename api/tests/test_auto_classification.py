@@ -0,0 +1,79 @@
+"""
+Test module for the auto-classification with the keep rules
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..auto_classification import apply_auto_classification_rules
+from ..models import AutoClassificationRule, NotFollowerTwFriend, NotFollowersTwFriendsStat, \
+    NotFollowersTwFriendsVersion
+from ..stats import recompute_stats
+
+
+class AutoClassificationTestCase(APITestCase):
+    """
+    Test the keep rules engine and the API of the rules
+    """
+
+    def setUp(self):
+        for i, (tff_ratio, followers_count) in enumerate(
+                [(0.5, 10), (2, 10), (3, 200000), (0.1, 150000)], 1):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                tff_ratio=tff_ratio,
+                followers_count=followers_count,
+                need_unfollow=(i != 3)
+            )
+        AutoClassificationRule.objects.create(
+            name='Good ratio', field='tff_ratio', operator='gte', value=2)
+        AutoClassificationRule.objects.create(
+            name='Popular', field='followers_count', operator='gt', value=100000)
+        AutoClassificationRule.objects.create(
+            name='Disabled', field='tff_ratio', operator='lt', value=1, enabled=False)
+
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def test_apply_rules_with_single_update(self):
+        recompute_stats()
+        with CaptureQueriesContext(connection) as queries:
+            kept_count = apply_auto_classification_rules()
+
+        self.assertEqual(kept_count, 2)
+        # The queries of the summary statistics counters, the version of the changes feed
+        # and the savepoints of the transaction are not counted
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries.captured_queries
+             if NotFollowersTwFriendsStat._meta.db_table not in query['sql'] and
+             NotFollowersTwFriendsVersion._meta.db_table not in query['sql'] and
+             'SAVEPOINT' not in query['sql']],
+            ['SELECT', 'UPDATE'])
+        self.assertEqual(
+            dict(NotFollowerTwFriend.objects.values_list('id_str', 'need_unfollow')),
+            {'1': True, '2': False, '3': False, '4': False})
+
+    def test_preview_rules(self):
+        response = self.client.get(reverse('get_auto_classification_rules_preview'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(rule['matched'], rule['would_keep']) for rule in response.data['rules']],
+            [(2, 1), (2, 1), (2, 2)])
+        self.assertEqual(response.data['enabled_rules'], {'matched': 3, 'would_keep': 2})
+        self.assertTrue(NotFollowerTwFriend.objects.get(id_str='2').need_unfollow)
+
+    def test_create_rule(self):
+        response = self.client.post(
+            reverse('auto_classification_rules'),
+            {'name': 'Active', 'field': 'avg_tweetsperday', 'operator': 'gt', 'value': '5'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['rule'], 'keep if avg_tweetsperday > 5.00')
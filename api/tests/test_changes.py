@@ -0,0 +1,124 @@
+"""
+Test module for the changes feed of the Twitter friends who aren't followers
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..models import NotFollowerTwFriend
+from ..unfollow_not_followers_tw_friends import unfollow_tw_friends
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+class NotFollowersTwFriendsChangesTestCase(APITestCase):
+    """
+    Test that the writes bump the versions and keep the tombstones,
+    and the feed returns only the changes since the version of the mirror
+    """
+
+    def setUp(self):
+        for i in range(1, 4):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='tw_user_%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                statuses_count=100,
+                followers_count=10,
+                friends_count=5,
+                need_unfollow=(i != 3)
+            )
+        self.url = reverse('get_not_followers_tw_friends_changes')
+
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def get_changes(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def summarize(self, data):
+        return [(change['op'], change['id_str']) for change in data['changes']]
+
+    def check(self, friends):
+        api = make_twitter_api(friends, follower_ids=[])
+        with mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                        return_value=api):
+            check_tw_friends()
+
+    def test_initial_sync(self):
+        data = self.get_changes()
+
+        self.assertEqual(self.summarize(data), [('upsert', '1'), ('upsert', '2'), ('upsert', '3')])
+        self.assertEqual(data['changes'][0]['data']['screen_name'], 'tw_user_1')
+        self.assertFalse(data['has_more'])
+        self.assertEqual(data['next'], {'since': 0, 'after': None})
+
+    def test_patch_changes(self):
+        since = self.get_changes()['version']
+        self.client.patch(
+            reverse('patch_not_followers_tw_friends_need_unfollow_update',
+                    kwargs={'screen_name': 'tw_user_2'}),
+            {'need_unfollow': False}
+        )
+
+        data = self.get_changes(since=since)
+        self.assertEqual(self.summarize(data), [('upsert', '2')])
+        self.assertFalse(data['changes'][0]['data']['need_unfollow'])
+        self.assertEqual(self.get_changes(since=data['version'])['changes'], [])
+
+    def test_check_changes(self):
+        self.check([make_tw_user(i, 'tw_user_%s' % i) for i in range(1, 4)])
+        since = self.get_changes()['version']
+        self.check([make_tw_user(1, 'tw_user_1'),
+                    make_tw_user(2, 'tw_user_2', followers_count=50),
+                    make_tw_user(4, 'tw_user_4')])
+
+        # The unchanged row isn't in the feed
+        data = self.get_changes(since=since)
+        self.assertEqual(
+            sorted(self.summarize(data)), [('delete', '3'), ('upsert', '2'), ('upsert', '4')])
+
+    def test_unfollow_changes(self):
+        since = self.get_changes()['version']
+        with mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                        return_value=make_twitter_api([], [])):
+            unfollow_tw_friends()
+
+        data = self.get_changes(since=since)
+        self.assertEqual(self.summarize(data), [('delete', '1'), ('delete', '2')])
+
+        # The re-created row has no tombstone
+        NotFollowerTwFriend.objects.create(
+            id_str='1', screen_name='tw_user_1', name='tw_user_1',
+            created_at='Mon Jan 01 00:00:00 +0000 2018')
+        self.check([make_tw_user(1, 'tw_user_1')])
+        data = self.get_changes(since=since)
+        self.assertEqual(self.summarize(data), [('delete', '2'), ('upsert', '1'), ('delete', '3')])
+
+    def test_pages(self):
+        since = self.get_changes()['version']
+        with mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                        return_value=make_twitter_api([], [])):
+            unfollow_tw_friends()
+
+        # The page ends inside the changes of the same version
+        data = self.get_changes(since=since, limit=1)
+        self.assertEqual(self.summarize(data), [('delete', '1')])
+        self.assertTrue(data['has_more'])
+
+        data = self.get_changes(limit=1, **data['next'])
+        self.assertEqual(self.summarize(data), [('delete', '2')])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(data['next']['since'], data['version'])
+
+    def test_invalid_params(self):
+        for params in ({'since': 'x'}, {'since': -1}, {'limit': 0}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,83 @@
+"""
+Test module for the memory profile of the check with the chunked flush of the crawl
+"""
+import gc
+import tracemalloc
+from unittest import mock
+
+from django.test import override_settings
+
+from rest_framework.test import APITestCase
+
+from .. import stats
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..models import NotFollowerTwFriend
+from .twitter_fakes import make_tw_user
+
+PAGE_SIZE = 100
+
+
+def make_paged_twitter_api(friends_count):
+    """
+    Return a fake twitter.Api object which creates the pages of the friends
+    on request, so the fake itself doesn't hold all of them
+    """
+
+    def get_friend_ids_paged(cursor, count):
+        page = 0 if cursor == -1 else cursor
+        first_id = page * count + 1
+        last_id = min(first_id + count, friends_count + 1)
+        next_cursor = page + 1 if last_id <= friends_count else 0
+        return next_cursor, 0, list(range(first_id, last_id))
+
+    def users_lookup(user_id):
+        return [
+            make_tw_user(friend_id, 'tw_user_%s' % friend_id, description='x' * 160)
+            for friend_id in user_id
+        ]
+
+    api = mock.Mock()
+    api.GetFollowerIDsPaged.return_value = (0, 0, [])
+    api.GetFriendIDsPaged.side_effect = get_friend_ids_paged
+    api.UsersLookup.side_effect = users_lookup
+    return api
+
+
+# The pages of the crawl aren't stopped by the rate limit budget of the single credential
+@override_settings(TWITTER_RATE_LIMITS={'GetFriendIDsPaged': 1000, 'UsersLookup': 1000})
+class CheckMemoryTestCase(APITestCase):
+    """
+    Test that the peak memory of the check doesn't grow
+    with the count of the not-followers
+    """
+
+    def measure_check_peak(self, friends_count):
+        NotFollowerTwFriend.objects.all().delete()
+        stats.recompute_stats()
+        api = make_paged_twitter_api(friends_count)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                            return_value=api), \
+                    mock.patch('api.check_not_followers_tw_friends.CRAWL_FLUSH_SIZE', 200), \
+                    mock.patch('api.check_not_followers_tw_friends.FRIEND_IDS_PAGE_SIZE',
+                               PAGE_SIZE):
+                check_tw_friends()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(NotFollowerTwFriend.objects.count(), friends_count)
+        return peak
+
+    def test_peak_memory_is_flat(self):
+        # Warm-up (the first queries and imports of the check)
+        self.measure_check_peak(200)
+        small_peak = self.measure_check_peak(1000)
+        large_peak = self.measure_check_peak(4000)
+
+        # Staging the model instances for the whole crawl costs about 600 B
+        # per not-follower, with the chunked flush the peak is bounded by the chunk and the page
+        self.assertLess((large_peak - small_peak) / (4000 - 1000), 150)
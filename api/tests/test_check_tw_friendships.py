@@ -0,0 +1,143 @@
+"""
+Test module for the targeted check of the relationships of the given users
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+import twitter
+
+from .. import changes, stats
+from ..check_not_followers_tw_friends import CrawlRecord
+from ..models import NotFollowerTwFriend, NotFollowerTwFriendTombstone, TwFollower
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+def make_friendships_api(connections, friends=()):
+    """
+    Return a fake twitter.Api object with the LookupFriendship connections
+    (user ID -> (screen_name, list of the connections)) and the hydrated 'friends'
+    """
+
+    def lookup_friendship(user_id=None, screen_name=None):
+        assert len(user_id or screen_name) <= 100
+        return [
+            twitter.UserStatus(
+                id=user_id_, screen_name=screen_name_, name=screen_name_,
+                connections=user_connections)
+            for user_id_, (screen_name_, user_connections) in sorted(connections.items())
+            if user_id_ in (user_id or ()) or screen_name_ in (screen_name or ())
+        ]
+
+    api = make_twitter_api(friends, follower_ids=[])
+    api.LookupFriendship.side_effect = lookup_friendship
+    return api
+
+
+class CheckTwFriendshipsTestCase(APITestCase):
+    """
+    Test that the targeted check updates only the NotFollowerTwFriend objects
+    of the given users by their relationships
+    """
+
+    def setUp(self):
+        for i in (1, 2, 3, 4, 7, 8):
+            CrawlRecord(make_tw_user(i, 'Tw_User_%s' % i)).to_model(
+                need_unfollow=(i != 1)).save()
+        stats.recompute_stats()
+        self.url = reverse('post_not_followers_tw_friends_check_friendships')
+
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def post(self, api, data):
+        with mock.patch('api.check_tw_friendships.get_twitter_api', return_value=api):
+            return self.client.post(self.url, data, format='json')
+
+    def test_check_friendships(self):
+        api = make_friendships_api({
+            # Still the not-follower with the new screen name and counts -- update
+            1: ('tw_user_1_new', ['following']),
+            # The follower now -- delete
+            2: ('Tw_User_2', ['following', 'followed_by']),
+            # Not followed by the account -- delete
+            3: ('Tw_User_3', []),
+            # The new not-follower -- create
+            5: ('tw_user_5', ['following']),
+            # Unchanged -- keep
+            7: ('Tw_User_7', ['following']),
+        }, friends=[
+            make_tw_user(1, 'tw_user_1_new', statuses_count=200, followers_count=20,
+                         location='Helsinki, Finland'),
+            make_tw_user(5, 'tw_user_5', followers_count=50),
+            make_tw_user(7, 'Tw_User_7'),
+        ])
+
+        # The screen names are case-insensitive
+        response = self.post(api, {
+            'screen_names': ['tw_user_1_new', 'Tw_User_2', 'tw_user_4'],
+            'ids': ['3', '5', '7'],
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['checked'], 6)
+        outcomes = ('kept', 'updated', 'created', 'deleted')
+        self.assertEqual({outcome: response.data[outcome] for outcome in outcomes},
+                         {'kept': 1, 'updated': 1, 'created': 1, 'deleted': 3})
+        # The suspended or deactivated user
+        self.assertEqual(response.data['not_found'], ['tw_user_4'])
+        self.assertEqual(response.data['not_followers'], ['1', '5', '7'])
+
+        self.assertEqual(
+            sorted(NotFollowerTwFriend.objects.values_list('id_str', 'screen_name')),
+            [('1', 'tw_user_1_new'), ('5', 'tw_user_5'), ('7', 'Tw_User_7'),
+             ('8', 'Tw_User_8')])
+        # The kept Twitter friend is updated as by the full check,
+        # the decision about it isn't changed
+        updated = NotFollowerTwFriend.objects.get(id_str='1')
+        self.assertEqual(
+            (updated.statuses_count, updated.followers_count, updated.tff_ratio,
+             updated.location), (200, 20, 4, 'Helsinki, Finland'))
+        self.assertFalse(updated.need_unfollow)
+        self.assertEqual(NotFollowerTwFriend.objects.get(id_str='5').tff_ratio, 10)
+        self.assertEqual(list(TwFollower.objects.values_list('id_str', flat=True)), ['2'])
+        self.assertEqual(stats.verify_stats(), {})
+
+        # Two LookupFriendship calls (screen names and IDs) and one UsersLookup call
+        self.assertEqual(api.LookupFriendship.call_count, 2)
+        self.assertEqual(api.UsersLookup.call_count, 1)
+
+        # The changes feed has the updated, created and deleted rows only
+        _, feed, _ = changes.get_changes(since=0)
+        self.assertEqual(sorted(id_str for _, id_str, _ in feed), ['1', '2', '3', '4', '5'])
+        self.assertEqual(
+            sorted(NotFollowerTwFriendTombstone.objects.values_list('id_str', flat=True)),
+            ['2', '3', '4'])
+
+    def test_check_kept_friendships(self):
+        api = make_friendships_api({1: ('Tw_User_1', ['following'])},
+                                   friends=[make_tw_user(1, 'Tw_User_1')])
+
+        response = self.post(api, {'need_unfollow': False})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['kept'], 1)
+        api.LookupFriendship.assert_called_once_with(user_id=[1])
+        api.UsersLookup.assert_called_once_with(user_id=[1])
+
+    def test_batches(self):
+        api = make_friendships_api({})
+
+        self.post(api, {'ids': [str(i) for i in range(100, 350)]})
+
+        self.assertEqual(api.LookupFriendship.call_count, 3)
+
+    def test_invalid_users(self):
+        for data in ({}, {'screen_names': ['invalid screen name']},
+                     {'ids': [str(i) for i in range(1501)]}):
+            response = self.post(make_friendships_api({}), data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
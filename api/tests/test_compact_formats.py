@@ -0,0 +1,78 @@
+"""
+Test module for the compact wire formats and the compression of the list responses
+"""
+import gzip
+import json
+import unittest
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..models import NotFollowerTwFriend
+from ..renderers import msgpack
+
+
+class CompactFormatsTestCase(APITestCase):
+    """
+    Test the columnar JSON, MessagePack and the compression of the list responses
+    """
+
+    def setUp(self):
+        for i in range(1, 21):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                description='The description of the Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                tff_ratio=i / 4,
+                need_unfollow=(i % 2 == 0)
+            )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def test_columnar_json(self):
+        url = reverse('get_not_followers_tw_friends')
+        rows = json.loads(self.client.get(url).content.decode('utf-8'))
+        response = self.client.get(url, HTTP_ACCEPT='application/vnd.avt.columnar+json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.avt.columnar+json')
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['count'], 20)
+        # The same values as in the rows of the default JSON format
+        self.assertEqual(
+            [dict(zip(data['fields'], values)) for values in zip(*data['columns'])], rows)
+        self.assertLess(len(response.content), len(self.client.get(url).content))
+
+    def test_columnar_json_empty_list(self):
+        NotFollowerTwFriend.objects.all().delete()
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_need_unfollow'), {'format': 'columnar'})
+
+        data = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(data['count'], 0)
+        self.assertEqual(data['columns'], [[] for _ in data['fields']])
+
+    @unittest.skipIf(msgpack is None, 'requires the "msgpack" package')
+    def test_msgpack(self):
+        url = reverse('get_not_followers_tw_friends')
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            msgpack.unpackb(response.content, raw=False),
+            json.loads(self.client.get(url).content.decode('utf-8')))
+
+    def test_gzip(self):
+        url = reverse('get_not_followers_tw_friends')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            gzip.decompress(response.content), self.client.get(url).content)
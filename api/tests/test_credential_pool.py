@@ -0,0 +1,205 @@
+"""
+Test module for the crawl dispatched across the pool of the credentials
+"""
+import threading
+import time
+from unittest import mock
+
+from django.test import override_settings
+
+from rest_framework.test import APITestCase
+
+import twitter
+
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..models import NotFollowerTwFriend
+from ..twitter_api import TwitterApiPool
+from ..twitter_stub import StubTwitterApi
+from .twitter_fakes import make_tw_user
+
+WINDOW_SECONDS = 900
+RATE_LIMITS = {'GetFollowerIDsPaged': 1, 'GetFriendIDsPaged': 2, 'UsersLookup': 4}
+PAGE_SIZE = 200
+
+
+class FakeClock(object):
+    """
+    The simulated time of the crawl, only the rate limit waits move it
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeTwitterApp(object):
+    """
+    The local fake of Twitter API for the single credential
+    which enforces its own rate limits
+    """
+
+    def __init__(self, clock, friends_count, follower_ids, rate_limits):
+        self.clock = clock
+        self.friends_count = friends_count
+        self.follower_ids = list(follower_ids)
+        self.rate_limits = rate_limits
+        self.windows = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def _spend(self, endpoint):
+        with self.lock:
+            reset_at, calls = self.windows.get(endpoint, (0, 0))
+            if reset_at <= self.clock.now:
+                reset_at, calls = self.clock.now + WINDOW_SECONDS, 0
+            if calls >= self.rate_limits[endpoint]:
+                raise twitter.TwitterError([{'code': 88, 'message': 'Rate limit exceeded'}])
+            self.windows[endpoint] = (reset_at, calls + 1)
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def GetFollowerIDsPaged(self, cursor, count):
+        self._spend('GetFollowerIDsPaged')
+        first = 0 if cursor == -1 else cursor
+        next_cursor = first + count if first + count < len(self.follower_ids) else 0
+        return next_cursor, 0, list(self.follower_ids[first:first + count])
+
+    def GetFriendIDsPaged(self, cursor, count):
+        self._spend('GetFriendIDsPaged')
+        page = 0 if cursor == -1 else cursor
+        first_id = page * count + 1
+        last_id = min(first_id + count, self.friends_count + 1)
+        next_cursor = page + 1 if last_id <= self.friends_count else 0
+        return next_cursor, 0, list(range(first_id, last_id))
+
+    def UsersLookup(self, user_id):
+        self._spend('UsersLookup')
+        assert len(user_id) <= 100
+        return [make_tw_user(friend_id, 'tw_user_%s' % friend_id) for friend_id in user_id]
+
+
+@override_settings(TWITTER_RATE_LIMITS=RATE_LIMITS, TWITTER_RATE_LIMIT_WAIT=WINDOW_SECONDS)
+class CredentialPoolTestCase(APITestCase):
+    """
+    Test that the crawl splits the ID pages and the UsersLookup batches
+    across the credentials, so its duration shrinks with the size of the pool
+    """
+
+    def crawl(self, pool_size, friends_count=2000, follower_ids=(), app_rate_limits=None):
+        NotFollowerTwFriend.objects.all().delete()
+        clock = FakeClock()
+        apps = {
+            'app_%s' % i: FakeTwitterApp(
+                clock, friends_count, follower_ids, (app_rate_limits or {}).get(i, RATE_LIMITS))
+            for i in range(pool_size)
+        }
+        credentials = [{'consumer_key': key} for key in sorted(apps)]
+
+        with override_settings(TWITTER_CREDENTIALS=credentials), \
+                mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                           side_effect=lambda credential: apps[credential['consumer_key']]), \
+                mock.patch('api.check_not_followers_tw_friends.FRIEND_IDS_PAGE_SIZE', PAGE_SIZE), \
+                mock.patch('api.check_not_followers_tw_friends.FOLLOWER_IDS_PAGE_SIZE', PAGE_SIZE), \
+                mock.patch('api.twitter_api.time', clock):
+            check_tw_friends()
+
+        self.assertEqual(NotFollowerTwFriend.objects.count(), friends_count - len(follower_ids))
+        return clock.now, [apps[key].calls for key in sorted(apps)]
+
+    def test_throughput_scales_with_pool_size(self):
+        durations = {}
+        for pool_size in (1, 2, 4):
+            durations[pool_size], calls = self.crawl(pool_size)
+
+            # The calls are spread evenly across the credentials
+            for endpoint in ('GetFriendIDsPaged', 'UsersLookup'):
+                counts = [app_calls.get(endpoint, 0) for app_calls in calls]
+                self.assertLessEqual(max(counts) - min(counts), 1)
+
+        # 10 ID pages and 20 UsersLookup batches
+        self.assertEqual(durations[1], 4 * WINDOW_SECONDS)
+        self.assertLessEqual(durations[2], durations[1] / 2)
+        self.assertLessEqual(durations[4], durations[1] / 4)
+
+    def test_hydrates_only_not_followers(self):
+        _, calls = self.crawl(2, friends_count=400, follower_ids=range(1, 251))
+
+        self.assertEqual(sum(app_calls.get('UsersLookup', 0) for app_calls in calls), 2)
+
+    def test_rate_limit_error_moves_to_other_credential(self):
+        # The first credential is exhausted by the other clients of its app
+        duration, calls = self.crawl(
+            3, friends_count=800, app_rate_limits={0: dict(RATE_LIMITS, UsersLookup=1)})
+
+        # 8 batches are served without the wait for the window reset
+        self.assertEqual(duration, 0)
+        self.assertEqual(calls[0]['UsersLookup'], 1)
+        self.assertEqual(calls[1]['UsersLookup'] + calls[2]['UsersLookup'], 7)
+
+    def test_follower_ids_paged(self):
+        # 3 pages of the follower IDs with the single call per window
+        duration, calls = self.crawl(1, friends_count=600, follower_ids=range(1, 501))
+
+        # The pages fetched before the window reset aren't fetched again
+        self.assertEqual(calls[0]['GetFollowerIDsPaged'], 3)
+        # 2 waits between the follower ID pages and 1 before the third friend ID page
+        self.assertEqual(duration, 3 * WINDOW_SECONDS)
+
+
+class TwitterApiPoolTestCase(APITestCase):
+    """
+    Test the calls of the pool of the credentials
+    """
+
+    def test_lookup_users_no_user_matches(self):
+        def users_lookup(user_id):
+            tw_users = [
+                make_tw_user(friend_id, 'tw_user_%s' % friend_id)
+                for friend_id in user_id if friend_id <= 150
+            ]
+            if not tw_users:
+                raise twitter.TwitterError(
+                    [{'code': 17, 'message': 'No user matches for specified terms.'}])
+            return tw_users
+
+        api = mock.Mock()
+        api.UsersLookup.side_effect = users_lookup
+
+        # The third batch has the suspended and deleted users only
+        tw_users = TwitterApiPool([api, api]).lookup_users(list(range(1, 301)))
+
+        self.assertEqual([tw_user.id for tw_user in tw_users], list(range(1, 151)))
+
+    @override_settings(TWITTER_RATE_LIMITS={'GetFriendIDsPaged': 1}, TWITTER_RATE_LIMIT_WAIT=0.5)
+    def test_rate_limit_wait_doesnt_block_other_endpoints(self):
+        api = mock.Mock()
+        api_pool = TwitterApiPool([api])
+        api_pool.call('GetFriendIDsPaged')
+
+        # The second call waits for the window reset
+        waiting_thread = threading.Thread(target=api_pool.call, args=('GetFriendIDsPaged',))
+        waiting_thread.start()
+        time.sleep(0.1)
+
+        started = time.monotonic()
+        api_pool.call('UsersLookup')
+
+        self.assertLess(time.monotonic() - started, 0.2)
+        self.assertEqual(api.GetFriendIDsPaged.call_count, 1)
+        waiting_thread.join()
+        self.assertEqual(api.GetFriendIDsPaged.call_count, 2)
+
+    @override_settings(TWITTER_API_CLASS='twitter.Api', TWITTER_RATE_LIMITS={'GetFriendIDsPaged': 1},
+                       TWITTER_STUB_FRIENDS_COUNT=10)
+    def test_stub_not_rate_limited(self):
+        api_pool = TwitterApiPool([StubTwitterApi()])
+
+        started = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(api_pool.call('GetFriendIDsPaged')[2], list(range(1, 11)))
+
+        self.assertLess(time.monotonic() - started, 0.2)
@@ -0,0 +1,190 @@
+"""
+Test module for the read replica database router
+"""
+from unittest import mock
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from rest_framework.test import APITestCase
+
+from .. import db_routers
+from ..models import NotFollowerTwFriend
+from ..runs import _execute_run_in_thread
+
+# Two local SQLite databases: the primary and its replica
+PRIMARY_REPLICA_DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'primary.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'replica.sqlite3'},
+}
+
+# The replica of the test database (its test mirror, the same as the commented
+# 'replica' of settings.py)
+REPLICA_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': 'replica.sqlite3',
+    'TEST': {'MIRROR': 'default'},
+}
+
+
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    """
+    Test class for the routing of the reads and the writes
+    """
+
+    def setUp(self):
+        self.router = db_routers.PrimaryReplicaRouter()
+        db_routers.unpin()
+        self.addCleanup(db_routers.unpin)
+
+    def test_without_replica(self):
+        self.assertIsNone(self.router.db_for_read(NotFollowerTwFriend))
+        self.assertEqual(self.router.db_for_write(NotFollowerTwFriend), 'default')
+
+    @override_settings(DATABASES=PRIMARY_REPLICA_DATABASES)
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(NotFollowerTwFriend), 'replica')
+        self.assertTrue(self.router.allow_migrate('default', 'api'))
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+
+    @override_settings(DATABASES=PRIMARY_REPLICA_DATABASES)
+    def test_read_your_writes(self):
+        self.assertEqual(self.router.db_for_write(NotFollowerTwFriend), 'default')
+        self.assertEqual(self.router.db_for_read(NotFollowerTwFriend), 'default')
+
+        db_routers.unpin()
+
+        self.assertEqual(self.router.db_for_read(NotFollowerTwFriend), 'replica')
+
+    @override_settings(DATABASES=PRIMARY_REPLICA_DATABASES)
+    def test_run_thread_unpinned(self):
+        read_aliases = []
+
+        def execute_run(run):
+            read_aliases.append(self.router.db_for_read(NotFollowerTwFriend))
+            self.router.db_for_write(NotFollowerTwFriend)
+
+        # The write of the previous unit of work of the thread
+        self.router.db_for_write(NotFollowerTwFriend)
+        with mock.patch('api.runs.execute_run', side_effect=execute_run):
+            _execute_run_in_thread(mock.Mock())
+
+        self.assertEqual(read_aliases, ['replica'])
+        self.assertFalse(db_routers.has_written())
+
+
+class PrimaryDBPinningMiddlewareTestCase(APITestCase):
+    """
+    Test the pinning of the client to the primary after the write request
+    """
+
+    def setUp(self):
+        NotFollowerTwFriend.objects.create(
+            id_str='1',
+            screen_name='tw_user_1',
+            name='Twitter User #1',
+            created_at='Mon Jan 01 00:00:00 +0000 2018'
+        )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def test_pin_after_write(self):
+        response = self.client.get(reverse('get_not_followers_tw_friends'))
+
+        self.assertNotIn(db_routers.PIN_PRIMARY_COOKIE, response.cookies)
+
+        url = reverse(
+            'patch_not_followers_tw_friends_need_unfollow_update',
+            kwargs={'screen_name': 'tw_user_1'}
+        )
+        response = self.client.patch(url, {'need_unfollow': False})
+
+        self.assertIn(db_routers.PIN_PRIMARY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[db_routers.PIN_PRIMARY_COOKIE]['max-age'], 5)
+
+
+class PrimaryReplicaDatabasesTestCase(TransactionTestCase):
+    """
+    Test the routing of the requests with the 'replica' database configured
+    as the test mirror of 'default' (the writes of TransactionTestCase are committed,
+    so the separate connection of the replica reads them)
+    """
+
+    databases = {'default', 'replica'}
+    if django.VERSION < (2, 2):
+        multi_db = True
+
+    @classmethod
+    def setUpClass(cls):
+        # Configure the 'replica' alias as the test runner configures the test mirrors
+        connections.databases['replica'] = dict(REPLICA_DATABASE)
+        connections['replica'].creation.set_as_test_mirror(connections['default'].settings_dict)
+        cls.databases_override = override_settings(
+            DATABASES=dict(settings.DATABASES, replica=REPLICA_DATABASE))
+        cls.databases_override.enable()
+        super(PrimaryReplicaDatabasesTestCase, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(PrimaryReplicaDatabasesTestCase, cls).tearDownClass()
+        cls.databases_override.disable()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def setUp(self):
+        NotFollowerTwFriend.objects.create(
+            id_str='1',
+            screen_name='tw_user_1',
+            name='Twitter User #1',
+            created_at='Mon Jan 01 00:00:00 +0000 2018'
+        )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def get_list(self):
+        """
+        Request the list and return the queries of the list table on each database.
+        """
+
+        table = NotFollowerTwFriend._meta.db_table
+        with CaptureQueriesContext(connections['default']) as default_queries, \
+                CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(reverse('get_not_followers_tw_friends'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tw_friend['screen_name'] for tw_friend in response.data], ['tw_user_1'])
+        return (
+            [query for query in default_queries if table in query['sql']],
+            [query for query in replica_queries if table in query['sql']],
+        )
+
+    def test_list_reads_from_replica(self):
+        default_queries, replica_queries = self.get_list()
+
+        self.assertEqual(default_queries, [])
+        self.assertTrue(replica_queries)
+
+    def test_read_after_patch_pinned_to_primary(self):
+        url = reverse(
+            'patch_not_followers_tw_friends_need_unfollow_update',
+            kwargs={'screen_name': 'tw_user_1'}
+        )
+        response = self.client.patch(url, {'need_unfollow': False})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(db_routers.PIN_PRIMARY_COOKIE, response.cookies)
+
+        # The client sends the cookie with the follow-up read
+        default_queries, replica_queries = self.get_list()
+
+        self.assertTrue(default_queries)
+        self.assertEqual(replica_queries, [])
@@ -0,0 +1,136 @@
+"""
+Test module for the bulk export
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .. import export
+from ..models import NotFollowerTwFriend
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class NotFollowersTwFriendsExportTestCase(APITestCase):
+    """
+    Test the API and the command which export all the NotFollowerTwFriend objects
+    """
+
+    def setUp(self):
+        for i in range(1, 6):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                description='Line 1,\nline "2"',
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                tff_ratio='1.50',
+                need_unfollow=(i % 2 == 0)
+            )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def test_export_csv(self):
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_export', kwargs={'export_format': 'csv'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['description'], 'Line 1,\nline "2"')
+        self.assertEqual(rows[0]['tff_ratio'], '1.50')
+        self.assertEqual(rows[0]['need_unfollow'], 'false')
+        self.assertEqual(rows[1]['need_unfollow'], 'true')
+
+    def test_export_ndjson(self):
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_export', kwargs={'export_format': 'ndjson'}))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[1])['screen_name'], 'tw_user_2')
+        self.assertEqual(json.loads(lines[1])['tff_ratio'], '1.50')
+        self.assertEqual(json.loads(lines[1])['need_unfollow'], True)
+
+    @unittest.skipIf(pyarrow is None, 'Parquet export requires the "pyarrow" package')
+    def test_export_parquet(self):
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_export', kwargs={'export_format': 'parquet'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], export.CONTENT_TYPES['parquet'])
+
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        rows = table.to_pylist()
+
+        self.assertEqual(table.column_names, export.EXPORT_FIELDS)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1]['screen_name'], 'tw_user_2')
+        self.assertEqual(rows[1]['tff_ratio'], Decimal('1.50'))
+        self.assertEqual(rows[1]['need_unfollow'], True)
+        self.assertEqual(rows[1]['version'], 0)
+
+    def test_export_parquet_unavailable(self):
+        with mock.patch('api.export.is_parquet_available', return_value=False):
+            response = self.client.get(reverse(
+                'get_not_followers_tw_friends_export', kwargs={'export_format': 'parquet'}))
+
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertIn('pyarrow', response.data['detail'])
+
+    def test_copy_stopped_by_closed_export(self):
+        copy_finished = threading.Event()
+
+        def copy_csv_to(file):
+            try:
+                for i in range(1000):
+                    file.write('row %s\n' % i)
+            finally:
+                copy_finished.set()
+
+        with mock.patch('api.export.copy_csv_to', side_effect=copy_csv_to), \
+                mock.patch('api.export.COPY_QUEUE_PUT_TIMEOUT', 0.05):
+            chunks = export.iter_copy_csv()
+            self.assertEqual(next(chunks), 'row 0\n')
+            # The client has disconnected
+            chunks.close()
+
+            self.assertTrue(copy_finished.wait(5))
+
+    def test_export_batches(self):
+        export_batch_size = export.EXPORT_BATCH_SIZE
+        export.EXPORT_BATCH_SIZE = 2
+        try:
+            chunks = list(export.iter_ndjson(export.iter_export_rows()))
+        finally:
+            export.EXPORT_BATCH_SIZE = export_batch_size
+
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 2, 1])
+
+    def test_export_command(self):
+        output = os.path.join(tempfile.mkdtemp(), 'not_followers.ndjson')
+
+        call_command('export_not_followers', export_format='ndjson', output=output)
+
+        with open(output) as output_file:
+            self.assertEqual(len(output_file.readlines()), 5)
@@ -0,0 +1,107 @@
+"""
+Test module for the bulk import of the keep/unfollow decisions
+"""
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..models import NotFollowerTwFriend, NeedUnfollowDecisionStaging
+
+
+class NotFollowersTwFriendsNeedUnfollowImportTestCase(APITestCase):
+    """
+    Test the API which import the keep/unfollow decisions from the file
+    """
+
+    def setUp(self):
+        for i in range(1, 5):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018'
+            )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def post_file(self, name, content):
+        return self.client.post(
+            reverse('post_not_followers_tw_friends_need_unfollow_import'),
+            {'file': SimpleUploadedFile(name, content)},
+            format='multipart'
+        )
+
+    def test_import_csv(self):
+        response = self.post_file('keep_list.csv', (
+            b'id_str,screen_name,decision\n'
+            b'1,,keep\n'
+            b',tw_user_2,keep\n'
+            b'3,,keep\n'
+            b'3,,unfollow\n'
+            b'99,tw_user_99,keep\n'
+            b',,keep\n'
+        ))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['decisions'], 5)
+        # The last decision of 'tw_user_3' doesn't change it
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(response.data['unmatched_count'], 1)
+        self.assertEqual(response.data['unmatched'][0]['screen_name'], 'tw_user_99')
+        self.assertEqual(response.data['errors'][0]['line'], 7)
+        self.assertEqual(
+            dict(NotFollowerTwFriend.objects.values_list('id_str', 'need_unfollow')),
+            {'1': False, '2': False, '3': True, '4': True})
+        self.assertFalse(NeedUnfollowDecisionStaging.objects.exists())
+
+    def test_import_ndjson(self):
+        response = self.post_file('keep_list.ndjson', (
+            b'{"screen_name": "@tw_user_4", "need_unfollow": false}\n'
+            b'not a json\n'
+        ))
+
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors_count'], 1)
+        self.assertFalse(NotFollowerTwFriend.objects.get(id_str='4').need_unfollow)
+
+    def test_import_screen_name_case_insensitive(self):
+        versions = dict(NotFollowerTwFriend.objects.values_list('id_str', 'version'))
+
+        response = self.post_file('keep_list.csv', (
+            b'screen_name,decision\n'
+            b'TW_User_1,keep\n'
+            b'Tw_user_2,unfollow\n'
+            b'TW_USER_99,keep\n'
+        ))
+
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['unmatched_count'], 1)
+        self.assertEqual(response.data['unmatched'][0]['screen_name'], 'TW_USER_99')
+        self.assertFalse(NotFollowerTwFriend.objects.get(id_str='1').need_unfollow)
+        # The unchanged object keeps its version
+        self.assertEqual(NotFollowerTwFriend.objects.get(id_str='2').version, versions['2'])
+        self.assertGreater(NotFollowerTwFriend.objects.get(id_str='1').version, versions['1'])
+
+    def test_import_too_long_values(self):
+        response = self.post_file('keep_list.csv', (
+            b'id_str,screen_name,decision\n'
+            b',' + b'x' * 21 + b',keep\n'
+            + b'1' * 26 + b',,keep\n'
+            b'1,,keep\n'
+        ))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors_count'], 2)
+        self.assertEqual(
+            [(error['line'], error['detail']) for error in response.data['errors']],
+            [(2, '"screen_name" must be at most 20 characters'),
+             (3, '"id_str" must be at most 25 characters')])
+
+    def test_import_unknown_format(self):
+        response = self.post_file('keep_list.txt', b'')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,87 @@
+"""
+Test module for the load test harness with the Twitter API stub
+"""
+from django.contrib.auth.models import User
+from django.test import LiveServerTestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .. import stats
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..loadtest import LoadRunner, parse_mix, seed_not_followers_tw_friends
+from ..models import NotFollowerTwFriend
+
+STUB_SETTINGS = {
+    'TWITTER_API_CLASS': 'api.twitter_stub.StubTwitterApi',
+    'TWITTER_STUB_FRIENDS_COUNT': 2000,
+    # The unfollows of the load aren't limited by the budgets
+    'UNFOLLOW_DAILY_BUDGET': 10000,
+    'UNFOLLOW_WINDOW_BUDGET': 10000,
+}
+
+
+@override_settings(**STUB_SETTINGS)
+class SeedTestCase(APITestCase):
+    """
+    Test that the seeded rows match the check with the Twitter API stub
+    """
+
+    def test_seed_matches_stub(self):
+        self.assertEqual(seed_not_followers_tw_friends(1000), 2000)
+        self.assertEqual(NotFollowerTwFriend.objects.count(), 1000)
+        self.assertEqual(stats.verify_stats(), {})
+        kept_count = NotFollowerTwFriend.objects.filter(need_unfollow=False).count()
+
+        check_tw_friends()
+
+        self.assertEqual(NotFollowerTwFriend.objects.count(), 1000)
+        self.assertEqual(
+            NotFollowerTwFriend.objects.filter(need_unfollow=False).count(), kept_count)
+        # The check with the stub doesn't change the seeded rows
+        self.assertFalse(NotFollowerTwFriend.objects.filter(version__gt=0).exists())
+
+    def test_invalid_rows(self):
+        with self.assertRaises(ValueError):
+            seed_not_followers_tw_friends(10)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('list=80,patch=20'), {'list': 80, 'patch': 20})
+        for mix in ('search=1', 'list=-1', 'list=0'):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+
+@override_settings(API_CHECK_MIN_INTERVAL=0, **STUB_SETTINGS)
+class LoadRunnerTestCase(LiveServerTestCase):
+    """
+    Test the mix of the requests against the live server with the Twitter API stub
+    """
+
+    def test_run(self):
+        seed_not_followers_tw_friends(1000)
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        token = Token.objects.create(user=user)
+
+        runner = LoadRunner(
+            self.live_server_url, 'Token %s' % token.key,
+            parse_mix('list=5,patch=5,check=1,unfollow=1'), concurrency=1, requests=30,
+            screen_names=['stub_1', 'stub_3'], list_query='fields=id_str', seed=1)
+        summary = runner.run().summary()
+
+        self.assertEqual(summary['total']['requests'], 30)
+        self.assertEqual(summary['total']['errors'], 0)
+        self.assertEqual(set(summary) - {'total'}, {'list', 'patch', 'check', 'unfollow'})
+        for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate'):
+            self.assertIn(key, summary['list'])
+
+        # The unfollowed friends aren't found by the check with the stub
+        self.assertFalse(NotFollowerTwFriend.objects.filter(need_unfollow=True).exists())
+
+    def test_errors(self):
+        runner = LoadRunner(
+            self.live_server_url, 'Token invalid', parse_mix('list=1'), requests=3)
+        summary = runner.run().summary()
+
+        self.assertEqual(summary['list']['errors'], 3)
+        self.assertEqual(summary['list']['error_rate'], 1.0)
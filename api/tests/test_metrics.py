@@ -0,0 +1,87 @@
+"""
+Test module for the instrumentation metrics
+"""
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .. import metrics
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..models import NotFollowerTwFriend, TwFriendsRun
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+class MetricsTestCase(TestCase):
+    """
+    Test class for the counters, timing spans and the per-run summary
+    """
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_render_prometheus(self):
+        metrics.inc('twitter_api_calls_total', endpoint='GetFriendsPaged')
+        metrics.inc('twitter_api_calls_total', endpoint='GetFriendsPaged')
+        metrics.observe('twitter_api_call_seconds', 0.5, endpoint='GetFriendsPaged')
+
+        text = metrics.render_prometheus()
+
+        self.assertIn('# TYPE avt_twitter_api_calls_total counter', text)
+        self.assertIn('avt_twitter_api_calls_total{endpoint="GetFriendsPaged"} 2', text)
+        self.assertIn('avt_twitter_api_call_seconds_count{endpoint="GetFriendsPaged"} 1', text)
+        self.assertIn(
+            'avt_twitter_api_call_seconds_sum{endpoint="GetFriendsPaged"} 0.500000', text)
+
+    @override_settings(API_METRICS_ENABLED=False)
+    def test_disabled_metrics(self):
+        metrics.inc('twitter_api_calls_total', endpoint='GetFriendsPaged')
+        with metrics.timer('check_span_seconds', span='db_sync'):
+            pass
+
+        self.assertEqual(metrics.render_prometheus(), '\n')
+
+    def test_check_run_summary(self):
+        api = make_twitter_api(
+            [make_tw_user(1, 'tw_user_1'), make_tw_user(2, 'tw_user_2')], [2])
+
+        with mock.patch(
+                'api.check_not_followers_tw_friends.get_twitter_api', return_value=api):
+            check_tw_friends()
+
+        self.assertEqual(NotFollowerTwFriend.objects.get().screen_name, 'tw_user_1')
+
+        run = TwFriendsRun.objects.get()
+        summary = json.loads(run.summary)
+        self.assertEqual(run.kind, TwFriendsRun.KIND_CHECK)
+        self.assertEqual(run.status, TwFriendsRun.STATUS_SUCCEEDED)
+        self.assertEqual(summary['twitter_api_calls_total{endpoint=GetFriendIDsPaged}'], 1)
+        self.assertEqual(summary['twitter_api_calls_total{endpoint=UsersLookup}'], 1)
+        self.assertEqual(summary['check_pages_fetched_total'], 1)
+        self.assertEqual(summary['check_friends_analyzed_total'], 2)
+        self.assertEqual(summary['check_rows_created_total'], 1)
+
+
+class MetricsViewTestCase(APITestCase):
+    """
+    Test the API which return the metrics in the Prometheus text format
+    """
+
+    def setUp(self):
+        metrics.reset()
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def test_get_metrics(self):
+        metrics.inc('check_pages_fetched_total')
+
+        response = self.client.get(reverse('get_metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'avt_check_pages_fetched_total 1', response.content)
@@ -1,6 +1,10 @@
 """
 Test module for NotFollowerTwFriend model
 """
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
 from django.test import TestCase
 from ..models import NotFollowerTwFriend
 
@@ -33,3 +37,53 @@ class NotFollowerTwFriendTestCase(TestCase):
         self.assertEqual(NotFollowerTwFriend.objects.get().avg_tweetsperday, 0.00)
         self.assertEqual(NotFollowerTwFriend.objects.get().tff_ratio, 0.00)
         self.assertEqual(NotFollowerTwFriend.objects.get().need_unfollow, True)
+
+
+class AvgTweetsPerDayTestCase(TestCase):
+    """
+    Test that 'avg_tweetsperday' is counted in SQL from the current date
+    """
+
+    def setUp(self):
+        today = date.today().toordinal()
+        for i, (statuses_count, lifetime_days) in enumerate([(100, 10), (100, 400), (7, 0)], 1):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                created_at_day=today - lifetime_days,
+                statuses_count=statuses_count
+            )
+
+    def test_avg_tweetsperday(self):
+        rows = NotFollowerTwFriend.objects.with_avg_tweetsperday().order_by('-avg_tweetsperday')
+
+        self.assertEqual([row.id_str for row in rows], ['1', '3', '2'])
+        # The account created today has the lifetime of 1 day
+        self.assertEqual([row.avg_tweetsperday for row in rows],
+                         [Decimal('10'), Decimal('7'), Decimal('0.25')])
+        self.assertEqual(
+            list(NotFollowerTwFriend.objects.with_avg_tweetsperday().filter(
+                avg_tweetsperday__lt=1).values_list('id_str', flat=True)), ['2'])
+
+    def test_avg_tweetsperday_not_annotated_by_default(self):
+        self.assertNotIn('avg_tweetsperday', NotFollowerTwFriend.objects.all().query.annotations)
+        # The value is counted in Python for the row read without the annotation
+        self.assertEqual(NotFollowerTwFriend.objects.get(id_str='1').avg_tweetsperday,
+                         Decimal('10'))
+
+    def test_avg_tweetsperday_of_new_object(self):
+        for row in NotFollowerTwFriend.objects.with_avg_tweetsperday():
+            new_row = NotFollowerTwFriend(
+                statuses_count=row.statuses_count, created_at_day=row.created_at_day)
+            self.assertEqual(new_row.avg_tweetsperday, row.avg_tweetsperday)
+
+    def test_avg_tweetsperday_is_current(self):
+        tomorrow = date.today() + timedelta(days=1)
+        with mock.patch('api.models.date') as date_mock:
+            date_mock.today.return_value = tomorrow
+
+            self.assertEqual(
+                NotFollowerTwFriend.objects.with_avg_tweetsperday().get(
+                    id_str='1').avg_tweetsperday, Decimal('9.09'))
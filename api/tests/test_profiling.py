@@ -0,0 +1,116 @@
+"""
+Test module for the on-demand profiling of the API requests
+"""
+import marshal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..models import RequestProfile
+from ..profiling import PROFILE_ID_HEADER
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+@override_settings(API_CHECK_MIN_INTERVAL=0)
+class ProfilingTestCase(APITestCase):
+    """
+    Test that the request of the staff user with the profiling flag is profiled
+    and the profile is retrieved from the profiles API
+    """
+
+    def setUp(self):
+        staff_user = User.objects.create_user(
+            username='staff_user', password='top_secret', is_staff=True)
+        self.staff_token = Token.objects.create(user=staff_user).key
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.token = Token.objects.create(user=user).key
+
+        api = make_twitter_api(
+            [make_tw_user(1, 'tw_user_1'), make_tw_user(2, 'tw_user_2')], [2])
+        patcher = mock.patch(
+            'api.check_not_followers_tw_friends.get_twitter_api', return_value=api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url, token, **extra):
+        return self.client.get(url, HTTP_AUTHORIZATION='Token %s' % token, **extra)
+
+    def test_profile_check(self):
+        response = self.get(
+            reverse('get_not_followers_tw_friends_check'), self.staff_token, HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response[PROFILE_ID_HEADER], str(profile.pk))
+        self.assertEqual(profile.user.username, 'staff_user')
+        self.assertEqual(profile.status_code, 200)
+
+        response = self.get(
+            reverse('get_request_profile', kwargs={'pk': profile.pk}), self.staff_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = response.data['summary']
+        self.assertTrue(any(
+            'check_tw_friends' in function['function'] for function in summary['functions']))
+        self.assertGreater(summary['sql']['count'], 0)
+        self.assertEqual(len(summary['sql']['slowest']), 10)
+        # GetFollowerIDsPaged, GetFriendIDsPaged and UsersLookup
+        self.assertEqual(summary['twitter']['calls'], 3)
+        self.assertIn('run_seconds{kind=check}', summary['metrics'])
+
+        response = self.get(
+            reverse('get_request_profile_stats', kwargs={'pk': profile.pk}), self.staff_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = marshal.loads(response.content)
+        self.assertTrue(any(function[2] == 'check_tw_friends' for function in stats))
+
+    def test_profile_query_param(self):
+        response = self.get(
+            reverse('get_not_followers_tw_friends') + '?profile=1', self.staff_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(PROFILE_ID_HEADER, response)
+        self.assertEqual(
+            RequestProfile.objects.get().path, '/api/v1/not_followers_tw_friends/?profile=1')
+
+    def test_not_profiled(self):
+        # Without the flag or by the user who isn't staff
+        for token, extra in ((self.staff_token, {}), (self.token, {'HTTP_X_PROFILE': '1'})):
+            response = self.get(reverse('get_not_followers_tw_friends'), token, **extra)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn(PROFILE_ID_HEADER, response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+        response = self.get(reverse('get_request_profiles'), self.token)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(API_PROFILES_KEEP=2)
+    def test_keep_last_profiles(self):
+        for _ in range(3):
+            self.get(reverse('get_not_followers_tw_friends'), self.staff_token, HTTP_X_PROFILE='1')
+
+        response = self.get(reverse('get_request_profiles') + '?fields=id', self.staff_token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [profile['id'] for profile in response.data],
+            list(RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)))
+        self.assertEqual(len(response.data), 2)
+
+    @override_settings(API_PROFILES_KEEP=0)
+    def test_profiles_not_kept(self):
+        response = self.get(
+            reverse('get_not_followers_tw_friends'), self.staff_token, HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+        self.assertFalse(RequestProfile.objects.exists())
@@ -0,0 +1,368 @@
+"""
+Test module for the check runs streamed as server-sent events
+"""
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from twitter import TwitterError
+
+from ..models import NotFollowerTwFriend, TwFriendsRun
+from ..runs import EVENT_ERROR, RunEventRecorder, RunFailedError, execute_run, get_run_error, \
+    run_single_flight
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+def parse_sse(content):
+    """
+    Parse the server-sent events stream as list of (id, event, data) tuples
+    """
+
+    parsed_events = []
+    for block in content.decode().split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.split('\n')
+            if line.startswith(('id', 'event', 'data'))
+        )
+        if 'event' in fields:
+            parsed_events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return parsed_events
+
+
+@override_settings(API_RUNS_IN_BACKGROUND=False, API_RUN_EVENTS_POLL_INTERVAL=0)
+class NotFollowersTwFriendsCheckStreamTestCase(APITestCase):
+    """
+    Test the API which stream the found not-followers and the progress of the check
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+        api = make_twitter_api(
+            [make_tw_user(1, 'tw_user_1'), make_tw_user(2, 'tw_user_2'),
+             make_tw_user(3, 'tw_user_3')], [2])
+        patcher = mock.patch(
+            'api.check_not_followers_tw_friends.get_twitter_api', return_value=api)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stream_check_events(self):
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_check_stream'),
+            HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        parsed_events = parse_sse(b''.join(response.streaming_content))
+        run = TwFriendsRun.objects.get()
+
+        self.assertEqual(
+            [event for _, event, _ in parsed_events],
+            ['not_follower', 'not_follower', 'progress', 'done'])
+        self.assertEqual(parsed_events[0][0], '%s:1' % run.pk)
+        self.assertEqual(parsed_events[0][2]['screen_name'], 'tw_user_1')
+        self.assertEqual(parsed_events[2][2]['not_followers'], 2)
+        self.assertEqual(run.status, TwFriendsRun.STATUS_SUCCEEDED)
+
+    def test_reconnect_from_last_event_id(self):
+        response = self.client.get(reverse('get_not_followers_tw_friends_check_stream'))
+        b''.join(response.streaming_content)
+        run = TwFriendsRun.objects.get()
+
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends_check_stream'),
+            HTTP_LAST_EVENT_ID='%s:2' % run.pk)
+        parsed_events = parse_sse(b''.join(response.streaming_content))
+
+        # No new check run is started, only the events after the last event ID are sent
+        self.assertEqual(TwFriendsRun.objects.count(), 1)
+        self.assertEqual(
+            [event_id for event_id, _, _ in parsed_events],
+            ['%s:3' % run.pk, '%s:4' % run.pk])
+
+
+@override_settings(API_RUNS_IN_BACKGROUND=False, TWITTER_UNFOLLOW_CONCURRENCY=4)
+class TwFriendsRunStartTestCase(APITestCase):
+    """
+    Test the API which start the check and unfollow runs in the background
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+        for i in range(1, 11):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                need_unfollow=(i != 10)
+            )
+
+    def test_start_unfollow_run(self):
+        api = mock.Mock()
+        with mock.patch(
+                'api.unfollow_not_followers_tw_friends.get_twitter_api', return_value=api):
+            response = self.client.post(reverse('post_not_followers_tw_friends_unfollow_start'))
+
+        run = TwFriendsRun.objects.get()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['id'], run.pk)
+        self.assertEqual(
+            response['Location'], reverse('get_tw_friends_run', kwargs={'pk': run.pk}))
+        self.assertEqual(api.DestroyFriendship.call_count, 9)
+        self.assertEqual(list(NotFollowerTwFriend.objects.values_list('id_str', flat=True)), ['10'])
+
+        response = self.client.get(response['Location'])
+
+        self.assertEqual(response.data['status'], TwFriendsRun.STATUS_SUCCEEDED)
+        self.assertEqual(
+            response.data['summary']['twitter_api_calls_total{endpoint=DestroyFriendship}'], 9)
+
+    def test_unfollow_keeps_failed_friends(self):
+        def destroy_friendship(user_id):
+            if user_id == 3:
+                raise TwitterError([{'code': 131, 'message': 'Internal error'}])
+
+        api = mock.Mock()
+        api.DestroyFriendship.side_effect = destroy_friendship
+        with mock.patch(
+                'api.unfollow_not_followers_tw_friends.get_twitter_api', return_value=api):
+            self.client.post(reverse('post_not_followers_tw_friends_unfollow_start'))
+
+        self.assertEqual(TwFriendsRun.objects.get().status, TwFriendsRun.STATUS_FAILED)
+        self.assertEqual(
+            sorted(NotFollowerTwFriend.objects.values_list('id_str', flat=True)), ['10', '3'])
+
+
+@override_settings(API_RUNS_IN_BACKGROUND=False, API_RUN_EVENTS_POLL_INTERVAL=0,
+                   API_CHECK_MIN_INTERVAL=60)
+class SingleFlightRunsTestCase(APITestCase):
+    """
+    Test that the concurrent check and unfollow requests attach to the run in progress
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+        patcher = mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                             return_value=make_twitter_api([make_tw_user(1, 'tw_user_1')], []))
+        self.get_twitter_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_attach_to_run_in_progress(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+
+        response = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+
+        self.assertEqual(response.data['id'], running.pk)
+        self.assertEqual(TwFriendsRun.objects.count(), 1)
+        self.assertFalse(self.get_twitter_api.called)
+
+    def test_ignore_stale_run(self):
+        stale = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+        TwFriendsRun.objects.filter(pk=stale.pk).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        response = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+
+        self.assertNotEqual(response.data['id'], stale.pk)
+        self.assertEqual(response.data['status'], TwFriendsRun.STATUS_SUCCEEDED)
+        # The run left by the dead process is failed with the 'error' event
+        self.assertEqual(TwFriendsRun.objects.get(pk=stale.pk).status,
+                         TwFriendsRun.STATUS_FAILED)
+        self.assertIn('heartbeat', get_run_error(stale))
+
+    def test_attach_to_long_run_with_heartbeat(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+        TwFriendsRun.objects.filter(pk=running.pk).update(
+            started_at=timezone.now() - timedelta(days=1))
+
+        response = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+
+        self.assertEqual(response.data['id'], running.pk)
+        self.assertFalse(self.get_twitter_api.called)
+
+    def test_check_stops_waiting_for_stale_run(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+
+        def stop_heartbeat(seconds):
+            TwFriendsRun.objects.filter(pk=running.pk).update(
+                heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        with mock.patch('api.runs.time.sleep', side_effect=stop_heartbeat):
+            response = self.client.get(reverse('get_not_followers_tw_friends_check'))
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.data['detail'], 'The check run #%s has failed.' % running.pk)
+        self.assertIn('heartbeat', response.data['error'])
+
+    def test_min_interval_returns_last_check(self):
+        first = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+        second = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(self.get_twitter_api.call_count, 1)
+
+        with override_settings(API_CHECK_MIN_INTERVAL=0):
+            third = self.client.post(reverse('post_not_followers_tw_friends_check_start'))
+        self.assertNotEqual(third.data['id'], first.data['id'])
+
+    def test_check_waits_for_attached_run(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+        NotFollowerTwFriend.objects.create(
+            id_str='1', screen_name='tw_user_1', name='Twitter User #1',
+            created_at='Mon Jan 01 00:00:00 +0000 2018')
+
+        def finish_run(seconds):
+            TwFriendsRun.objects.filter(pk=running.pk).update(
+                status=TwFriendsRun.STATUS_SUCCEEDED, finished_at=timezone.now())
+
+        with mock.patch('api.runs.time.sleep', side_effect=finish_run) as sleep:
+            response = self.client.get(reverse('get_not_followers_tw_friends_check'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['screen_name'] for row in response.data], ['tw_user_1'])
+        self.assertEqual(sleep.call_count, 1)
+        self.assertFalse(self.get_twitter_api.called)
+        self.assertEqual(TwFriendsRun.objects.count(), 1)
+
+    def test_attached_run_failure(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_UNFOLLOW)
+
+        def fail_run(seconds):
+            TwFriendsRun.objects.filter(pk=running.pk).update(
+                status=TwFriendsRun.STATUS_FAILED, finished_at=timezone.now())
+
+        with mock.patch('api.runs.time.sleep', side_effect=fail_run):
+            with self.assertRaises(RunFailedError):
+                run_single_flight(TwFriendsRun.KIND_UNFOLLOW)
+
+    def test_attached_run_failure_api(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_UNFOLLOW)
+
+        def fail_run(seconds):
+            TwFriendsRun.objects.filter(pk=running.pk).update(
+                status=TwFriendsRun.STATUS_FAILED, finished_at=timezone.now())
+            events = RunEventRecorder(running)
+            events.emit(EVENT_ERROR, {'detail': 'Over capacity'})
+            events.flush()
+
+        with mock.patch('api.runs.time.sleep', side_effect=fail_run):
+            response = self.client.delete(reverse('delete_not_followers_tw_friends_unfollow'))
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.data, {
+            'detail': 'The unfollow run #%s has failed.' % running.pk, 'error': 'Over capacity'})
+
+
+@override_settings(API_RUNS_IN_BACKGROUND=False, API_RUN_EVENTS_POLL_INTERVAL=0.01,
+                   API_CHECK_MIN_INTERVAL=0)
+class DeadlineCheckTestCase(APITestCase):
+    """
+    Test that the deadline-bounded check returns the partial list
+    with the continuation token while the check runs
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+        self.url = reverse('get_not_followers_tw_friends_check')
+
+        patcher = mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                             return_value=make_twitter_api([make_tw_user(1, 'tw_user_1')], []))
+        self.get_twitter_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(API_RUNS_IN_BACKGROUND=True)
+    def test_partial_list_and_continuation(self):
+        running = TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+        for i in (1, 2):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i), screen_name='tw_user_%s' % i, name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                # Only the first row is already confirmed by the running check
+                last_seen_run=running.pk if i == 1 else 0)
+
+        response = self.client.get(self.url, {'deadline_ms': 50})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Check-Partial'], 'true')
+        self.assertEqual(response['X-Check-Continuation'], str(running.pk))
+        self.assertEqual([row['screen_name'] for row in response.data], ['tw_user_1'])
+        self.assertFalse(self.get_twitter_api.called)
+
+        TwFriendsRun.objects.filter(pk=running.pk).update(
+            status=TwFriendsRun.STATUS_SUCCEEDED, finished_at=timezone.now())
+
+        response = self.client.get(self.url, {'continuation': running.pk, 'deadline_ms': 50})
+
+        self.assertEqual(response['X-Check-Partial'], 'false')
+        self.assertNotIn('X-Check-Continuation', response)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(TwFriendsRun.objects.count(), 1)
+
+    def execute_in_background(self):
+        """
+        Patch the runs executor to execute the submitted run right away
+        (in the thread of the test transaction)
+        """
+
+        def submit(function, run):
+            try:
+                execute_run(run)
+            except Exception:
+                # The error is recorded as the TwFriendsRun status and the 'error' event
+                pass
+
+        executor = mock.Mock()
+        executor.submit.side_effect = submit
+        return mock.patch('api.runs.get_runs_executor', return_value=executor)
+
+    @override_settings(API_RUNS_IN_BACKGROUND=True)
+    def test_check_within_deadline(self):
+        with self.execute_in_background():
+            response = self.client.get(self.url, {'deadline_ms': 1000})
+
+        self.assertEqual(response['X-Check-Partial'], 'false')
+        self.assertEqual([row['screen_name'] for row in response.data], ['tw_user_1'])
+        self.assertEqual(TwFriendsRun.objects.get().status, TwFriendsRun.STATUS_SUCCEEDED)
+
+    @override_settings(API_RUNS_IN_BACKGROUND=True)
+    def test_failed_check(self):
+        self.get_twitter_api.return_value.GetFollowerIDsPaged.side_effect = \
+            TwitterError('Over capacity')
+
+        with self.execute_in_background():
+            response = self.client.get(self.url, {'deadline_ms': 1000})
+
+        run = TwFriendsRun.objects.get()
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.data['detail'], 'The check run #%s has failed.' % run.pk)
+        self.assertEqual(response.data['error'], 'Over capacity')
+
+    def test_deadline_without_background_runs(self):
+        # The new check would ignore the deadline in the request thread
+        response = self.client.get(self.url, {'deadline_ms': 1000})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(TwFriendsRun.objects.exists())
+
+    def test_invalid_params(self):
+        for params in ({'deadline_ms': 0}, {'deadline_ms': 'soon'}, {'continuation': 'x'},
+                       {'continuation': 12345}):
+            response = self.client.get(self.url, params)
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
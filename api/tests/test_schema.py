@@ -0,0 +1,90 @@
+"""
+Test module for the cached and the pre-generated API schema
+"""
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from rest_framework.schemas.generators import SchemaGenerator
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..schema import reset_schema_cache
+
+
+class SchemaTestCase(APITestCase):
+    """
+    Test that the schema isn't generated on each request
+    """
+
+    def setUp(self):
+        reset_schema_cache()
+        self.addCleanup(reset_schema_cache)
+
+        self.user = User.objects.create_user(username='test_user', password='top_secret')
+        self.staff_user = User.objects.create_user(
+            username='test_staff_user', password='top_secret', is_staff=True)
+        self.client.force_authenticate(user=self.user)
+
+    def get_schema(self):
+        return self.client.get(reverse('get_api_schema'), HTTP_ACCEPT='application/coreapi+json')
+
+    @override_settings(API_SCHEMA_FILE=None)
+    def test_schema_generated_once(self):
+        with mock.patch.object(
+                SchemaGenerator, 'get_links', autospec=True,
+                side_effect=SchemaGenerator.get_links) as get_links:
+            first_response = self.get_schema()
+            second_response = self.get_schema()
+
+        self.assertEqual(first_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(first_response.content, second_response.content)
+        self.assertEqual(get_links.call_count, 1)
+        self.assertIn(b'not_followers_tw_friends', first_response.content)
+
+    def test_pre_generated_schema(self):
+        schema_dir = tempfile.mkdtemp()
+        path = os.path.join(schema_dir, 'api_schema.json')
+        self.addCleanup(os.rmdir, schema_dir)
+        self.addCleanup(os.remove, path)
+
+        with override_settings(API_SCHEMA_FILE=path):
+            call_command('generate_schema', stdout=mock.Mock())
+            with mock.patch.object(SchemaGenerator, 'get_links',
+                                   side_effect=AssertionError('introspection')):
+                response = self.get_schema()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'not_followers_tw_friends', response.content)
+        self.assertNotIn(b'profiles', response.content)
+
+        self.client.force_authenticate(user=self.staff_user)
+        with override_settings(API_SCHEMA_FILE=path), \
+                mock.patch.object(SchemaGenerator, 'get_links',
+                                  side_effect=AssertionError('introspection')):
+            response = self.get_schema()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'profiles', response.content)
+
+    @override_settings(API_SCHEMA_FILE=None)
+    def test_admin_endpoints_only_for_staff(self):
+        for _ in range(2):
+            self.client.force_authenticate(user=self.staff_user)
+            self.assertIn(b'profiles', self.get_schema().content)
+
+            self.client.force_authenticate(user=self.user)
+            response = self.get_schema()
+            self.assertIn(b'not_followers_tw_friends', response.content)
+            self.assertNotIn(b'profiles', response.content)
+
+    def test_schema_requires_authentication(self):
+        self.client = self.client_class()
+
+        self.assertIn(self.get_schema().status_code,
+                      (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
@@ -0,0 +1,81 @@
+"""
+Test module for the sparse fieldsets ('?fields=') of the list views
+"""
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..models import AutoClassificationRule, NotFollowerTwFriend, TwFriendsRun
+
+
+class SparseFieldsTestCase(APITestCase):
+    """
+    Test that '?fields=' narrows both the response and the db query
+    """
+
+    def setUp(self):
+        for i in range(1, 4):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                description='The long description of the Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                tff_ratio=i,
+            )
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def get_with_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        select = [query['sql'] for query in queries.captured_queries
+                  if NotFollowerTwFriend._meta.db_table in query['sql']]
+        return response, select
+
+    def test_sparse_fields(self):
+        response, select = self.get_with_queries(
+            reverse('get_not_followers_tw_friends'),
+            {'fields': 'screen_name,tff_ratio,need_unfollow'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], {
+            'screen_name': 'tw_user_1', 'tff_ratio': '1.00', 'need_unfollow': True})
+        self.assertEqual(len(select), 1)
+        self.assertNotIn('"description"', select[0])
+        self.assertIn('"screen_name"', select[0])
+
+    def test_sparse_fields_columnar(self):
+        response, select = self.get_with_queries(
+            reverse('get_not_followers_tw_friends_need_unfollow'),
+            {'fields': 'tff_ratio,screen_name', 'format': 'columnar'})
+
+        data = json.loads(response.content.decode('utf-8'))
+        # The fields are in the order of the serializer fields
+        self.assertEqual(data['fields'], ['screen_name', 'tff_ratio'])
+        self.assertEqual(data['columns'][1], ['1.00', '2.00', '3.00'])
+        self.assertNotIn('"description"', select[0])
+
+    def test_unknown_fields(self):
+        response = self.client.get(
+            reverse('get_not_followers_tw_friends'), {'fields': 'screen_name,password'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data['fields'][0])
+
+    def test_sparse_fields_of_generic_list_views(self):
+        AutoClassificationRule.objects.create(
+            name='Good ratio', field='tff_ratio', operator='gte', value=2)
+        TwFriendsRun.objects.create(kind=TwFriendsRun.KIND_CHECK)
+
+        response = self.client.get(reverse('auto_classification_rules'), {'fields': 'rule'})
+        self.assertEqual(response.data, [{'rule': 'keep if tff_ratio >= 2.00'}])
+
+        response = self.client.get(reverse('get_tw_friends_runs'), {'fields': 'kind,status'})
+        self.assertEqual(response.data, [{'kind': 'check', 'status': 'running'}])
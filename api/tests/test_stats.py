@@ -0,0 +1,159 @@
+"""
+Test module for the incrementally maintained summary statistics
+"""
+import io
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .. import stats
+from ..auto_classification import apply_auto_classification_rules
+from ..check_not_followers_tw_friends import check_tw_friends
+from ..import_need_unfollow_decisions import import_need_unfollow_decisions
+from ..models import AutoClassificationRule, NotFollowerTwFriend, NotFollowersTwFriendsStat
+from ..unfollow_not_followers_tw_friends import unfollow_tw_friends
+from .twitter_fakes import make_tw_user, make_twitter_api
+
+
+class NotFollowersTwFriendsStatsTestCase(APITestCase):
+    """
+    Test that all the write paths keep the counters consistent
+    with the full recomputation
+    """
+
+    def setUp(self):
+        # The accounts are created 100 days ago: 'avg_tweetsperday' is 0.05, 3, 60 and 0
+        for i, (tff_ratio, statuses_count) in enumerate(
+                [(0.2, 5), (0.5, 300), (1.5, 6000), (12, 0)], 1):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                created_at_day=date.today().toordinal() - 100,
+                statuses_count=statuses_count,
+                tff_ratio=tff_ratio,
+                need_unfollow=(i != 4)
+            )
+        stats.recompute_stats()
+
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def assertStatsConsistent(self):
+        self.assertEqual(stats.verify_stats(), {})
+
+    def test_get_stats(self):
+        response = self.client.get(reverse('get_not_followers_tw_friends_stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['need_unfollow'], 3)
+        self.assertEqual(response.data['keep'], 1)
+        self.assertEqual(
+            [(bucket['bucket'], bucket['count'])
+             for bucket in response.data['histograms']['tff_ratio']],
+            [('0-0.5', 1), ('0.5-1', 1), ('1-2', 1), ('2-5', 0), ('5-10', 0), ('10+', 1)])
+        self.assertEqual(
+            [bucket['count'] for bucket in response.data['histograms']['avg_tweetsperday']],
+            [2, 0, 1, 0, 0, 1])
+
+    def test_row_stat_keys_rounding_as_sql(self):
+        # 'avg_tweetsperday' is 0.995 and 49.995, rounded half up to the bucket bounds
+        for i, statuses_count in enumerate((199, 9999), 5):
+            not_follower_tw_friend = NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                created_at_day=date.today().toordinal() - 200,
+                statuses_count=statuses_count
+            )
+            counts = stats.count_stats(NotFollowerTwFriend.objects.filter(id_str=str(i)))
+
+            self.assertEqual(
+                sorted(stats.get_row_stat_keys(not_follower_tw_friend)),
+                sorted(key for key, count in counts.items() if count))
+        self.assertIn('avg_tweetsperday:50+', stats.get_row_stat_keys(not_follower_tw_friend))
+
+    def test_get_stats_computes_missing_counters(self):
+        NotFollowersTwFriendsStat.objects.all().delete()
+
+        self.assertEqual(stats.get_stats()['total'], 4)
+        self.assertStatsConsistent()
+
+    def test_get_stats_recomputes_counters_of_previous_day(self):
+        NotFollowersTwFriendsStat.objects.filter(key=stats.DAY_KEY).update(
+            value=date.today().toordinal() - 1)
+        # 'avg_tweetsperday' counters of the previous day are stale
+        NotFollowersTwFriendsStat.objects.filter(key='avg_tweetsperday:0-0.1').update(value=0)
+
+        self.assertFalse(stats.is_stats_initialized())
+        self.assertEqual(
+            [bucket['count'] for bucket in stats.get_stats()['histograms']['avg_tweetsperday']],
+            [2, 0, 1, 0, 0, 1])
+        self.assertStatsConsistent()
+
+    def test_patch_updates_counters(self):
+        response = self.client.patch(
+            reverse('patch_not_followers_tw_friends_need_unfollow_update',
+                    kwargs={'screen_name': 'tw_user_1'}),
+            {'need_unfollow': False}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(stats.get_stats()['need_unfollow'], 2)
+        self.assertStatsConsistent()
+
+    def test_import_updates_counters(self):
+        report = import_need_unfollow_decisions(
+            io.StringIO('screen_name,decision\ntw_user_2,keep\ntw_user_4,unfollow\n'), 'csv')
+
+        self.assertEqual(report['updated'], 2)
+        self.assertEqual(stats.get_stats()['need_unfollow'], 3)
+        self.assertStatsConsistent()
+
+    def test_auto_classification_updates_counters(self):
+        AutoClassificationRule.objects.create(
+            name='Good ratio', field='tff_ratio', operator='gte', value=1)
+
+        self.assertEqual(apply_auto_classification_rules(), 1)
+        self.assertEqual(stats.get_stats()['need_unfollow'], 2)
+        self.assertStatsConsistent()
+
+    def test_unfollow_updates_counters(self):
+        api = make_twitter_api([], [])
+        with mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                        return_value=api):
+            unfollow_tw_friends()
+
+        self.assertEqual(stats.get_stats()['total'], 1)
+        self.assertStatsConsistent()
+
+    def test_check_updates_counters(self):
+        api = make_twitter_api(
+            [make_tw_user(4, 'tw_user_4'), make_tw_user(5, 'tw_user_5', followers_count=50),
+             make_tw_user(6, 'tw_user_6')],
+            follower_ids=[6])
+        with mock.patch('api.check_not_followers_tw_friends.get_twitter_api',
+                        return_value=api):
+            check_tw_friends()
+
+        self.assertEqual(stats.get_stats()['total'], 2)
+        self.assertStatsConsistent()
+
+    def test_check_command_repairs_counters(self):
+        NotFollowersTwFriendsStat.objects.filter(key=stats.TOTAL_KEY).update(value=10)
+
+        with self.assertRaises(CommandError):
+            call_command('check_not_followers_stats', stdout=io.StringIO())
+
+        call_command('check_not_followers_stats', '--repair', stdout=io.StringIO())
+        self.assertStatsConsistent()
@@ -0,0 +1,300 @@
+"""
+Test module for the transport of the Twitter API calls (timeouts, retries
+and the circuit breaker) with the faults injected by the local fake of Twitter API
+"""
+import json
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.test import override_settings
+
+from rest_framework.test import APITestCase
+
+import requests
+import twitter
+
+from ..loadtest import percentile
+from ..models import NotFollowerTwFriend
+from ..twitter_api import CircuitOpenError, TwitterApiPool, call_with_retries, circuit_breaker, \
+    get_twitter_api
+from ..unfollow_not_followers_tw_friends import unfollow_tw_friends
+
+# Seconds of the hung response
+HANG_SECONDS = 1.0
+
+TRANSPORT_SETTINGS = {
+    'TWITTER_API_CLASS': 'twitter.Api',
+    'TWITTER_RATE_LIMITS': {'GetFollowerIDsPaged': 100},
+    'TWITTER_API_TIMEOUT': 0.1,
+    'TWITTER_API_RETRIES': 2,
+    'TWITTER_API_RETRY_BACKOFF': 0.01,
+    'TWITTER_CIRCUIT_FAILURES': 5,
+    'TWITTER_CIRCUIT_COOLDOWN': 60,
+}
+
+# The faults of the responses
+FAULT_HANG = 'hang'
+FAULT_OVER_CAPACITY = 'over_capacity'
+FAULT_BAD_GATEWAY = 'bad_gateway'
+FAULT_NOT_FOUND = 'not_found'
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    """
+    The handler of the Twitter API requests with the next injected fault
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, params):
+        fake = self.server
+        path = urlparse(self.path).path
+        fault = fake.next_fault()
+
+        if path.endswith('/friendships/destroy.json'):
+            # The unfollow is applied before the hung response
+            fake.destroy_friendship(int(params['user_id'][0]))
+        if fault == FAULT_HANG:
+            time.sleep(HANG_SECONDS)
+        elif fault == FAULT_OVER_CAPACITY:
+            return self.send_json(503, {'errors': [{'code': 130, 'message': 'Over capacity'}]})
+        elif fault == FAULT_BAD_GATEWAY:
+            body = b'<html><body>502 Bad Gateway</body></html>'
+            self.send_response(502)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        elif fault == FAULT_NOT_FOUND:
+            return self.send_json(404, {'errors': [{'code': 34, 'message': 'Not found'}]})
+
+        if path.endswith('/followers/ids.json'):
+            self.send_json(200, {'ids': fake.follower_ids, 'next_cursor': 0,
+                                 'previous_cursor': 0})
+        elif path.endswith('/friendships/destroy.json'):
+            user_id = int(params['user_id'][0])
+            self.send_json(200, {'id': user_id, 'screen_name': 'tw_user_%s' % user_id})
+        else:
+            self.send_json(404, {'errors': [{'code': 34, 'message': 'Not found'}]})
+
+    def do_GET(self):
+        self.handle_request(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.handle_request(parse_qs(self.rfile.read(length).decode()))
+
+
+class FakeTwitterServer(ThreadingHTTPServer):
+    """
+    The local fake of Twitter API, each request takes the next fault
+    from the 'faults' list (None for the normal response)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, follower_ids=()):
+        super(FakeTwitterServer, self).__init__(('127.0.0.1', 0), FakeTwitterHandler)
+        self.follower_ids = list(follower_ids)
+        self.faults = []
+        self.requests_count = 0
+        self.destroyed_ids = []
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # The hung responses are written to the connections closed by the timeout
+        pass
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%s/1.1' % self.server_address[1]
+
+    def next_fault(self):
+        with self.lock:
+            self.requests_count += 1
+            return self.faults.pop(0) if self.faults else None
+
+    def destroy_friendship(self, user_id):
+        with self.lock:
+            self.destroyed_ids.append(user_id)
+
+
+@override_settings(**TRANSPORT_SETTINGS)
+class TwitterTransportTestCase(APITestCase):
+    """
+    Test the timeouts, the retries and the circuit breaker of the calls
+    of python-twitter Api against the local fake of Twitter API
+    """
+
+    def setUp(self):
+        self.server = FakeTwitterServer(follower_ids=[1, 2, 3])
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        circuit_breaker.reset()
+        self.addCleanup(circuit_breaker.reset)
+
+    def get_api(self):
+        with warnings.catch_warnings():
+            # The warning of python-twitter lib about the timeouts of the streaming API
+            warnings.simplefilter('ignore')
+            return get_twitter_api({
+                'consumer_key': 'key',
+                'consumer_secret': 'secret',
+                'access_token_key': 'token',
+                'access_token_secret': 'token_secret',
+                'base_url': self.server.base_url,
+            })
+
+    def get_follower_ids(self):
+        return TwitterApiPool([self.get_api()]).call('GetFollowerIDsPaged')[2]
+
+    def test_transient_errors_retried(self):
+        for fault in (FAULT_HANG, FAULT_OVER_CAPACITY, FAULT_BAD_GATEWAY):
+            self.server.faults = [fault, fault]
+            self.server.requests_count = 0
+
+            started = time.perf_counter()
+            self.assertEqual(self.get_follower_ids(), [1, 2, 3])
+
+            self.assertEqual(self.server.requests_count, 3)
+            self.assertLess(time.perf_counter() - started, HANG_SECONDS)
+
+    def test_retries_bounded(self):
+        self.server.faults = [FAULT_OVER_CAPACITY] * 4
+
+        with self.assertRaises(twitter.TwitterError):
+            self.get_follower_ids()
+        self.assertEqual(self.server.requests_count, 3)
+
+        circuit_breaker.reset()
+        self.server.faults = [FAULT_HANG] * 4
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.get_follower_ids()
+        self.assertEqual(self.server.requests_count, 6)
+
+    def test_errors_not_retried(self):
+        self.server.faults = [FAULT_NOT_FOUND]
+
+        with self.assertRaises(twitter.TwitterError):
+            self.get_follower_ids()
+        self.assertEqual(self.server.requests_count, 1)
+
+        # The endpoints which aren't idempotent aren't retried
+        self.server.faults = [FAULT_OVER_CAPACITY]
+
+        with self.assertRaises(twitter.TwitterError):
+            TwitterApiPool([self.get_api()]).call('PostUpdate', 'status')
+        self.assertEqual(self.server.requests_count, 2)
+
+    def test_unfollow_retried(self):
+        for friend_id in (4, 5):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(friend_id), screen_name='tw_user_%s' % friend_id,
+                name='tw_user_%s' % friend_id, need_unfollow=True)
+        # The first unfollow is applied by Twitter, but its response is hung
+        self.server.faults = [FAULT_HANG]
+
+        with override_settings(TWITTER_UNFOLLOW_CONCURRENCY=1), \
+                mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                           side_effect=self.get_api):
+            unfollow_tw_friends()
+
+        self.assertFalse(NotFollowerTwFriend.objects.exists())
+        # The repeated unfollow doesn't change the result
+        self.assertEqual(sorted(self.server.destroyed_ids), [4, 4, 5])
+
+    @override_settings(TWITTER_CIRCUIT_FAILURES=3, TWITTER_CIRCUIT_COOLDOWN=0.2)
+    def test_circuit_breaker(self):
+        self.server.faults = [FAULT_OVER_CAPACITY] * 3
+
+        with self.assertRaises(twitter.TwitterError):
+            self.get_follower_ids()
+        self.assertTrue(circuit_breaker.is_open())
+
+        # The calls fail fast without the requests
+        for _ in range(3):
+            with self.assertRaises(CircuitOpenError):
+                self.get_follower_ids()
+        self.assertEqual(self.server.requests_count, 3)
+
+        # The failed trial call opens the circuit again
+        time.sleep(0.2)
+        self.server.faults = [FAULT_BAD_GATEWAY]
+
+        with self.assertRaises(twitter.TwitterError):
+            self.get_follower_ids()
+        self.assertEqual(self.server.requests_count, 4)
+        with self.assertRaises(CircuitOpenError):
+            self.get_follower_ids()
+
+        # The successful trial call closes the circuit
+        time.sleep(0.2)
+
+        self.assertEqual(self.get_follower_ids(), [1, 2, 3])
+        self.assertFalse(circuit_breaker.is_open())
+
+    @override_settings(TWITTER_CIRCUIT_FAILURES=1, TWITTER_CIRCUIT_COOLDOWN=0.2)
+    def test_circuit_breaker_trial_error(self):
+        self.server.faults = [FAULT_BAD_GATEWAY]
+
+        with self.assertRaises(twitter.TwitterError):
+            TwitterApiPool([self.get_api()]).call('PostUpdate', 'status')
+        self.assertTrue(circuit_breaker.is_open())
+
+        def fail():
+            raise ValueError('Unexpected response')
+
+        # The trial call failed with the unexpected error opens the circuit again
+        time.sleep(0.2)
+
+        with self.assertRaises(ValueError):
+            call_with_retries('GetFollowerIDsPaged', fail)
+        with self.assertRaises(CircuitOpenError):
+            self.get_follower_ids()
+
+        # The next trial call isn't blocked by the ended one
+        time.sleep(0.2)
+
+        self.assertEqual(self.get_follower_ids(), [1, 2, 3])
+        self.assertFalse(circuit_breaker.is_open())
+
+    def test_tail_latency(self):
+        # Each tenth response is hung
+        faults = ([FAULT_HANG] + [None] * 9) * 2
+
+        def measure():
+            self.server.faults = list(faults)
+            api_pool = TwitterApiPool([self.get_api()])
+            latencies = []
+            for _ in range(len(faults)):
+                started = time.perf_counter()
+                api_pool.call('GetFollowerIDsPaged')
+                latencies.append(time.perf_counter() - started)
+            return sorted(latencies)
+
+        with override_settings(TWITTER_API_TIMEOUT=None):
+            latencies = measure()
+
+        self.assertGreaterEqual(percentile(latencies, 99), HANG_SECONDS)
+
+        latencies = measure()
+
+        # The hung call is cut by the timeout and retried
+        self.assertLess(percentile(latencies, 99), HANG_SECONDS / 2)
@@ -0,0 +1,123 @@
+"""
+Test module for the priority-ordered, budgeted unfollow queue
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from ..models import NotFollowerTwFriend, UnfollowQueueItem
+from ..unfollow_queue import drain_unfollow_queue, enqueue_need_unfollow, get_queue_status
+from .twitter_fakes import make_twitter_api
+
+
+@override_settings(UNFOLLOW_QUEUE_PRIORITY=['tff_ratio'], UNFOLLOW_DAILY_BUDGET=5,
+                   UNFOLLOW_WINDOW_BUDGET=2, UNFOLLOW_WINDOW_SECONDS=900,
+                   TWITTER_UNFOLLOW_CONCURRENCY=1)
+class UnfollowQueueTestCase(APITestCase):
+    """
+    Test the order, the budgets and the status of the unfollow queue
+    """
+
+    def setUp(self):
+        for i, tff_ratio in enumerate([3, 0.5, 1, 0.1, 2], 1):
+            NotFollowerTwFriend.objects.create(
+                id_str=str(i),
+                screen_name='tw_user_%s' % i,
+                name='Twitter User #%s' % i,
+                created_at='Mon Jan 01 00:00:00 +0000 2018',
+                tff_ratio=tff_ratio,
+                need_unfollow=(i != 5)
+            )
+        self.api = make_twitter_api([], [])
+
+        user = User.objects.create_user(username='test_user', password='top_secret')
+        self.client.force_authenticate(user=user)
+
+    def drain(self):
+        with mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                        return_value=self.api):
+            return drain_unfollow_queue()
+
+    def test_enqueue_in_priority_order(self):
+        self.assertEqual(enqueue_need_unfollow(), 4)
+        self.assertEqual(
+            list(UnfollowQueueItem.objects.values_list('id_str', flat=True)),
+            ['4', '2', '3', '1'])
+
+    def test_drain_within_window_budget(self):
+        enqueue_need_unfollow()
+
+        self.assertEqual(self.drain(), {'unfollowed': 2, 'skipped': 0, 'failed': 0})
+        self.assertEqual(
+            [call[0][0] for call in self.api.DestroyFriendship.call_args_list], [4, 2])
+        self.assertEqual(
+            sorted(NotFollowerTwFriend.objects.values_list('id_str', flat=True)),
+            ['1', '3', '5'])
+
+        # The window budget is exhausted
+        self.assertEqual(self.drain(), {'unfollowed': 0, 'skipped': 0, 'failed': 0})
+
+        queue_status = get_queue_status()
+        self.assertEqual(queue_status['depth'], 2)
+        self.assertEqual(queue_status['remaining_budget'], 0)
+        self.assertGreater(queue_status['next_window_at'], timezone.now())
+
+    def test_drain_in_next_window_within_daily_budget(self):
+        enqueue_need_unfollow()
+        self.drain()
+
+        UnfollowQueueItem.objects.exclude(processed_at=None).update(
+            processed_at=timezone.now() - timedelta(seconds=901))
+        self.assertEqual(self.drain(), {'unfollowed': 2, 'skipped': 0, 'failed': 0})
+        self.assertEqual(get_queue_status()['depth'], 0)
+
+    def test_drain_skips_kept_and_records_failed(self):
+        enqueue_need_unfollow()
+        NotFollowerTwFriend.objects.filter(id_str='4').update(need_unfollow=False)
+        self.api.DestroyFriendship.side_effect = RuntimeError('Not found')
+
+        # The skipped items don't use the budget, the failed ones do
+        self.assertEqual(self.drain(), {'unfollowed': 0, 'skipped': 1, 'failed': 1})
+        self.assertEqual(
+            dict(UnfollowQueueItem.objects.exclude(
+                status=UnfollowQueueItem.STATUS_PENDING).values_list('id_str', 'status')),
+            {'4': 'skipped', '2': 'failed'})
+        self.assertEqual(self.drain(), {'unfollowed': 0, 'skipped': 0, 'failed': 1})
+        self.assertEqual(NotFollowerTwFriend.objects.count(), 5)
+
+    def test_queue_api(self):
+        response = self.client.post(reverse('unfollow_queue'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['depth'], 4)
+        self.assertEqual(response.data['remaining_budget'], 2)
+        # 2 items now, 2 items in the next window (daily budget allows 5 per 24 hours,
+        # so the windows are stretched to 24 * 60 * 60 * 2 / 5 seconds)
+        self.assertAlmostEqual(
+            (response.data['projected_completion_at'] - timezone.now()).total_seconds(),
+            24 * 60 * 60 * 2 / 5, delta=60)
+
+        response = self.client.get(reverse('unfollow_queue'))
+        self.assertEqual(response.data['depth'], 4)
+
+    def test_unfollow_api_within_window_budget(self):
+        with mock.patch('api.unfollow_not_followers_tw_friends.get_twitter_api',
+                        return_value=self.api):
+            response = self.client.delete(
+                reverse('delete_not_followers_tw_friends_unfollow'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [call[0][0] for call in self.api.DestroyFriendship.call_args_list], [4, 2])
+        # The rest of the friends stay in the queue for the next window
+        self.assertEqual(response['X-Unfollow-Pending'], '2')
+        self.assertEqual(
+            sorted(NotFollowerTwFriend.objects.values_list('id_str', flat=True)),
+            ['1', '3', '5'])
@@ -0,0 +1,44 @@
+"""
+Fake Twitter API objects for the tests
+"""
+from types import SimpleNamespace
+from unittest import mock
+
+
+def make_tw_user(user_id, screen_name, **fields):
+    """
+    Return a fake twitter.User object for the Twitter API responses
+    """
+
+    tw_user = SimpleNamespace(
+        id=user_id,
+        screen_name=screen_name,
+        name=screen_name,
+        description='',
+        statuses_count=100,
+        followers_count=10,
+        friends_count=5,
+        created_at='Mon Jan 01 00:00:00 +0000 2018',
+        location='',
+    )
+    tw_user.__dict__.update(fields)
+    return tw_user
+
+
+def make_twitter_api(friends, follower_ids):
+    """
+    Return a fake twitter.Api object with the single page of 'friends'
+    (and their IDs) and the 'follower_ids' list
+    """
+
+    friends_by_id = {friend.id: friend for friend in friends}
+
+    def users_lookup(user_id):
+        return [friends_by_id[friend_id] for friend_id in user_id if friend_id in friends_by_id]
+
+    api = mock.Mock()
+    api.GetFollowerIDsPaged.return_value = (0, 0, list(follower_ids))
+    api.GetFriendsPaged.return_value = (0, 0, list(friends))
+    api.GetFriendIDsPaged.return_value = (0, 0, list(friends_by_id))
+    api.UsersLookup.side_effect = users_lookup
+    return api
@@ -0,0 +1,554 @@
+"""
+Access to the Twitter API for the check and unfollow modules:
+    1. Create a Twitter Api instance (python-twitter lib)
+       with authentication data from settings
+    2. Call the Twitter API endpoints with instrumentation
+       and waiting for the rate limit window reset
+    3. Dispatch the calls across the pool of the authorized credentials
+       ('settings.TWITTER_CREDENTIALS'), each credential has its own rate limit
+       budget, so the crawl throughput grows with the size of the pool
+    4. Each call has the timeout ('settings.TWITTER_API_TIMEOUT' seconds),
+       the transient errors (timeouts, connection errors, 5xx responses)
+       of RETRY_ENDPOINTS are retried with the jittered exponential backoff,
+       and the circuit breaker fails fast while Twitter API is down
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.utils.module_loading import import_string
+import requests
+import twitter
+from . import metrics
+
+# Twitter API error code for 'Rate limit exceeded'
+# https://developer.twitter.com/en/docs/basics/response-codes
+RATE_LIMIT_EXCEEDED_CODE = 88
+# Twitter API error code for 'No user matches for specified terms'
+# (UsersLookup of the suspended and deleted users only)
+NO_USER_MATCHES_CODE = 17
+
+# Calls per rate limit window of the endpoints for the single credential (user auth)
+# https://developer.twitter.com/en/docs/basics/rate-limits
+# The endpoints without the limit are only stopped by 'Rate limit exceeded' errors
+RATE_LIMITS = {
+    'GetFollowerIDsPaged': 15,
+    'GetFriendIDsPaged': 15,
+    'GetFriendsPaged': 15,
+    'LookupFriendship': 15,
+    'UsersLookup': 900,
+}
+
+# Max count of the users in the single UsersLookup call
+USERS_LOOKUP_BATCH_SIZE = 100
+
+# Twitter API error codes of the transient errors ('Over capacity', 'Internal error')
+# https://developer.twitter.com/en/docs/basics/response-codes
+TRANSIENT_ERROR_CODES = (130, 131)
+# Messages of python-twitter lib for the HTML pages of the 5xx responses
+TRANSIENT_ERROR_MESSAGES = ('Capacity Error', 'Technical Error')
+
+# The endpoints which are retried after the transient errors: the reads,
+# and DestroyFriendship which is idempotent (the unfollow of the user
+# who isn't followed returns the user again), so the retry of the call
+# which has reached Twitter before its timeout doesn't change the result
+RETRY_ENDPOINTS = {
+    'GetFollowerIDsPaged',
+    'GetFriendIDsPaged',
+    'GetFriendsPaged',
+    'LookupFriendship',
+    'UsersLookup',
+    'DestroyFriendship',
+}
+
+
+def get_twitter_credentials():
+    """
+    Return the authentication data of the pool of the credentials:
+    'settings.TWITTER_CREDENTIALS' (list of dicts with 'consumer_key',
+    'consumer_secret', 'access_token_key' and 'access_token_secret'
+    of Twitter Apps authorized by Twitter Account) or the single credential
+    of CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN and ACCESS_TOKEN_SECRET settings.
+
+    Returns:
+        list -- The authentication data of the credentials
+    """
+
+    credentials = getattr(settings, 'TWITTER_CREDENTIALS', None)
+    if credentials:
+        return [dict(credential) for credential in credentials]
+
+    return [{
+        'consumer_key': settings.CONSUMER_KEY,
+        'consumer_secret': settings.CONSUMER_SECRET,
+        'access_token_key': settings.ACCESS_TOKEN,
+        'access_token_secret': settings.ACCESS_TOKEN_SECRET,
+    }]
+
+
+def get_twitter_api(credential=None):
+    """
+    Create a Twitter Api instance with authentication data
+    for Twitter App created for Twitter Account.
+
+    Arguments:
+        credential {dict} -- The authentication data of the credential,
+                             the first one of get_twitter_credentials() if None
+                             (default: {None})
+
+    Returns:
+        twitter.Api object -- The Twitter Api instance
+                              (of 'settings.TWITTER_API_CLASS', e.g. the stub
+                              of the load tests, see api/twitter_stub.py)
+                              with the timeout of the calls
+    """
+
+    api_class = import_string(getattr(settings, 'TWITTER_API_CLASS', 'twitter.Api'))
+    return api_class(
+        timeout=getattr(settings, 'TWITTER_API_TIMEOUT', 30),
+        **(credential or get_twitter_credentials()[0]))
+
+
+def has_error_code(error, codes):
+    """
+    Check whether the 'error' raised by python-twitter lib
+    has one of the Twitter API error 'codes'.
+
+    Arguments:
+        error {twitter.TwitterError} -- The raised error
+        codes {tuple} -- The Twitter API error codes
+
+    Returns:
+        bool -- True if the error has one of the codes
+    """
+
+    errors = error.message
+    return isinstance(errors, list) and any(
+        isinstance(err, dict) and err.get('code') in codes for err in errors)
+
+
+def is_rate_limit_error(error):
+    """
+    Check whether the 'error' raised by python-twitter lib
+    is a 'Rate limit exceeded' error.
+
+    Arguments:
+        error {twitter.TwitterError} -- The raised error
+
+    Returns:
+        bool -- True if the error is a 'Rate limit exceeded' error
+    """
+
+    errors = error.message
+    if isinstance(errors, list):
+        return has_error_code(error, (RATE_LIMIT_EXCEEDED_CODE,))
+    return 'Rate limit exceeded' in str(errors)
+
+
+def is_transient_error(error):
+    """
+    Check whether the 'error' raised by the call of Twitter API is transient,
+    so the repeated call may succeed: the timeout or the connection error
+    of 'requests' lib, or the 5xx response ('Over capacity', 'Internal error').
+
+    Arguments:
+        error {Exception} -- The raised error
+
+    Returns:
+        bool -- True if the error is transient
+    """
+
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    if not isinstance(error, twitter.TwitterError) or isinstance(error, CircuitOpenError):
+        return False
+
+    errors = error.message
+    if isinstance(errors, list):
+        return has_error_code(error, TRANSIENT_ERROR_CODES)
+    if isinstance(errors, dict):
+        # The response which isn't JSON, e.g. the error page of the proxy
+        return errors.get('message') in TRANSIENT_ERROR_MESSAGES or 'Unknown error' in errors
+    return False
+
+
+class CircuitOpenError(twitter.TwitterError):
+    """
+    The call isn't made because Twitter API is down (the circuit breaker is open).
+    """
+
+
+class CircuitBreaker(object):
+    """
+    The circuit breaker of the calls of Twitter API in the process:
+    after 'settings.TWITTER_CIRCUIT_FAILURES' consecutive transient errors
+    the circuit opens and the calls fail fast with CircuitOpenError
+    for 'settings.TWITTER_CIRCUIT_COOLDOWN' seconds, then the single trial call
+    closes the circuit on success or opens it again on the transient error.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        # The time of the circuit opening, None for the closed circuit
+        self.opened_at = None
+        self.trial = False
+
+    def reset(self):
+        """
+        Close the circuit.
+        """
+
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self, endpoint):
+        """
+        Raise CircuitOpenError if the call of the 'endpoint' isn't allowed.
+
+        Returns:
+            bool -- True if the call is the trial one of the half-open circuit,
+                it must be ended with release_trial()
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            cooldown = getattr(settings, 'TWITTER_CIRCUIT_COOLDOWN', 60)
+            if not self.trial and time.monotonic() - self.opened_at >= cooldown:
+                # Half-open circuit, the call is the trial one
+                self.trial = True
+                return True
+
+        metrics.inc('twitter_circuit_rejected_calls_total', endpoint=endpoint)
+        raise CircuitOpenError(
+            'Twitter API is unavailable, the calls are stopped for %s seconds' % cooldown)
+
+    def record_success(self):
+        """
+        Count the call answered by Twitter API (including the errors which aren't transient).
+        """
+
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def release_trial(self):
+        """
+        End the trial call, so the circuit isn't stuck half-open
+        whichever way the call ended.
+        """
+
+        with self.lock:
+            self.trial = False
+
+    def record_failure(self):
+        """
+        Count the call failed with the transient error or the error which isn't the answer of Twitter API.
+        """
+
+        threshold = getattr(settings, 'TWITTER_CIRCUIT_FAILURES', 5)
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= threshold):
+                metrics.inc('twitter_circuit_opened_total')
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def get_retry_backoff(retry):
+    """
+    Return the seconds before the 'retry' (from 1): the random part ("full jitter")
+    of the exponential backoff 'settings.TWITTER_API_RETRY_BACKOFF' * 2 ** (retry - 1)
+    capped with 'settings.TWITTER_API_RETRY_BACKOFF_MAX', so the retries
+    of the concurrent calls are spread in time.
+    """
+
+    backoff = getattr(settings, 'TWITTER_API_RETRY_BACKOFF', 0.5) * 2 ** (retry - 1)
+    return random.uniform(0, min(backoff, getattr(settings, 'TWITTER_API_RETRY_BACKOFF_MAX', 10)))
+
+
+def call_with_retries(endpoint, call):
+    """
+    Make the 'call' of the Twitter API 'endpoint' through the circuit breaker
+    and retry it after the transient errors (see is_transient_error())
+    up to 'settings.TWITTER_API_RETRIES' times if the endpoint is in RETRY_ENDPOINTS.
+
+    Arguments:
+        endpoint {str} -- The name of the Api method, e.g. 'GetFriendsPaged'
+        call {callable} -- The function without arguments which makes the single call
+
+    Returns:
+        The result of the call
+
+    Raises:
+        CircuitOpenError -- The circuit breaker is open
+    """
+
+    retries = getattr(settings, 'TWITTER_API_RETRIES', 3) if endpoint in RETRY_ENDPOINTS else 0
+    retry = 0
+
+    while True:
+        trial = circuit_breaker.before_call(endpoint)
+        try:
+            result = call()
+        except Exception as error:
+            if not is_transient_error(error):
+                if isinstance(error, twitter.TwitterError):
+                    # Twitter API is up, the error is its answer
+                    circuit_breaker.record_success()
+                else:
+                    circuit_breaker.record_failure()
+                raise
+            metrics.inc('twitter_api_transient_errors_total', endpoint=endpoint)
+            circuit_breaker.record_failure()
+            if retry >= retries:
+                raise
+            retry += 1
+            metrics.inc('twitter_api_retries_total', endpoint=endpoint)
+            with metrics.timer('twitter_api_retry_wait_seconds', endpoint=endpoint):
+                time.sleep(get_retry_backoff(retry))
+        else:
+            circuit_breaker.record_success()
+            return result
+        finally:
+            if trial:
+                circuit_breaker.release_trial()
+
+
+def call_twitter_api(api, endpoint, *args, **kwargs):
+    """
+    Call the Twitter API 'endpoint' method of the 'api' instance
+    with the timing of the call latency.
+    When the rate limit is exceeded, wait for the rate limit window reset
+    (settings.TWITTER_RATE_LIMIT_WAIT seconds) and call the endpoint again,
+    the transient errors are retried by call_with_retries().
+
+    Arguments:
+        api {twitter.Api object} -- The Twitter Api instance
+        endpoint {str} -- The name of the Api method, e.g. 'GetFriendsPaged'
+        *args, **kwargs -- Arguments of the Api method
+
+    Returns:
+        The result of the Api method
+    """
+
+    api_method = getattr(api, endpoint)
+    rate_limit_wait = getattr(settings, 'TWITTER_RATE_LIMIT_WAIT', 15 * 60)
+
+    def call():
+        while True:
+            metrics.inc('twitter_api_calls_total', endpoint=endpoint)
+            try:
+                with metrics.timer('twitter_api_call_seconds', endpoint=endpoint):
+                    return api_method(*args, **kwargs)
+            except twitter.TwitterError as error:
+                if not is_rate_limit_error(error):
+                    raise
+                metrics.inc('twitter_rate_limit_waits_total', endpoint=endpoint)
+                with metrics.timer('twitter_rate_limit_wait_seconds', endpoint=endpoint):
+                    time.sleep(rate_limit_wait)
+
+    return call_with_retries(endpoint, call)
+
+
+class RateBudget(object):
+    """
+    The calls left in the current rate limit window of each endpoint
+    for the single credential. The window starts with its first call
+    and lasts 'settings.TWITTER_RATE_LIMIT_WAIT' seconds.
+    """
+
+    def __init__(self, limits, window_seconds):
+        self.limits = limits
+        self.window_seconds = window_seconds
+        # endpoint -> [the reset time of the window, count of the calls left]
+        self.windows = {}
+
+    def _get_window(self, endpoint, now):
+        window = self.windows.get(endpoint)
+        if window is None or window[0] <= now:
+            window = [now + self.window_seconds, self.limits.get(endpoint, float('inf'))]
+            self.windows[endpoint] = window
+        return window
+
+    def remaining(self, endpoint, now):
+        """
+        Return the count of the calls left in the window of the 'endpoint'.
+        """
+
+        return self._get_window(endpoint, now)[1]
+
+    def available_at(self, endpoint, now):
+        """
+        Return the time of the next allowed call of the 'endpoint'.
+        """
+
+        reset_at, remaining = self._get_window(endpoint, now)
+        return now if remaining > 0 else reset_at
+
+    def spend(self, endpoint, now):
+        """
+        Count the call of the 'endpoint'.
+        """
+
+        self._get_window(endpoint, now)[1] -= 1
+
+    def exhaust(self, endpoint, now):
+        """
+        Stop the calls of the 'endpoint' until the window reset
+        ('Rate limit exceeded' error, e.g. the calls made by the other clients).
+        """
+
+        self._get_window(endpoint, now)[1] = 0
+
+
+class TwitterApiPool(object):
+    """
+    The pool of the Twitter Api instances of the authorized credentials.
+    Each call is dispatched to the credential with the most calls left
+    in its rate limit window, the pool waits for the earliest window reset
+    only when all the credentials are exhausted.
+    The Api instances with 'rate_limited = False' (the stub) have no budget.
+    """
+
+    def __init__(self, apis):
+        """
+        Arguments:
+            apis {list} -- The Twitter Api instances of the credentials
+        """
+
+        limits = dict(RATE_LIMITS, **getattr(settings, 'TWITTER_RATE_LIMITS', {}))
+        window_seconds = getattr(settings, 'TWITTER_RATE_LIMIT_WAIT', 15 * 60)
+        self.apis = list(apis)
+        self.budgets = [
+            RateBudget(limits if getattr(api, 'rate_limited', True) else {}, window_seconds)
+            for api in self.apis]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.apis)
+
+    def _acquire(self, endpoint):
+        """
+        Return the index of the credential for the call of the 'endpoint'
+        and count the call in its budget.
+        The wait for the window reset is computed under the lock
+        and waited outside it, so the calls of the other endpoints
+        and of the credentials with the calls left aren't blocked.
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                index = min(
+                    range(len(self.apis)),
+                    key=lambda i: (self.budgets[i].available_at(endpoint, now),
+                                   -self.budgets[i].remaining(endpoint, now))
+                )
+                wait = self.budgets[index].available_at(endpoint, now) - now
+                if wait <= 0:
+                    self.budgets[index].spend(endpoint, now)
+                    return index
+
+            metrics.inc('twitter_rate_limit_waits_total', endpoint=endpoint)
+            with metrics.timer('twitter_rate_limit_wait_seconds', endpoint=endpoint):
+                time.sleep(wait)
+
+    def call(self, endpoint, *args, **kwargs):
+        """
+        Call the Twitter API 'endpoint' method with the credential
+        which has the calls left, see call_twitter_api().
+        Each retry of the transient error is counted in the rate limit budget.
+        """
+
+        def call():
+            while True:
+                index = self._acquire(endpoint)
+                metrics.inc('twitter_api_calls_total', endpoint=endpoint)
+                try:
+                    with metrics.timer('twitter_api_call_seconds', endpoint=endpoint):
+                        return getattr(self.apis[index], endpoint)(*args, **kwargs)
+                except twitter.TwitterError as error:
+                    if not is_rate_limit_error(error):
+                        raise
+                    metrics.inc('twitter_rate_limit_errors_total', endpoint=endpoint)
+                    with self.lock:
+                        self.budgets[index].exhaust(endpoint, time.monotonic())
+
+        return call_with_retries(endpoint, call)
+
+    def map(self, endpoint, kwargs_list):
+        """
+        Call the 'endpoint' with each kwargs of the 'kwargs_list'
+        concurrently by the thread per credential.
+
+        Returns:
+            list -- The results in the order of the 'kwargs_list'
+        """
+
+        return self._map(lambda kwargs: self.call(endpoint, **kwargs), kwargs_list)
+
+    def _map(self, function, items):
+        """
+        Call the 'function' (which calls Twitter API) with each of the 'items'
+        concurrently by the thread per credential.
+
+        Returns:
+            list -- The results in the order of the 'items'
+        """
+
+        if len(self.apis) == 1 or len(items) <= 1:
+            return [function(item) for item in items]
+
+        summaries = metrics.current_summary()
+
+        def call(item):
+            with metrics.use_summary(summaries):
+                return function(item)
+
+        with ThreadPoolExecutor(max_workers=len(self.apis)) as executor:
+            return list(executor.map(call, items))
+
+    def _lookup_users_batch(self, user_ids):
+        """
+        Hydrate the single UsersLookup batch, the batch of the suspended
+        and deleted users only ('No user matches' error) is empty.
+        """
+
+        # UsersLookup(user_id=None, screen_name=None, users=None, include_entities=True)
+        # method from 'python-twitter' lib
+        # https://python-twitter.readthedocs.io/en/latest/twitter.html#twitter.api.Api.UsersLookup
+        try:
+            return self.call('UsersLookup', user_id=user_ids)
+        except twitter.TwitterError as error:
+            if not has_error_code(error, (NO_USER_MATCHES_CODE,)):
+                raise
+            return []
+
+    def lookup_users(self, user_ids):
+        """
+        Hydrate the 'user_ids' with the UsersLookup batches
+        of USERS_LOOKUP_BATCH_SIZE dispatched across the credentials.
+
+        Returns:
+            list -- twitter.User objects (without the suspended and deleted users)
+        """
+
+        batches = self._map(self._lookup_users_batch, [
+            user_ids[i:i + USERS_LOOKUP_BATCH_SIZE]
+            for i in range(0, len(user_ids), USERS_LOOKUP_BATCH_SIZE)
+        ])
+        return [tw_user for batch in batches for tw_user in batch]
+
@@ -0,0 +1,129 @@
+"""
+The stub of python-twitter Api for the load tests without Twitter API
+('settings.TWITTER_API_CLASS = "api.twitter_stub.StubTwitterApi"', see api/loadtest.py):
+    1. The synthetic account has 'settings.TWITTER_STUB_FRIENDS_COUNT' friends
+       with IDs from 1, the friends with the even IDs are followers
+    2. The users are generated from their IDs, so the rows seeded
+       by seed_not_followers_tw_friends() match the check with the stub
+    3. Each call waits 'settings.TWITTER_STUB_LATENCY' seconds (the network latency)
+    4. The friendships destroyed by DestroyFriendship are kept in the process
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+
+# IDs of the friends unfollowed by DestroyFriendship in this process
+_unfollowed_ids = set()
+_unfollowed_ids_lock = threading.Lock()
+
+
+def get_stub_friends_count():
+    """
+    Returns:
+        int -- Count of the friends of the synthetic account
+    """
+
+    return getattr(settings, 'TWITTER_STUB_FRIENDS_COUNT', 2000)
+
+
+def is_stub_follower(user_id):
+    """
+    Check whether the friend with the 'user_id' is the follower of the synthetic account.
+    """
+
+    return user_id % 2 == 0
+
+
+def make_stub_user(user_id):
+    """
+    Return the synthetic user with the attributes of twitter.User object
+    used by the check.
+    """
+
+    return SimpleNamespace(
+        id=user_id,
+        id_str=str(user_id),
+        screen_name='stub_%s' % user_id,
+        name='Stub User #%s' % user_id,
+        description='',
+        statuses_count=user_id % 5000,
+        followers_count=user_id % 1000,
+        friends_count=user_id % 700 + 1,
+        created_at='Mon Jan 01 00:00:00 +0000 2018',
+        location='',
+    )
+
+
+def get_stub_user_id(screen_name):
+    """
+    Return the ID of the synthetic user with the 'screen_name' or None.
+    """
+
+    prefix, _, user_id = screen_name.partition('_')
+    return int(user_id) if prefix == 'stub' and user_id.isdigit() else None
+
+
+class StubTwitterApi(object):
+    """
+    The stub of twitter.Api with the endpoints used by the check, the targeted check
+    and the unfollow.
+    """
+
+    # The rate limits of Twitter API don't apply to the stub (see TwitterApiPool)
+    rate_limited = False
+
+    def __init__(self, **credential):
+        """
+        Arguments:
+            **credential -- The authentication data (not used)
+        """
+
+        self.latency = getattr(settings, 'TWITTER_STUB_LATENCY', 0)
+
+    def _is_friend(self, user_id):
+        return 0 < user_id <= get_stub_friends_count() and user_id not in _unfollowed_ids
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def GetFollowerIDsPaged(self, cursor=-1, count=5000, **kwargs):
+        self._wait()
+        first_id = 1 if cursor == -1 else cursor
+        last_id = min(first_id + count, get_stub_friends_count() + 1)
+        next_cursor = last_id if last_id <= get_stub_friends_count() else 0
+        return next_cursor, 0, [
+            user_id for user_id in range(first_id, last_id) if is_stub_follower(user_id)]
+
+    def GetFriendIDsPaged(self, cursor=-1, count=5000, **kwargs):
+        self._wait()
+        first_id = 1 if cursor == -1 else cursor
+        last_id = min(first_id + count, get_stub_friends_count() + 1)
+        next_cursor = last_id if last_id <= get_stub_friends_count() else 0
+        return next_cursor, 0, [
+            user_id for user_id in range(first_id, last_id) if self._is_friend(user_id)]
+
+    def UsersLookup(self, user_id=None, **kwargs):
+        self._wait()
+        return [make_stub_user(user_id_) for user_id_ in user_id or () if self._is_friend(user_id_)]
+
+    def LookupFriendship(self, user_id=None, screen_name=None, **kwargs):
+        self._wait()
+        user_ids = list(user_id or ()) + [
+            get_stub_user_id(screen_name_) for screen_name_ in screen_name or ()]
+        return [
+            SimpleNamespace(
+                id=user_id_, screen_name='stub_%s' % user_id_, name='Stub User #%s' % user_id_,
+                following=self._is_friend(user_id_), followed_by=is_stub_follower(user_id_))
+            for user_id_ in user_ids
+            if user_id_ is not None and 0 < user_id_ <= get_stub_friends_count()
+        ]
+
+    def DestroyFriendship(self, user_id=None, screen_name=None, **kwargs):
+        self._wait()
+        user_id = user_id if user_id is not None else get_stub_user_id(screen_name)
+        with _unfollowed_ids_lock:
+            _unfollowed_ids.add(int(user_id))
+        return make_stub_user(int(user_id))
@@ -1,45 +1,116 @@
 """
 Unfollow (destroy friendships in Twitter API)
 the existing friends who aren't followers for Twitter account
+within the unfollow budgets (through the unfollow queue, see api/unfollow_queue.py)
 """
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-import twitter
-from .models import NotFollowerTwFriend
+from django.db import transaction
+
+from . import changes, metrics, stats
+from .db_routers import unpin
+from .models import NotFollowerTwFriend, TwFriendsRun
+from .twitter_api import get_twitter_api, call_twitter_api
+from .unfollow_queue import enqueue_need_unfollow, unfollow_pending_items
+
+# Max count of 'id_str' values in the single DELETE query
+DELETE_CHUNK_SIZE = 500
+
+def unfollow_tw_friends(run=None):
+    """
+    Unfollow the existing friends who aren't followers, and have 'need_unfollow = True'
+    field value, within the unfollow budgets (see api/unfollow_queue.py):
+    1. Enqueue all of them in the priority order (replacing the pending queue items)
+    2. Drain the queue within the remaining daily and per-window budgets:
+       unfollow with Twitter API (destroy friendships in Twitter API)
+       and delete the unfollowed NotFollowerTwFriend objects from db,
+       the rest stay in the queue for the next unfollow or the drain,
+       the run fails with the first error of the failed unfollows
+
+    The run with the per-run summary of the metrics is stored
+    as a TwFriendsRun object (see api/metrics.py).
+
+    Arguments:
+        run {TwFriendsRun} -- Already created unfollow run (default: {None})
+
+    Returns:
+        dict -- Counts of the 'unfollowed', 'skipped' and 'failed' queue items
+    """
+
+    with metrics.record_run(TwFriendsRun.KIND_UNFOLLOW, run=run):
+        enqueue_need_unfollow()
+        return unfollow_pending_items(raise_error=True)
+
 
-def unfollow_tw_friends():
+def destroy_friendships(id_str_list, errors=None):
     """
-    1. Unfollow with Twitter API the existing friends who aren't followers,
-       and have 'need_unfollow = True' field value
-       from authenticated Twitter account (destroy friendships in Twitter API)
-    2. Delete all unfollow friends as NotFollowerTwFriend objects from db
+    Unfollow the Twitter friends with 'id_str' from 'id_str_list'
+    with DestroyFriendship calls fanned out concurrently
+    by 'settings.TWITTER_UNFOLLOW_CONCURRENCY' threads
+    (each thread has its own Twitter Api instance).
 
     Arguments:
-        None
+        id_str_list {list} -- 'id_str' of the Twitter friends for unfollow
+        errors {dict} -- Filled with the raised errors by 'id_str' (default: {None})
+
+    Returns:
+        tuple -- (list of 'id_str' of the unfollowed Twitter friends,
+                  the first raised error or None)
     """
 
-    # Create a Twitter Api instance.
-    api = twitter.Api(
-        consumer_key=settings.CONSUMER_KEY,
-        consumer_secret=settings.CONSUMER_SECRET,
-        access_token_key=settings.ACCESS_TOKEN,
-        access_token_secret=settings.ACCESS_TOKEN_SECRET
-    )
+    concurrency = getattr(settings, 'TWITTER_UNFOLLOW_CONCURRENCY', 1)
+    summaries = metrics.current_summary()
+    thread_data = threading.local()
+
+    def destroy_friendship(id_str):
+        if not hasattr(thread_data, 'api'):
+            thread_data.api = get_twitter_api()
+        # The worker thread isn't pinned to the primary db by the writes of the other calls
+        unpin()
+        try:
+            with metrics.use_summary(summaries):
+                # DestroyFriendship(user_id=None, screen_name=None) method from 'python-twitter' lib
+                # https://python-twitter.readthedocs.io/en/latest/twitter.html#twitter.api.Api.DestroyFriendship
+                call_twitter_api(thread_data.api, 'DestroyFriendship', int(id_str))
+        finally:
+            unpin()
 
-    # Get all NotFollowerTwFriend objects as queryset
-    queryset = NotFollowerTwFriend.objects.all()
+    unfollowed_id_str_list = []
+    first_error = None
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        futures = [(id_str, executor.submit(destroy_friendship, id_str)) for id_str in id_str_list]
+        for id_str, future in futures:
+            error = future.exception()
+            if error is None:
+                unfollowed_id_str_list.append(id_str)
+                continue
+            if errors is not None:
+                errors[id_str] = error
+            if first_error is None:
+                first_error = error
 
-    # Get NotFollowerTwFriend objects
-    # with 'need_unfollow=True'(not_follower_tw_friends for unfollow)
-    # as filtered queryset
-    queryset = queryset.filter(need_unfollow__exact=True)
+    return unfollowed_id_str_list, first_error
 
-    # Unfollow not_follower_tw_friends with 'need_unfollow = True' field value
-    # from authenticated Twitter account
-    # with DestroyFriendship(user_id=None, screen_name=None) method from 'python-twitter' lib
-    # https://python-twitter.readthedocs.io/en/latest/twitter.html#twitter.api.Api.DestroyFriendship
-    for need_unfollow_tw_friend in queryset:
-        api.DestroyFriendship(int(need_unfollow_tw_friend.id_str))
 
-    # delete NotFollowerTwFriend objects with 'need_unfollow = True' from db
-    NotFollowerTwFriend.objects.filter(need_unfollow__exact=True).delete()
+def delete_unfollowed_tw_friends(unfollowed_id_str_list):
+    """
+    Delete the unfollowed NotFollowerTwFriend objects with 'need_unfollow = True'
+    from db in the chunks of DELETE_CHUNK_SIZE rows
+    (with the update of the summary statistics counters
+    and the tombstones of the changes feed).
+
+    Arguments:
+        unfollowed_id_str_list {list} -- 'id_str' of the unfollowed Twitter friends
+    """
 
+    with metrics.timer('unfollow_span_seconds', span='db_sync'):
+        for i in range(0, len(unfollowed_id_str_list), DELETE_CHUNK_SIZE):
+            chunk_queryset = NotFollowerTwFriend.objects.filter(
+                id_str__in=unfollowed_id_str_list[i:i + DELETE_CHUNK_SIZE],
+                need_unfollow__exact=True)
+            with transaction.atomic():
+                stats.subtract_queryset_stats(chunk_queryset)
+                deleted_count = changes.delete_with_tombstones(chunk_queryset)
+            metrics.inc('unfollow_rows_deleted_total', deleted_count)
@@ -0,0 +1,262 @@
+"""
+The unfollow queue of the Twitter friends who aren't followers:
+    1. Enqueue the NotFollowerTwFriend objects with 'need_unfollow=True'
+       in the order of 'settings.UNFOLLOW_QUEUE_PRIORITY' (e.g. lowest 'tff_ratio' first)
+    2. Drain the queue within the daily budget ('settings.UNFOLLOW_DAILY_BUDGET')
+       and the per-window budget ('settings.UNFOLLOW_WINDOW_BUDGET' unfollows
+       per 'settings.UNFOLLOW_WINDOW_SECONDS'), the budgets are counted
+       by the processed queue items, so they hold across the processes and restarts
+    3. Report the queue depth and the projected completion time
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import NotFollowerTwFriend, TwFriendsRun, UnfollowQueueItem
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def get_budgets():
+    """
+    Returns:
+        tuple -- (daily budget, per-window budget, window seconds)
+    """
+
+    return (
+        getattr(settings, 'UNFOLLOW_DAILY_BUDGET', 400),
+        getattr(settings, 'UNFOLLOW_WINDOW_BUDGET', 50),
+        getattr(settings, 'UNFOLLOW_WINDOW_SECONDS', 15 * 60),
+    )
+
+
+def get_priority_ordering():
+    """
+    Returns:
+        list -- 'order_by' fields of the NotFollowerTwFriend objects in the queue,
+                'id_str' is the last one for the stable order
+    """
+
+    return list(getattr(settings, 'UNFOLLOW_QUEUE_PRIORITY', ['tff_ratio'])) + ['id_str']
+
+
+def enqueue_need_unfollow():
+    """
+    Replace the pending queue items with all the NotFollowerTwFriend objects
+    with 'need_unfollow=True' in the priority order.
+
+    Returns:
+        int -- Count of the pending queue items
+    """
+
+    # The priority may order by 'avg_tweetsperday'
+    rows = NotFollowerTwFriend.objects.with_avg_tweetsperday().filter(
+        need_unfollow=True
+    ).order_by(*get_priority_ordering()).values_list('id_str', 'screen_name')
+
+    with transaction.atomic():
+        UnfollowQueueItem.objects.filter(status=UnfollowQueueItem.STATUS_PENDING).delete()
+        items = UnfollowQueueItem.objects.bulk_create([
+            UnfollowQueueItem(id_str=id_str, screen_name=screen_name, position=position)
+            for position, (id_str, screen_name) in enumerate(rows.iterator(), 1)
+        ])
+
+    return len(items)
+
+
+def _get_processed_since(now, seconds):
+    """
+    Return the queue items which used the budget (the DestroyFriendship call was made)
+    in the last 'seconds' before 'now'.
+    """
+
+    return UnfollowQueueItem.objects.filter(
+        status__in=(UnfollowQueueItem.STATUS_UNFOLLOWED, UnfollowQueueItem.STATUS_FAILED),
+        processed_at__gt=now - timedelta(seconds=seconds),
+    )
+
+
+def get_remaining_budget(now=None):
+    """
+    Return the count of the unfollows allowed right now by the both budgets.
+
+    Arguments:
+        now {datetime} -- The current time (default: {None})
+
+    Returns:
+        int -- The remaining budget
+    """
+
+    now = now or timezone.now()
+    daily_budget, window_budget, window_seconds = get_budgets()
+
+    return max(min(
+        daily_budget - _get_processed_since(now, DAY_SECONDS).count(),
+        window_budget - _get_processed_since(now, window_seconds).count(),
+    ), 0)
+
+
+def get_next_window_at(now=None):
+    """
+    Return the time when the budgets allow the next unfollow.
+
+    Arguments:
+        now {datetime} -- The current time (default: {None})
+
+    Returns:
+        datetime -- 'now' if the budget remains, otherwise the end of the exhausted budget
+    """
+
+    now = now or timezone.now()
+    daily_budget, window_budget, window_seconds = get_budgets()
+
+    next_window_at = now
+    for budget, seconds in ((daily_budget, DAY_SECONDS), (window_budget, window_seconds)):
+        processed = _get_processed_since(now, seconds)
+        used = processed.count()
+        if used >= budget:
+            # The budget is freed when the oldest of the last 'budget' items leaves the window
+            oldest = processed.order_by('-processed_at').values_list(
+                'processed_at', flat=True)[max(budget, 1) - 1]
+            next_window_at = max(next_window_at, oldest + timedelta(seconds=seconds))
+
+    return next_window_at
+
+
+def get_queue_depth():
+    """
+    Returns:
+        int -- Count of the pending queue items
+    """
+
+    return UnfollowQueueItem.objects.filter(status=UnfollowQueueItem.STATUS_PENDING).count()
+
+
+def get_queue_status(now=None):
+    """
+    Return the queue depth and the projected completion time.
+    The completion is projected with the steady rate of 'window budget' unfollows
+    per window, stretched to keep within the daily budget.
+
+    Arguments:
+        now {datetime} -- The current time (default: {None})
+
+    Returns:
+        dict -- The queue status
+    """
+
+    now = now or timezone.now()
+    daily_budget, window_budget, window_seconds = get_budgets()
+
+    depth = get_queue_depth()
+    remaining_budget = get_remaining_budget(now)
+    next_window_at = get_next_window_at(now)
+
+    projected_completion_at = None
+    if depth <= remaining_budget:
+        projected_completion_at = now
+    elif window_budget > 0 and daily_budget > 0:
+        interval = max(window_seconds, DAY_SECONDS * window_budget / daily_budget)
+        windows = math.ceil((depth - remaining_budget) / window_budget)
+        projected_completion_at = max(next_window_at, now + timedelta(seconds=interval)) + \
+            timedelta(seconds=interval * (windows - 1))
+
+    return {
+        'depth': depth,
+        'daily_budget': daily_budget,
+        'window_budget': window_budget,
+        'window_seconds': window_seconds,
+        'remaining_budget': remaining_budget,
+        'next_window_at': next_window_at,
+        'projected_completion_at': projected_completion_at,
+    }
+
+
+def drain_unfollow_queue(run=None):
+    """
+    Unfollow the pending queue items in the priority order within the remaining budget
+    (recorded as an unfollow TwFriendsRun object, see unfollow_pending_items()).
+
+    Arguments:
+        run {TwFriendsRun} -- Already created unfollow run (default: {None})
+
+    Returns:
+        dict -- Counts of the 'unfollowed', 'skipped' and 'failed' queue items
+    """
+
+    budget = get_remaining_budget()
+    if budget == 0 or not UnfollowQueueItem.objects.filter(
+            status=UnfollowQueueItem.STATUS_PENDING).exists():
+        return {'unfollowed': 0, 'skipped': 0, 'failed': 0}
+
+    with metrics.record_run(TwFriendsRun.KIND_UNFOLLOW, run=run):
+        return unfollow_pending_items(budget)
+
+
+def unfollow_pending_items(budget=None, raise_error=False):
+    """
+    Unfollow the pending queue items in the priority order within the budget:
+        1. Skip the items of the Twitter friends who are already deleted
+           or kept ('need_unfollow=False') since the enqueue
+        2. Unfollow the rest with the concurrent DestroyFriendship calls
+        3. Delete the unfollowed NotFollowerTwFriend objects from db
+
+    Arguments:
+        budget {int} -- Max count of the items, None is the remaining budget
+                        (default: {None})
+        raise_error {bool} -- Raise the first error of the failed queue items
+                              after their status is stored (default: {False})
+
+    Returns:
+        dict -- Counts of the 'unfollowed', 'skipped' and 'failed' queue items
+    """
+
+    # The unfollow imports python-twitter, so it isn't imported with the queue status views
+    from .unfollow_not_followers_tw_friends import delete_unfollowed_tw_friends, \
+        destroy_friendships
+
+    if budget is None:
+        budget = get_remaining_budget()
+    pending = UnfollowQueueItem.objects.filter(status=UnfollowQueueItem.STATUS_PENDING)
+    items = list(pending.order_by('position')[:budget])
+
+    need_unfollow_id_str_set = set(NotFollowerTwFriend.objects.filter(
+        id_str__in=[item.id_str for item in items], need_unfollow=True
+    ).values_list('id_str', flat=True))
+    skipped_ids = [item.pk for item in items if item.id_str not in need_unfollow_id_str_set]
+    items = [item for item in items if item.id_str in need_unfollow_id_str_set]
+
+    errors = {}
+    unfollowed_id_str_list, first_error = destroy_friendships(
+        [item.id_str for item in items], errors=errors)
+    delete_unfollowed_tw_friends(unfollowed_id_str_list)
+
+    now = timezone.now()
+    UnfollowQueueItem.objects.filter(pk__in=skipped_ids).update(
+        status=UnfollowQueueItem.STATUS_SKIPPED, processed_at=now)
+    UnfollowQueueItem.objects.filter(pk__in=[
+        item.pk for item in items if item.id_str not in errors
+    ]).update(status=UnfollowQueueItem.STATUS_UNFOLLOWED, processed_at=now)
+    for item in items:
+        if item.id_str in errors:
+            item.status = UnfollowQueueItem.STATUS_FAILED
+            item.processed_at = now
+            item.error = str(errors[item.id_str])
+            item.save(update_fields=['status', 'processed_at', 'error'])
+
+    result = {
+        'unfollowed': len(items) - len(errors),
+        'skipped': len(skipped_ids),
+        'failed': len(errors),
+    }
+    for status, count in result.items():
+        metrics.inc('unfollow_queue_items_total', count, status=status)
+
+    if raise_error and first_error is not None:
+        raise first_error
+
+    return result
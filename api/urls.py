@@ -4,8 +4,12 @@ from rest_framework.schemas import get_schema_view
 from rest_framework.documentation import include_docs_urls
 
 from . import views
+from .models import TwFriendsRun
+from .schema import CachedSchemaGenerator, DOCS_TITLE, SCHEMA_TITLE
 
-schema_view = get_schema_view(title='avt_checktwfriends API schema')
+# The schema is generated once per process or loaded from
+# the pre-generated schema file (see api/schema.py)
+schema_view = get_schema_view(title=SCHEMA_TITLE, generator_class=CachedSchemaGenerator)
 
 urlpatterns = [
 
@@ -22,7 +26,8 @@ urlpatterns = [
     # Generate schema with valid `request` instance.
     url(
         regex=r'^api/v1/docs/',
-        view=include_docs_urls(title='avt_checktwfriends API docs', public=False),
+        view=include_docs_urls(
+            title=DOCS_TITLE, public=False, generator_class=CachedSchemaGenerator),
         name='get_api_docs'
     ),
 
@@ -44,6 +49,24 @@ urlpatterns = [
         name='get_not_followers_tw_friends_check'
     ),
 
+    # /api/v1/not_followers_tw_friends/check/stream/
+    # Start a check and stream the found Twitter friends who aren't followers
+    # and the progress of the check as server-sent events.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/check/stream/$',
+        view=views.NotFollowersTwFriendsCheckStream.as_view(),
+        name='get_not_followers_tw_friends_check_stream'
+    ),
+
+    # /api/v1/not_followers_tw_friends/check/friendships/
+    # Check the relationships of the given Twitter users (screen names or IDs)
+    # and update only their NotFollowerTwFriend objects.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/check/friendships/$',
+        view=views.NotFollowersTwFriendsCheckFriendships.as_view(),
+        name='post_not_followers_tw_friends_check_friendships'
+    ),
+
     # /api/v1/not_followers_tw_friends/need_unfollow/
     # Return a list of all the existing Twitter friends who aren't followers
     # and selected for unfollow ('need_unfollow' field value is True).
@@ -64,6 +87,15 @@ urlpatterns = [
         name='patch_not_followers_tw_friends_need_unfollow_update'
     ),
 
+    # /api/v1/not_followers_tw_friends/need_unfollow/import/
+    # Import the keep/unfollow decisions ('need_unfollow' field values)
+    # from the uploaded CSV or NDJSON file.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/need_unfollow/import/$',
+        view=views.NotFollowersTwFriendsNeedUnfollowImport.as_view(),
+        name='post_not_followers_tw_friends_need_unfollow_import'
+    ),
+
     # /api/v1/not_followers_tw_friends/unfollow/
     # Unfollow 'not_followers_tw_friends' with 'need_unfollow=True'
     # and return a list of all the existing Twitter friends
@@ -72,5 +104,153 @@ urlpatterns = [
         regex=r'^api/v1/not_followers_tw_friends/unfollow/$',
         view=views.NotFollowersTwFriendsUnfollow.as_view(),
         name='delete_not_followers_tw_friends_unfollow'
+    ),
+
+    # /api/v1/not_followers_tw_friends/export/(csv|ndjson|parquet)/
+    # Export all the existing Twitter friends who aren't followers
+    # as CSV, NDJSON or Parquet file.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/export/(?P<export_format>csv|ndjson|parquet)/$',
+        view=views.NotFollowersTwFriendsExport.as_view(),
+        name='get_not_followers_tw_friends_export'
+    ),
+
+    # /api/v1/not_followers_tw_friends/stats/
+    # Return the summary statistics (counts and histograms)
+    # of the Twitter friends who aren't followers.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/stats/$',
+        view=views.NotFollowersTwFriendsStats.as_view(),
+        name='get_not_followers_tw_friends_stats'
+    ),
+
+    # /api/v1/not_followers_tw_friends/changes/
+    # Return the created, updated and deleted Twitter friends who aren't followers
+    # since the version synced by the API mirror ('?since=<version>').
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/changes/$',
+        view=views.NotFollowersTwFriendsChanges.as_view(),
+        name='get_not_followers_tw_friends_changes'
+    ),
+
+    # /api/v1/unfollow_queue/
+    # Return the depth and the projected completion time of the unfollow queue (GET),
+    # or enqueue the Twitter friends with 'need_unfollow=True' in the priority order (POST).
+    url(
+        regex=r'^api/v1/unfollow_queue/$',
+        view=views.UnfollowQueue.as_view(),
+        name='unfollow_queue'
+    ),
+
+    # /api/v1/auto_classification_rules/
+    # Return a list of the keep rules or create a new keep rule.
+    url(
+        regex=r'^api/v1/auto_classification_rules/$',
+        view=views.AutoClassificationRules.as_view(),
+        name='auto_classification_rules'
+    ),
+
+    # /api/v1/auto_classification_rules/preview/
+    # Return how many Twitter friends who aren't followers each keep rule would affect.
+    url(
+        regex=r'^api/v1/auto_classification_rules/preview/$',
+        view=views.AutoClassificationRulesPreview.as_view(),
+        name='get_auto_classification_rules_preview'
+    ),
+
+    # /api/v1/auto_classification_rules/rule_id/
+    # Return, update or delete the keep rule.
+    url(
+        regex=r'^api/v1/auto_classification_rules/(?P<pk>[0-9]+)/$',
+        view=views.AutoClassificationRuleDetail.as_view(),
+        name='auto_classification_rule'
+    ),
+
+    # /api/v1/profiles/
+    # Return a list of the stored profiles of the API requests
+    # captured with 'X-Profile: 1' header or '?profile=1' query param (staff only).
+    url(
+        regex=r'^api/v1/profiles/$',
+        view=views.RequestProfiles.as_view(),
+        name='get_request_profiles'
+    ),
+
+    # /api/v1/profiles/profile_id/
+    # Return the profile of the API request with the slowest functions,
+    # the SQL queries and the Twitter API calls (staff only).
+    url(
+        regex=r'^api/v1/profiles/(?P<pk>[0-9]+)/$',
+        view=views.RequestProfileDetail.as_view(),
+        name='get_request_profile'
+    ),
+
+    # /api/v1/profiles/profile_id/pstats/
+    # Return the cProfile stats of the API request as a file for pstats (staff only).
+    url(
+        regex=r'^api/v1/profiles/(?P<pk>[0-9]+)/pstats/$',
+        view=views.RequestProfileStats.as_view(),
+        name='get_request_profile_stats'
+    ),
+
+    # /api/v1/runs/
+    # Return a list of the check and unfollow runs
+    # with the per-run summary of the metrics.
+    url(
+        regex=r'^api/v1/runs/$',
+        view=views.TwFriendsRuns.as_view(),
+        name='get_tw_friends_runs'
+    ),
+
+    # /api/v1/runs/run_id/
+    # Return the status of the check or unfollow run
+    # with the per-run summary of the metrics.
+    url(
+        regex=r'^api/v1/runs/(?P<pk>[0-9]+)/$',
+        view=views.TwFriendsRunDetail.as_view(),
+        name='get_tw_friends_run'
+    ),
+
+    # /api/v1/not_followers_tw_friends/check/start/
+    # Start a check in the background and return the run
+    # without waiting for the end of the check.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/check/start/$',
+        view=views.TwFriendsRunStart.as_view(kind=TwFriendsRun.KIND_CHECK),
+        name='post_not_followers_tw_friends_check_start'
+    ),
+
+    # /api/v1/not_followers_tw_friends/unfollow/start/
+    # Start an unfollow in the background and return the run
+    # without waiting for the end of the unfollow.
+    url(
+        regex=r'^api/v1/not_followers_tw_friends/unfollow/start/$',
+        view=views.TwFriendsRunStart.as_view(kind=TwFriendsRun.KIND_UNFOLLOW),
+        name='post_not_followers_tw_friends_unfollow_start'
+    ),
+
+    # /api/v1/metrics/
+    # Return the instrumentation metrics of the check and unfollow runs
+    # in the Prometheus text format.
+    url(
+        regex=r'^api/v1/metrics/$',
+        view=views.Metrics.as_view(),
+        name='get_metrics'
+    ),
+
+    # /api/v1/signed_token/
+    # Create (POST) or revoke (DELETE) the short-lived signed API token.
+    url(
+        regex=r'^api/v1/signed_token/$',
+        view=views.SignedToken.as_view(),
+        name='signed_token'
+    ),
+
+    # /api/v1/activity/webhook/
+    # The webhook of the account activity events (GET answers the CRC challenge,
+    # POST queues the signed events for the incremental update).
+    url(
+        regex=r'^api/v1/activity/webhook/$',
+        view=views.ActivityWebhook.as_view(),
+        name='activity_webhook'
     )
 ]
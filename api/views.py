@@ -1,16 +1,48 @@
+import io
+import tempfile
+
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 from rest_framework import status
 
-from .models import NotFollowerTwFriend
-from .serializers import NotFollowerTwFriendSerializer
-from .check_not_followers_tw_friends import check_tw_friends
-from .unfollow_not_followers_tw_friends import unfollow_tw_friends
+from . import activity_events
+from . import authentication
+from . import changes
+from . import export
+from . import metrics
+from . import runs
+from . import stats
+from . import unfollow_queue
+from .auto_classification import preview_auto_classification_rules
+from .mixins import ColumnarListMixin, SparseFieldsMixin
+from .import_need_unfollow_decisions import IMPORT_FORMATS, import_need_unfollow_decisions
+from .models import AutoClassificationRule, NotFollowerTwFriend, RequestProfile, TwFriendsRun
+from .renderers import EventStreamRenderer
+from .serializers import AutoClassificationRuleSerializer, NotFollowerTwFriendSerializer, \
+    RequestProfileSerializer, TwFriendsRunSerializer, TwFriendshipsCheckSerializer
 
 # Create your views here.
 
-class NotFollowersTwFriends(generics.ListAPIView):
+def run_failed_response(run):
+    """
+    Return 502 Bad Gateway response of the failed check or unfollow run
+    with the 'error' of the run (see runs.get_run_error()).
+    """
+
+    return Response({'detail': 'The %s run #%s has failed.' % (run.kind, run.pk),
+                     'error': runs.get_run_error(run)},
+                    status=status.HTTP_502_BAD_GATEWAY)
+
+
+class NotFollowersTwFriends(ColumnarListMixin, generics.ListAPIView):
     """
     Return a list of all the existing Twitter friends who aren't followers.
     """
@@ -27,7 +59,7 @@ class NotFollowersTwFriends(generics.ListAPIView):
             QuerySet object(s) -- Returning all NotFollowerTwFriend objects
                                   from this view.
         """
-        queryset = NotFollowerTwFriend.objects.all()
+        queryset = NotFollowerTwFriend.objects.with_avg_tweetsperday()
 
         return queryset
 
@@ -46,11 +78,10 @@ class NotFollowersTwFriends(generics.ListAPIView):
 
         # Note the use of `get_queryset()` instead of `self.queryset`
         queryset = self.get_queryset()
-        serializer = NotFollowerTwFriendSerializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.list_response(queryset)
 
 
-class NotFollowersTwFriendsCheck(generics.ListAPIView):
+class NotFollowersTwFriendsCheck(ColumnarListMixin, generics.ListAPIView):
     """
     Return an updated list(after check) of all the existing Twitter friends
     who aren't followers.
@@ -68,7 +99,7 @@ class NotFollowersTwFriendsCheck(generics.ListAPIView):
             QuerySet objects  -- Returning all NotFollowerTwFriend objects
                                  from this view.
         """
-        queryset = NotFollowerTwFriend.objects.all()
+        queryset = NotFollowerTwFriend.objects.with_avg_tweetsperday()
 
         return queryset
 
@@ -76,33 +107,198 @@ class NotFollowersTwFriendsCheck(generics.ListAPIView):
         """
         This method performs the following main tasks:
         1. Analysis with Twitter API the existing friends who aren't followers for Twitter account
-        2. Count the average number of tweets per day
+        2. Count the day of the account creation
         3. Count the TFF Ratio (Twitter Follower-Friend Ratio)
         4. Synchronization (Create, Update, Destroy) the NotFollowerTwFriend objects
+        With '?deadline_ms=' or '?continuation=' the check is bounded
+        by the deadline (see list_until_deadline()).
 
         Arguments:
-            request {Request} -- Not using
+            request {Request} -- 'deadline_ms' and 'continuation' query params
 
         Returns:
             Response object {TemplateResponse} -- An updated list of
                                                 the NotFollowerTwFriend objects
-                                                who aren't followers
+                                                who aren't followers,
+                                                502 Bad Gateway for the failed
+                                                attached check
         """
 
+        deadline_ms = request.query_params.get('deadline_ms')
+        continuation = request.query_params.get('continuation')
+        if deadline_ms is not None or continuation is not None:
+            return self.list_until_deadline(deadline_ms, continuation)
+
         # 1. Analysis with Twitter API the existing friends who aren't followers for Twitter account
-        # 2. Count the average number of tweets per day
+        # 2. Count the day of the account creation
         # 3. Count the TFF Ratio (Twitter Follower-Friend Ratio)
         # 4. Synchronization (Create, Update, Destroy) the NotFollowerTwFriend objects
-        check_tw_friends()
+        # The concurrent requests attach to the check in progress,
+        # the request within 'settings.API_CHECK_MIN_INTERVAL' seconds
+        # after the last check returns its result (see api/runs.py)
+        try:
+            runs.run_single_flight(TwFriendsRun.KIND_CHECK)
+        except runs.RunFailedError as error:
+            return run_failed_response(error.run)
 
         # 5. An updated list of the NotFollowerTwFriend objects who aren't followers.
         queryset = self.get_queryset()
-        serializer = NotFollowerTwFriendSerializer(queryset, many=True)
 
-        return Response(serializer.data)
+        return self.list_response(queryset)
+
+    def list_until_deadline(self, deadline_ms, continuation):
+        """
+        Start the check in the background (or attach to the check in progress,
+        or continue the check of the 'continuation' token) and wait for its end
+        until the deadline. After the deadline the not-followers confirmed
+        by the check so far (already stored in db) are returned as the partial list
+        with 'X-Check-Partial: true' and the 'X-Check-Continuation' token header,
+        the check keeps running in the background. The request with
+        '?continuation=<token>' waits for the same check, and returns the full
+        updated list ('X-Check-Partial: false') after its end.
+
+        Arguments:
+            deadline_ms {str} -- Milliseconds of the wait ('?deadline_ms='),
+                                 without it the request waits for the end of the check
+            continuation {str} -- The continuation token of the previous partial
+                                  response ('?continuation=')
+
+        Returns:
+            Response object {TemplateResponse} -- The partial or the full list,
+                                                  400 Bad Request for the invalid params
+                                                  or for the new check with the deadline
+                                                  without the runs in the background,
+                                                  502 Bad Gateway with the 'error'
+                                                  of the failed check
+        """
+
+        try:
+            timeout = int(deadline_ms) / 1000.0 if deadline_ms is not None else None
+        except ValueError:
+            timeout = 0
+        if timeout is not None and timeout <= 0:
+            return Response({'detail': '"deadline_ms" must be a positive integer.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if continuation is None and timeout is not None and not runs.runs_in_background():
+            # The new check would run to its end in this request thread
+            return Response({'detail': '"deadline_ms" requires the runs in the background '
+                                       '(API_RUNS_IN_BACKGROUND setting).'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if continuation is not None:
+            run = runs.parse_continuation(continuation, TwFriendsRun.KIND_CHECK)
+            if run is None:
+                return Response({'detail': 'Invalid "continuation" token.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        else:
+            run = runs.start_run(TwFriendsRun.KIND_CHECK)
+
+        run = runs.wait_for_run(run, timeout=timeout)
+        if run.status == TwFriendsRun.STATUS_FAILED:
+            return run_failed_response(run)
+
+        if run.status == TwFriendsRun.STATUS_RUNNING:
+            # The rows are flushed to db in chunks while the check runs
+            # (see NotFollowersTwFriendsSync), the flushed ones are marked with the run
+            response = self.list_response(self.get_queryset().filter(last_seen_run=run.pk))
+            response['X-Check-Partial'] = 'true'
+            response['X-Check-Continuation'] = str(run.pk)
+            return response
+
+        response = self.list_response(self.get_queryset())
+        response['X-Check-Partial'] = 'false'
+        return response
+
+
+class NotFollowersTwFriendsCheckStream(APIView):
+    """
+    Start a check of all the existing Twitter friends who aren't followers,
+    and stream the found not-followers and the progress of the check
+    as server-sent events.
+    """
+
+    permission_classes = (IsAuthenticated, )
+    renderer_classes = (EventStreamRenderer, JSONRenderer)
+
+    def get(self, request):
+        """
+        Stream the events of the check run as server-sent events:
+            'not_follower' -- the found not-follower (serialized NotFollowerTwFriend object)
+            'progress' -- pages fetched, friends analyzed and not-followers found
+            'done' or 'error' -- the final event of the check run
+
+        The event ID is '<run_id>:<seq>'. The reconnecting client sends the last
+        received event ID as 'Last-Event-ID' header (or 'last_event_id' query param),
+        and receives the events of the same check run after this event,
+        otherwise a new check run is started.
+
+        Arguments:
+            request {Request} -- 'Last-Event-ID' header is used for the reconnect
+
+        Returns:
+            StreamingHttpResponse object -- 'text/event-stream' response
+        """
+
+        last_event_id = runs.parse_last_event_id(
+            request.META.get('HTTP_LAST_EVENT_ID') or
+            request.query_params.get('last_event_id'))
+
+        if last_event_id is not None \
+                and TwFriendsRun.objects.filter(pk=last_event_id[0]).exists():
+            run_id, after_seq = last_event_id
+        else:
+            run_id, after_seq = runs.start_run(TwFriendsRun.KIND_CHECK).pk, 0
+
+        response = StreamingHttpResponse(
+            runs.iter_run_events_sse(run_id, after_seq),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Disable the response buffering in the nginx proxy
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
+
+
+class NotFollowersTwFriendsCheckFriendships(APIView):
+    """
+    Check the relationships of the given Twitter users with Twitter account
+    and update only their NotFollowerTwFriend objects.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def post(self, request):
+        """
+        Check the users selected by the 'screen_names' and 'ids' lists
+        and by the 'need_unfollow' field value of the existing
+        NotFollowerTwFriend objects with the LookupFriendship batches
+        of 100 users (see api/check_tw_friendships.py).
+
+        Arguments:
+            request {Request object} -- request.data attribute handles 'screen_names',
+                                        'ids' and 'need_unfollow'
+
+        Returns:
+            Response object {TemplateResponse} -- The report with the counts
+                                                  of the kept, updated, created
+                                                  and deleted objects,
+                                                  400 Bad Request for the invalid users
+        """
+
+        serializer = TwFriendshipsCheckSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # The check imports python-twitter, so it isn't imported with the views
+        from .check_tw_friendships import check_tw_friendships
 
+        return Response(check_tw_friendships(
+            screen_names=serializer.validated_data['screen_names'],
+            ids=serializer.validated_data['ids']))
 
-class NotFollowersTwFriendsNeedUnfollow(generics.ListAPIView):
+
+class NotFollowersTwFriendsNeedUnfollow(ColumnarListMixin, generics.ListAPIView):
     """
     Return a list of all the existing Twitter friends who aren't followers
     and selected for unfollow ('need_unfollow' field value is True).
@@ -123,7 +319,7 @@ class NotFollowersTwFriendsNeedUnfollow(generics.ListAPIView):
                                   as filtered queryset from this view
         """
 
-        queryset = NotFollowerTwFriend.objects.all()
+        queryset = NotFollowerTwFriend.objects.with_avg_tweetsperday()
         queryset = queryset.filter(need_unfollow__exact=True)
 
         return queryset
@@ -143,9 +339,8 @@ class NotFollowersTwFriendsNeedUnfollow(generics.ListAPIView):
         """
 
         queryset = self.get_queryset()
-        serializer = NotFollowerTwFriendSerializer(queryset, many=True)
 
-        return Response(serializer.data)
+        return self.list_response(queryset)
 
 
 class NotFollowersTwFriendsNeedUnfollowUpdate(generics.UpdateAPIView):
@@ -186,8 +381,68 @@ class NotFollowersTwFriendsNeedUnfollowUpdate(generics.UpdateAPIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def perform_update(self, serializer):
+        """
+        Save the instance with the next version of the changes feed (see api/changes.py)
+        and update the summary statistics counters by the delta of the changed row
+        (see api/stats.py).
+
+        Arguments:
+            serializer {NotFollowerTwFriendSerializer} -- The validated serializer
+        """
+
+        stats_delta = stats.StatsDelta()
+        stats_delta.remove_row(serializer.instance)
+        with transaction.atomic():
+            stats_delta.add_row(serializer.save(version=changes.allocate_version()))
+            stats.apply_stats_delta(stats_delta)
+
+
+class NotFollowersTwFriendsNeedUnfollowImport(APIView):
+    """
+    Import the keep/unfollow decisions ('need_unfollow' field values)
+    for the Twitter friends who aren't followers from CSV or NDJSON file.
+    """
+
+    permission_classes = (IsAuthenticated, )
+    parser_classes = (MultiPartParser, )
+
+    def post(self, request):
+        """
+        Import the decisions from the uploaded 'file'
+        (see api/import_need_unfollow_decisions.py).
+        The format is 'import_format' field value ('csv' or 'ndjson'),
+        or the extension of the file name.
+
+        Arguments:
+            request {Request object} -- request.data attribute handles 'file'
+                                        and 'import_format'
+
+        Returns:
+            Response object {TemplateResponse} -- The import report with the counts
+                                                  of the updated objects,
+                                                  the unmatched decisions
+                                                  and the invalid lines
+        """
+
+        uploaded_file = request.data.get('file')
+        if uploaded_file is None:
+            return Response({'file': ['No file was submitted.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        import_format = request.data.get('import_format') or \
+            uploaded_file.name.rsplit('.', 1)[-1].lower().replace('jsonl', 'ndjson')
+        if import_format not in IMPORT_FORMATS:
+            return Response({'import_format': ['Must be "csv" or "ndjson".']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        text_file = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+        report = import_need_unfollow_decisions(text_file, import_format)
+
+        return Response(report)
+
 
-class NotFollowersTwFriendsUnfollow(generics.DestroyAPIView):
+class NotFollowersTwFriendsUnfollow(ColumnarListMixin, generics.DestroyAPIView):
     """
     Unfollow (destroy friendships in Twitter API) all the existing Twitter friends
     who aren't followers and selected for unfollow ('need_unfollow' field value is True).
@@ -209,7 +464,7 @@ class NotFollowersTwFriendsUnfollow(generics.DestroyAPIView):
                                     as filtered queryset from this view
         """
 
-        queryset = NotFollowerTwFriend.objects.all()
+        queryset = NotFollowerTwFriend.objects.with_avg_tweetsperday()
         queryset = queryset.filter(need_unfollow__exact=False)
 
         return queryset
@@ -232,18 +487,499 @@ class NotFollowersTwFriendsUnfollow(generics.DestroyAPIView):
                                                     NotFollowerTwFriend objects
                                                     with 'need_unfollow=False'
                                                     (not_followers_tw_friends for not unfollow)
-                                                    as serializer.data
+                                                    as serializer.data,
+                                                    'X-Unfollow-Pending' header has the count
+                                                    of the friends left in the unfollow queue
+                                                    by the exhausted budgets,
+                                                    502 Bad Gateway for the failed
+                                                    attached unfollow
         """
 
         # 1. Unfollow with Twitter API the existing friends who aren't followers,
         #    and have 'need_unfollow = True' field value
         #    from authenticated Twitter account (destroy friendships in Twitter API)
+        #    within the daily and per-window budgets (see api/unfollow_queue.py)
         # 2. Delete all unfollow friends as NotFollowerTwFriend objects from db
-        unfollow_tw_friends()
+        # The concurrent requests attach to the unfollow in progress (see api/runs.py)
+        try:
+            runs.run_single_flight(TwFriendsRun.KIND_UNFOLLOW)
+        except runs.RunFailedError as error:
+            return run_failed_response(error.run)
 
         # All remaining after delete from db NotFollowerTwFriend objects
         # with 'need_unfollow=False'
         queryset = self.get_queryset()
-        serializer = NotFollowerTwFriendSerializer(queryset, many=True)
 
-        return Response(serializer.data)
+        response = self.list_response(queryset)
+        response['X-Unfollow-Pending'] = str(unfollow_queue.get_queue_depth())
+        return response
+
+
+class NotFollowersTwFriendsExport(APIView):
+    """
+    Export all the existing Twitter friends who aren't followers
+    as CSV, NDJSON or Parquet file.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request, export_format):
+        """
+        Stream the export of all the NotFollowerTwFriend objects
+        (see api/export.py), the memory stays flat for any size of the table.
+
+        Arguments:
+            request {Request} -- Not using
+            export_format {str} -- 'csv', 'ndjson' or 'parquet'
+
+        Returns:
+            StreamingHttpResponse or FileResponse object -- The export file
+            (501 Not Implemented without the optional 'pyarrow' package of Parquet)
+        """
+
+        filename = 'not_followers_tw_friends.%s' % export_format
+
+        if export_format == 'parquet' and not export.is_parquet_available():
+            return Response({'detail': export.PARQUET_UNAVAILABLE_MESSAGE},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        if export_format == 'parquet':
+            # Parquet footer is written at the end of the file,
+            # so the file is written to the disk-backed temporary file first
+            parquet_file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+            export.write_parquet(parquet_file)
+            parquet_file.seek(0)
+            response = FileResponse(parquet_file, content_type=export.CONTENT_TYPES['parquet'])
+        else:
+            response = StreamingHttpResponse(
+                export.iter_export(export_format),
+                content_type=export.CONTENT_TYPES[export_format]
+            )
+
+        response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+
+        return response
+
+
+class AutoClassificationRules(SparseFieldsMixin, generics.ListCreateAPIView):
+    """
+    Return a list of the keep rules, which set 'need_unfollow=False'
+    for the matching Twitter friends who aren't followers after each check,
+    or create a new keep rule.
+    """
+
+    queryset = AutoClassificationRule.objects.all()
+    permission_classes = (IsAuthenticated, )
+    serializer_class = AutoClassificationRuleSerializer
+    field_sources = {'rule': ('field', 'operator', 'value')}
+
+
+class AutoClassificationRuleDetail(generics.RetrieveUpdateDestroyAPIView):
+    """
+    Return, update or delete the keep rule.
+    """
+
+    queryset = AutoClassificationRule.objects.all()
+    permission_classes = (IsAuthenticated, )
+    serializer_class = AutoClassificationRuleSerializer
+
+
+class AutoClassificationRulesPreview(APIView):
+    """
+    Return how many Twitter friends who aren't followers each keep rule
+    would affect, without changing them.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        """
+        Count the matching NotFollowerTwFriend objects and the objects
+        which would be kept for each rule and for all the enabled rules together
+        (see api/auto_classification.py).
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            Response object {TemplateResponse} -- The counts
+        """
+
+        return Response(preview_auto_classification_rules())
+
+
+class TwFriendsRuns(SparseFieldsMixin, generics.ListAPIView):
+    """
+    Return a list of the check and unfollow runs
+    with the per-run summary of the metrics.
+    """
+
+    queryset = TwFriendsRun.objects.all()
+    permission_classes = (IsAuthenticated, )
+    serializer_class = TwFriendsRunSerializer
+
+
+class TwFriendsRunDetail(generics.RetrieveAPIView):
+    """
+    Return the status of the check or unfollow run
+    with the per-run summary of the metrics.
+    """
+
+    queryset = TwFriendsRun.objects.all()
+    permission_classes = (IsAuthenticated, )
+    serializer_class = TwFriendsRunSerializer
+
+
+class TwFriendsRunStart(APIView):
+    """
+    Start the check or unfollow run in the background thread
+    and return it right away, without waiting for the end of the run.
+    """
+
+    permission_classes = (IsAuthenticated, )
+    kind = None
+
+    def post(self, request):
+        """
+        Start the run of the 'kind' of this view.
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            Response object {TemplateResponse} -- The started TwFriendsRun object
+                                                  (or the attached one, see api/runs.py)
+                                                  as serializer.data (202 Accepted),
+                                                  'Location' header is the URL
+                                                  for polling of the run status
+        """
+
+        run = runs.start_run(self.kind)
+        serializer = TwFriendsRunSerializer(run)
+
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('get_tw_friends_run', kwargs={'pk': run.pk})}
+        )
+
+
+class NotFollowersTwFriendsStats(APIView):
+    """
+    Return the summary statistics of the Twitter friends who aren't followers.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        """
+        Return the total and 'need_unfollow' counts, and the histograms
+        of 'tff_ratio' and 'avg_tweetsperday' from the precomputed counters,
+        which are updated incrementally by all the writes (see api/stats.py).
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            Response object {TemplateResponse} -- The summary statistics
+        """
+
+        return Response(stats.get_stats())
+
+
+
+class NotFollowersTwFriendsChanges(APIView):
+    """
+    Return the changes of the Twitter friends who aren't followers
+    since the version synced by the API mirror.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        """
+        Return the created or updated NotFollowerTwFriend objects ('upsert')
+        and the deleted ones ('delete') with the version greater than '?since='
+        in the order of the versions (see api/changes.py). Without '?since='
+        all the NotFollowerTwFriend objects are returned (the initial sync).
+        The page ends after '?limit=' changes, the next page starts
+        from the 'next' position ('since' and 'after' query params).
+
+        Arguments:
+            request {Request} -- 'since', 'after' and 'limit' query params
+
+        Returns:
+            Response object {TemplateResponse} -- The current 'version', the 'changes',
+                                                  'has_more' and the 'next' position,
+                                                  400 Bad Request for the invalid params
+        """
+
+        try:
+            since = request.query_params.get('since')
+            since = int(since) if since not in (None, '') else None
+            limit = int(request.query_params.get('limit') or changes.DEFAULT_LIMIT)
+        except ValueError:
+            return Response({'detail': '"since" and "limit" must be integers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if (since is not None and since < 0) or not 0 < limit <= changes.MAX_LIMIT:
+            return Response(
+                {'detail': '"since" must be >= 0 and "limit" from 1 to %s.' % changes.MAX_LIMIT},
+                status=status.HTTP_400_BAD_REQUEST)
+        after = request.query_params.get('after') or None
+
+        version, page, has_more = changes.get_changes(since, after, limit)
+
+        data = []
+        for change_version, id_str, row in page:
+            change = {'op': 'delete' if row is None else 'upsert',
+                      'version': change_version, 'id_str': id_str}
+            if row is not None:
+                change['data'] = NotFollowerTwFriendSerializer(row).data
+            data.append(change)
+
+        if has_more:
+            next_position = {'since': page[-1][0], 'after': page[-1][1]}
+        else:
+            next_position = {'since': version, 'after': None}
+
+        return Response({
+            'version': version,
+            'changes': data,
+            'has_more': has_more,
+            'next': next_position,
+        })
+
+class UnfollowQueue(APIView):
+    """
+    Return the status of the unfollow queue or enqueue the Twitter friends
+    who aren't followers and selected for unfollow.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        """
+        Return the queue depth, the budgets and the projected completion time
+        (see api/unfollow_queue.py).
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            Response object {TemplateResponse} -- The queue status
+        """
+
+        return Response(unfollow_queue.get_queue_status())
+
+    def post(self, request):
+        """
+        Replace the pending queue items with all the NotFollowerTwFriend objects
+        with 'need_unfollow=True' in the priority order. The queue is drained
+        by 'drain_unfollow_queue' management command.
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            Response object {TemplateResponse} -- The queue status
+        """
+
+        unfollow_queue.enqueue_need_unfollow()
+
+        return Response(unfollow_queue.get_queue_status())
+
+
+class Metrics(APIView):
+    """
+    Return the instrumentation metrics of the check and unfollow runs
+    in the Prometheus text format.
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        """
+        Return all the process-wide metrics (see api/metrics.py)
+        as a 'text/plain' response in the Prometheus text format.
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            HttpResponse object -- The metrics in the Prometheus text format
+        """
+
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class RequestProfiles(SparseFieldsMixin, generics.ListAPIView):
+    """
+    Return a list of the stored profiles of the API requests
+    (requested by the staff users, see api/profiling.py).
+    """
+
+    queryset = RequestProfile.objects.defer('stats')
+    permission_classes = (IsAdminUser, )
+    serializer_class = RequestProfileSerializer
+
+
+class RequestProfileDetail(generics.RetrieveAPIView):
+    """
+    Return the profile of the API request with the slowest functions,
+    the SQL queries and the Twitter API calls.
+    """
+
+    queryset = RequestProfile.objects.defer('stats')
+    permission_classes = (IsAdminUser, )
+    serializer_class = RequestProfileSerializer
+
+
+class RequestProfileStats(generics.RetrieveAPIView):
+    """
+    Return the cProfile stats of the API request as a file for pstats.
+    """
+
+    queryset = RequestProfile.objects.all()
+    permission_classes = (IsAdminUser, )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return the marshalled cProfile stats of the profile
+        (loaded by 'python -m pstats <file>' or snakeviz).
+
+        Arguments:
+            request {Request} -- Not using
+
+        Returns:
+            HttpResponse object -- The 'application/octet-stream' response
+        """
+
+        profile = self.get_object()
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = 'attachment; filename="request_profile_%s.prof"' % (
+            profile.pk)
+        return response
+
+
+class SignedToken(APIView):
+    """
+    Create or revoke the short-lived signed API token
+    for the high-frequency polling (see api/authentication.py).
+    """
+
+    permission_classes = (IsAuthenticated, )
+
+    def post(self, request):
+        """
+        Create the signed token of the authenticated user,
+        it's sent as 'Authorization: Signed <token>' header.
+        The request authenticated with the signed token can't create the new one,
+        otherwise the leaked token would be renewed past its expiry.
+
+        Arguments:
+            request {Request} -- The request of the authenticated user
+                                 (session, basic or token authentication)
+
+        Returns:
+            Response object {TemplateResponse} -- The 'token' and its 'expires_at' time,
+                                                  403 Forbidden if the request is
+                                                  authenticated with the signed token
+        """
+
+        if isinstance(request.auth, authentication.SignedToken):
+            return Response(
+                {'detail': 'The signed token can not be created with the signed token.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return Response(authentication.create_signed_token(request.user))
+
+    def delete(self, request):
+        """
+        Revoke the signed token the request is authenticated with.
+
+        Arguments:
+            request {Request} -- The request authenticated with the signed token
+
+        Returns:
+            Response object {TemplateResponse} -- 204 No Content,
+                                                  400 Bad Request if the request isn't
+                                                  authenticated with the signed token
+        """
+
+        if not isinstance(request.auth, authentication.SignedToken):
+            return Response(
+                {'detail': 'The request is not authenticated with the signed token.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        authentication.revoke_signed_token(request.auth, request.user)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ActivityWebhook(APIView):
+    """
+    The webhook of the account activity events (follow, unfollow, user update),
+    which are applied incrementally to the NotFollowerTwFriend objects.
+    The requests are authenticated with the signature of the body
+    instead of the API users.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny, )
+
+    def get(self, request):
+        """
+        Answer the CRC challenge of the webhook registration.
+
+        Arguments:
+            request {Request} -- 'crc_token' query param
+
+        Returns:
+            Response object {TemplateResponse} -- The 'response_token',
+                                                  400 Bad Request without 'crc_token'
+                                                  or for the invalid 'crc_token'
+        """
+
+        crc_token = request.query_params.get('crc_token')
+        if not crc_token:
+            return Response({'crc_token': ['This query param is required.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not activity_events.is_valid_crc_token(crc_token):
+            # The signature of any other value could sign the forged events
+            return Response({'crc_token': ['Up to 128 letters, digits, "_", "-" or "=".']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(activity_events.get_crc_response(crc_token))
+
+    def post(self, request):
+        """
+        Verify the signature of the payload and queue its events
+        (see api/activity_events.py), they're applied
+        by 'process_activity_events' management command.
+
+        Arguments:
+            request {Request} -- The payload signed
+                                 in 'X-Twitter-Webhooks-Signature' header
+
+        Returns:
+            Response object {TemplateResponse} -- The count of the 'queued' events,
+                                                  403 Forbidden for the invalid signature,
+                                                  400 Bad Request for the invalid payload
+        """
+
+        body = request.body
+        if not activity_events.verify_signature(
+                body, request.META.get(activity_events.SIGNATURE_HEADER)):
+            return Response({'detail': 'Invalid signature.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            queued = activity_events.enqueue_activity_events(body)
+        except activity_events.InvalidActivityPayload as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'queued': queued})
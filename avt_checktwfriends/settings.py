@@ -47,6 +47,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.SignedTokenAuthentication',
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -56,6 +57,17 @@ REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
+# The API schema pre-generated at deploy time with 'generate_schema' management command
+# (see api/schema.py), the schema is generated on the first request if there is no file
+API_SCHEMA_FILE = os.environ.get('API_SCHEMA_FILE', os.path.join(BASE_DIR, 'api_schema.json'))
+
+# The short-lived signed API tokens (see api/authentication.py): the token lifetime,
+# seconds between the db lookups of the user and the revocation of the token
+# and max count of the tokens in the in-process cache
+API_SIGNED_TOKEN_MAX_AGE = 15 * 60
+API_SIGNED_TOKEN_CACHE_TTL = 60
+API_SIGNED_TOKEN_CACHE_SIZE = 1024
+
 # Authentication data for Twitter App created for Twitter Account
 # https://apps.twitter.com/
 CONSUMER_KEY = '<your-CONSUMER_KEY>'
@@ -63,12 +75,89 @@ CONSUMER_SECRET = '<your-CONSUMER_SECRET>'
 ACCESS_TOKEN = '<your-ACCESS_TOKEN>'
 ACCESS_TOKEN_SECRET = '<your-ACCESS_TOKEN_SECRET>'
 
+# The pool of the credentials of Twitter Apps authorized by Twitter Account for the check
+# (see api/twitter_api.py), the calls are dispatched across their rate limit budgets,
+# the single credential above is used if the list is empty, e.g.:
+# [{'consumer_key': '...', 'consumer_secret': '...',
+#   'access_token_key': '...', 'access_token_secret': '...'}]
+TWITTER_CREDENTIALS = []
+
+# Calls per rate limit window of the endpoints for each credential
+# (the defaults of api/twitter_api.py are overridden)
+TWITTER_RATE_LIMITS = {}
+
+# The Twitter API client class, the stub of the load tests
+# 'api.twitter_stub.StubTwitterApi' serves the synthetic account
+# with TWITTER_STUB_FRIENDS_COUNT friends and TWITTER_STUB_LATENCY seconds per call
+# (see api/loadtest.py)
+TWITTER_API_CLASS = os.environ.get('TWITTER_API_CLASS', 'twitter.Api')
+TWITTER_STUB_FRIENDS_COUNT = int(os.environ.get('TWITTER_STUB_FRIENDS_COUNT', 2000))
+TWITTER_STUB_LATENCY = float(os.environ.get('TWITTER_STUB_LATENCY', 0))
+
+# The key of the account activity webhook signatures (see api/activity_events.py),
+# Twitter signs the webhook requests with the consumer secret of Twitter App
+ACTIVITY_WEBHOOK_SECRET = CONSUMER_SECRET
+
+# Seconds to wait for the Twitter API rate limit window reset
+# https://developer.twitter.com/en/docs/basics/rate-limiting
+TWITTER_RATE_LIMIT_WAIT = 15 * 60
+
+# Count of the concurrent DestroyFriendship calls of the unfollow
+TWITTER_UNFOLLOW_CONCURRENCY = 4
+
+# The transport of the Twitter API calls (see api/twitter_api.py):
+# seconds of the timeout of the connection and of the response of each call,
+# max count of the retries of the transient errors and the seconds of the backoff
+# (doubled by each retry up to the max, the random part of it is waited),
+# count of the consecutive transient errors which open the circuit breaker
+# and the seconds of the calls failing fast before the trial call
+TWITTER_API_TIMEOUT = 30
+TWITTER_API_RETRIES = 3
+TWITTER_API_RETRY_BACKOFF = 0.5
+TWITTER_API_RETRY_BACKOFF_MAX = 10
+TWITTER_CIRCUIT_FAILURES = 5
+TWITTER_CIRCUIT_COOLDOWN = 60
+
+# The unfollow queue (see api/unfollow_queue.py):
+# the order of the unfollows (NotFollowerTwFriend fields, '-' for descending),
+# max count of the unfollows per day and per rate limit window
+UNFOLLOW_QUEUE_PRIORITY = ['tff_ratio', 'avg_tweetsperday']
+UNFOLLOW_DAILY_BUDGET = 400
+UNFOLLOW_WINDOW_BUDGET = 50
+UNFOLLOW_WINDOW_SECONDS = 15 * 60
+
+# Instrumentation (timing spans and counters) of the check and unfollow runs,
+# exposed at /api/v1/metrics/ (see api/metrics.py)
+API_METRICS_ENABLED = True
+
+# Execution of the check and unfollow runs started in the background
+# (see api/runs.py): in the background threads or right away in the request thread
+API_RUNS_IN_BACKGROUND = True
+API_RUN_WORKERS = int(os.environ.get('API_RUN_WORKERS', 2))
+# Seconds between the polls of the run events and between the keep-alive comments
+API_RUN_EVENTS_POLL_INTERVAL = 0.5
+API_RUN_EVENTS_KEEP_ALIVE = 15
+# Single-flight of the runs (see api/runs.py): the check requested within
+# API_CHECK_MIN_INTERVAL seconds after the last one returns its result,
+# the run in progress without the heartbeat for API_RUN_STALE_SECONDS is dead
+# (left by a crashed or restarted process), it's longer than the rate limit waits of a page
+API_CHECK_MIN_INTERVAL = 60
+API_RUN_STALE_SECONDS = 45 * 60
+# Count of the last stored profiles of the API requests (see api/profiling.py)
+API_PROFILES_KEEP = 100
+
 
 
 MIDDLEWARE = [
+    # Compress the responses with brotli or gzip (see api/middleware.py)
+    'api.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Profile the request of the staff user with 'X-Profile: 1' header
+    # or '?profile=1' query param (see api/profiling.py)
+    'api.profiling.ProfilingMiddleware',
+    'api.db_routers.PrimaryDBPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'avt_checktwfriends.urls'
@@ -101,9 +190,39 @@ DATABASES = {
         'PASSWORD': '<your-password>',
         'HOST': '127.0.0.1',
         'PORT': '5432',
-    }
+        # Persistent connections, see DB_CONN_MAX_AGE below
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    },
+    # Add the read replica of the 'default' database for the read-only list views:
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql_psycopg2',
+    #     'NAME': 'avt_checktwfriends',
+    #     'USER': '<your-user>',
+    #     'PASSWORD': '<your-password>',
+    #     'HOST': '<replica-host>',
+    #     'PORT': '5432',
+    #     'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+# Route the reads to the replica (if it's in DATABASES) and the writes to 'default',
+# after a write the client is pinned to 'default' for DATABASE_REPLICA_STICKINESS seconds
+# (see api/db_routers.py)
+DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_STICKINESS = 5
+
+# Persistent db connections:
+# 'CONN_MAX_AGE' (DB_CONN_MAX_AGE environment variable) is the lifetime of the connection
+# in seconds, 0 closes the connection at the end of each request.
+# Each thread has its own connection, so the max count of the connections per process
+# (the connection pool size) is the count of the server threads + API_RUN_WORKERS.
+# The persistent connection is checked before its reuse by the request
+# at most once per DB_CONN_HEALTH_CHECK_INTERVAL seconds (see api/db.py).
+DB_CONN_HEALTH_CHECKS = True
+DB_CONN_HEALTH_CHECK_INTERVAL = 30
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 